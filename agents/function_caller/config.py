@@ -6,8 +6,24 @@ class FunctionCallerConfig(BaseModel):
     model_name: str = "gpt-4"
     temperature: float = 0.2
     max_tokens: int = 1500
-    function_timeout: int = 30  # seconds
+    function_timeout: float = 30  # seconds, per attempt
     retry_attempts: int = 3
+    retry_backoff: Dict[str, float] = {
+        "base_delay": 0.5,  # seconds before the first retry, doubled on each one
+        "max_delay": 10.0,
+        "jitter": 1.0  # randomized share of each delay
+    }
+    circuit_breaker: Dict[str, Any] = {
+        "enabled": True,
+        "failure_threshold": 5,  # consecutive failed calls before the circuit opens
+        "reset_timeout": 30.0  # seconds before a trial call is let through
+    }
+    concurrency: Dict[str, Any] = {
+        "max_concurrent_calls": 16,  # across all functions, None for no limit
+        "per_function": 4,  # concurrent calls of any one function, None for no limit
+        "function_limits": {},  # per-function overrides of per_function
+        "sync_workers": 16  # threads running synchronous functions, shared by all of them
+    }
     error_handling: Dict[str, Any] = {
         "log_errors": True,
         "raise_exceptions": False,
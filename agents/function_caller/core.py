@@ -1,7 +1,16 @@
-from typing import Dict, Any, List, Callable, Optional
+from typing import Dict, Any, List, Callable, Optional, Tuple
+import asyncio
+import inspect
+import json
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AsyncExitStack
+from functools import partial
+from weakref import WeakKeyDictionary
 from .config import FunctionCallerConfig
-from .utils import retry_on_failure, validate_function_input, sanitize_input
+from .utils import CircuitBreaker, CircuitOpenError, call_with_retries
+from .validators import Validator, compile_schema
 
 logger = logging.getLogger(__name__)
 
@@ -12,38 +21,218 @@ class FunctionCaller:
         self.config = config or FunctionCallerConfig()
         self.registered_functions: Dict[str, Callable] = {}
         self.function_schemas: Dict[str, Dict[str, Any]] = {}
+        # Parameter validators compiled from the schemas at registration
+        self.validators: Dict[str, Validator] = {}
+        self.circuit_breakers: Dict[str, CircuitBreaker] = {}
+        # loop -> (global semaphore, per-function semaphores); an asyncio semaphore is bound to one loop
+        self._loop_semaphores: WeakKeyDictionary = WeakKeyDictionary()
+        # Synchronous functions run here rather than in the loop's default executor
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # Threads of timed-out synchronous calls that are still running, per function
+        self.stray_calls: Dict[str, int] = {}
+        self._stray_lock = threading.Lock()
         
     def register_function(self, name: str, func: Callable, schema: Dict[str, Any]) -> None:
-        """Register a function with its schema"""
+        """Register a function with its schema, raising ValidationError for a malformed schema"""
         if name in self.registered_functions:
             logger.warning(f"Function {name} already registered, overwriting")
+        rules = self.config.validation_rules
+        validator = compile_schema(schema if rules.get('schema_validation', True) else {},
+                                   rules.get('input_sanitization', True), rules.get('type_check', True))
         self.registered_functions[name] = func
         self.function_schemas[name] = schema
-        
-    @retry_on_failure(max_retries=3)
+        self.validators[name] = validator
+        self.circuit_breakers.pop(name, None)
+
+    def _breaker(self, name: str) -> Optional[CircuitBreaker]:
+        settings = self.config.circuit_breaker
+        if not settings.get('enabled', True):
+            return None
+        breaker = self.circuit_breakers.get(name)
+        if breaker is None:
+            breaker = CircuitBreaker(settings.get('failure_threshold', 5), settings.get('reset_timeout', 30.0))
+            self.circuit_breakers[name] = breaker
+        return breaker
+
+    def _semaphores(self, name: str) -> List[asyncio.Semaphore]:
+        """Global and per-function concurrency slots a call of ``name`` must hold on the running loop"""
+        loop = asyncio.get_running_loop()
+        slots = self._loop_semaphores.get(loop)
+        if slots is None:
+            limit = self.config.concurrency.get('max_concurrent_calls')
+            slots = self._loop_semaphores[loop] = (asyncio.Semaphore(limit) if limit else None, {})
+        call_semaphore, function_semaphores = slots
+        semaphores = [call_semaphore] if call_semaphore is not None else []
+        limit = self._function_limit(name)
+        if limit:
+            semaphore = function_semaphores.get(name)
+            if semaphore is None:
+                semaphore = function_semaphores[name] = asyncio.Semaphore(limit)
+            semaphores.append(semaphore)
+        return semaphores
+
+    def _function_limit(self, name: str) -> Optional[int]:
+        settings = self.config.concurrency
+        return settings.get('function_limits', {}).get(name, settings.get('per_function'))
+
+    def _release_stray(self, name: str) -> None:
+        with self._stray_lock:
+            self.stray_calls[name] -= 1
+            if not self.stray_calls[name]:
+                del self.stray_calls[name]
+
+    async def _run_sync(self, name: str, func: Callable, params: Dict[str, Any]) -> Any:
+        """Run a synchronous function on the bounded executor, tracking threads a timeout abandons"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.config.concurrency.get('sync_workers') or None,
+                                                thread_name_prefix='function-caller')
+        future = self._executor.submit(partial(func, **params))
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # Still queued calls are dropped; a running thread cannot be stopped and keeps its worker
+            if not future.cancel() and not future.done():
+                with self._stray_lock:
+                    self.stray_calls[name] = self.stray_calls.get(name, 0) + 1
+                future.add_done_callback(lambda _: self._release_stray(name))
+            raise
+
     async def call_function(self, name: str, params: Dict[str, Any]) -> Dict[str, Any]:
-        """Call a registered function with parameters"""
+        """Call a registered function with parameters.
+
+        Each attempt is cut off after ``function_timeout`` seconds; failures
+        are retried up to ``retry_attempts`` times with jittered exponential
+        backoff that sleeps without blocking the event loop. Once a function
+        keeps failing its circuit breaker opens and calls fail fast with
+        ``circuit_open`` until the reset timeout passes. Calls wait for a
+        free slot under the ``concurrency`` limits, which apply per event
+        loop.
+
+        Synchronous functions run on a dedicated pool of ``sync_workers``
+        threads. A timeout cannot stop a thread: the timed-out call keeps
+        running (and its worker busy) until the function returns, so sync
+        calls are not retried after a timeout, and while a function has as
+        many such stray calls as its per-function limit (or ``sync_workers``)
+        new calls of it fail fast with ``circuit_open``.
+        """
         if name not in self.registered_functions:
             raise ValueError(f"Function {name} not registered")
             
-        # Validate and sanitize input
-        if not validate_function_input(params, self.function_schemas[name]):
-            raise ValueError(f"Invalid parameters for function {name}")
-        sanitized_params = sanitize_input(params)
-        
+        # Validate and sanitize input; bad parameters are not worth retrying
+        try:
+            sanitized_params = self.validators[name](params)
+        except ValueError as e:
+            logger.error(f"Invalid parameters for function {name}: {str(e)}")
+            raise ValueError(f"Invalid parameters for function {name}: {str(e)}") from e
+
+        func = self.registered_functions[name]
+        is_async = inspect.iscoroutinefunction(func)
+        if is_async:
+            call = partial(func, **sanitized_params)
+        else:
+            call = partial(self._run_sync, name, func, sanitized_params)
+        error_handling = self.config.error_handling
+        backoff = self.config.retry_backoff
         try:
-            result = await self.registered_functions[name](**sanitized_params)
+            stray = self.stray_calls.get(name, 0)
+            stray_limit = self._function_limit(name) or self.config.concurrency.get('sync_workers') or 1
+            if not is_async and stray >= stray_limit:
+                raise CircuitOpenError(f"{stray} timed-out calls of {name} are still running")
+            async with AsyncExitStack() as slots:
+                # Per-function slot first, so calls queued on one busy function don't hold global slots
+                for semaphore in reversed(self._semaphores(name)):
+                    await slots.enter_async_context(semaphore)
+                result, attempts = await call_with_retries(
+                    call,
+                    attempts=self.config.retry_attempts if error_handling.get('retry_on_failure', True) else 1,
+                    timeout=self.config.function_timeout,
+                    base_delay=backoff.get('base_delay', 0.5),
+                    max_delay=backoff.get('max_delay', 10.0),
+                    jitter=backoff.get('jitter', 1.0),
+                    breaker=self._breaker(name),
+                    retry_timeouts=is_async
+                )
             return {
                 'status': 'success',
-                'result': result
+                'result': result,
+                'attempts': attempts
             }
         except Exception as e:
-            logger.error(f"Error calling function {name}: {str(e)}")
+            if isinstance(e, asyncio.TimeoutError):
+                message = f"Timed out after {self.config.function_timeout}s"
+            else:
+                message = str(e)
+            if error_handling.get('log_errors', True):
+                logger.error(f"Error calling function {name}: {message}")
+            if error_handling.get('raise_exceptions', False):
+                raise
             return {
                 'status': 'error',
-                'error': str(e)
+                'error': message,
+                'circuit_open': isinstance(e, CircuitOpenError)
             }
             
+    @staticmethod
+    def _parse_tool_call(tool_call: Dict[str, Any]) -> Tuple[Optional[str], str, Dict[str, Any]]:
+        """(id, name, params) of a plain {'name', 'params'} call or an OpenAI tool call"""
+        function = tool_call.get('function') or tool_call
+        arguments = function.get('params', function.get('arguments')) or {}
+        if isinstance(arguments, str):
+            arguments = json.loads(arguments) if arguments.strip() else {}
+        return tool_call.get('id'), function['name'], arguments
+
+    async def call_functions_batch(self, tool_calls: List[Dict[str, Any]],
+                                   max_concurrency: Optional[int] = None) -> Dict[str, Any]:
+        """Run several tool calls (e.g. the ``tool_calls`` of one model response) concurrently.
+
+        Each entry is ``{'name': ..., 'params': {...}}`` or an OpenAI tool
+        call ``{'id': ..., 'function': {'name': ..., 'arguments': '<json>'}}``.
+        Calls share the ``concurrency`` limits with every other call;
+        ``max_concurrency`` additionally caps this batch. One failing call
+        never affects the others: ``results`` holds one result per call in
+        input order (with its ``name`` and tool call ``id``), and
+        ``failures`` lists the indexes and errors of the calls that failed.
+        """
+        batch_semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+
+        async def run(tool_call: Dict[str, Any]) -> Dict[str, Any]:
+            call_id, name = tool_call.get('id'), (tool_call.get('function') or tool_call).get('name')
+            try:
+                call_id, name, params = self._parse_tool_call(tool_call)
+                if batch_semaphore is None:
+                    result = await self.call_function(name, params)
+                else:
+                    async with batch_semaphore:
+                        result = await self.call_function(name, params)
+            except Exception as e:
+                # Unknown functions, bad arguments, or raise_exceptions
+                logger.error(f"Error calling function {name}: {str(e)}")
+                result = {'status': 'error', 'error': str(e)}
+            return {'id': call_id, 'name': name, **result}
+
+        results = await asyncio.gather(*(run(tool_call) for tool_call in tool_calls))
+        failures = [{'index': index, 'name': result['name'], 'error': result.get('error')}
+                    for index, result in enumerate(results) if result['status'] != 'success']
+        if not failures:
+            status = 'success'
+        elif len(failures) < len(results):
+            status = 'partial'
+        else:
+            status = 'error'
+        return {
+            'status': status,
+            'results': results,
+            'succeeded': len(results) - len(failures),
+            'failed': len(failures),
+            'failures': failures
+        }
+
+    def close(self) -> None:
+        """Shut down the thread pool of synchronous functions without waiting for stray calls"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
     def get_registered_functions(self) -> List[str]:
         """Get list of registered function names"""
         return list(self.registered_functions.keys())
@@ -51,6 +240,11 @@ class FunctionCaller:
     def get_function_schema(self, name: str) -> Optional[Dict[str, Any]]:
         """Get schema for a registered function"""
         return self.function_schemas.get(name)
+
+    def get_circuit_state(self, name: str) -> str:
+        """Circuit breaker state of a function: closed, open or half_open"""
+        breaker = self.circuit_breakers.get(name)
+        return breaker.state if breaker is not None else CircuitBreaker.CLOSED
     
     def validate_schema(self, schema: Dict[str, Any]) -> bool:
         """Validate function schema format"""
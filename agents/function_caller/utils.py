@@ -1,25 +1,146 @@
-from typing import Dict, Any, Callable
+from typing import Dict, Any, Awaitable, Callable, Optional, Tuple, Type
+import asyncio
 import logging
+import random
 import time
 from functools import wraps
 
 logger = logging.getLogger(__name__)
 
-def retry_on_failure(max_retries: int = 3, delay: int = 1):
-    """Decorator for retrying failed function calls"""
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a function whose circuit breaker is open"""
+
+class CircuitBreaker:
+    """Per-function circuit breaker.
+
+    After ``failure_threshold`` consecutive failed calls the circuit opens and
+    calls are rejected without running for ``reset_timeout`` seconds. Then one
+    trial call is let through (half-open): success closes the circuit again,
+    failure reopens it for another ``reset_timeout``.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self) -> bool:
+        """Whether a call may run now; claims the single trial call when half-open"""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._trial_running:
+            self._trial_running = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._trial_running or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self._trial_running:
+                logger.warning(f"Circuit opened after {self.failures} consecutive failures")
+            self.opened_at = time.monotonic()
+        self._trial_running = False
+
+    def release(self) -> None:
+        """Give up a claimed trial call without an outcome"""
+        self._trial_running = False
+
+    def retry_after(self) -> float:
+        """Seconds until the next trial call is allowed"""
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+def backoff_delay(attempt: int, base_delay: float = 0.5, max_delay: float = 10.0, jitter: float = 1.0) -> float:
+    """Exponential backoff before retry ``attempt`` (0-based), capped at ``max_delay``.
+
+    ``jitter`` is the randomized share of the delay: 1.0 is "full jitter"
+    (uniform between 0 and the exponential delay), 0 is no jitter. Jitter
+    keeps many callers that failed together from retrying in lockstep.
+    """
+    delay = min(max_delay, base_delay * (2 ** attempt))
+    return delay * (1 - jitter * random.random())
+
+async def call_with_retries(call: Callable[[], Awaitable[Any]], attempts: int = 3, timeout: Optional[float] = None,
+                            base_delay: float = 0.5, max_delay: float = 10.0, jitter: float = 1.0,
+                            retry_on: Tuple[Type[BaseException], ...] = (Exception,),
+                            breaker: Optional[CircuitBreaker] = None, retry_timeouts: bool = True) -> Tuple[Any, int]:
+    """Await ``call()`` with a hard per-attempt timeout, retrying with backoff.
+
+    Waiting between attempts uses ``asyncio.sleep`` so other tasks on the
+    event loop keep running. Timeouts surface as ``asyncio.TimeoutError``
+    and count as failures; with ``retry_timeouts=False`` a timeout is not
+    retried, for calls whose abandoned attempt keeps running (a thread
+    cannot be stopped). With a ``breaker`` the whole call (all of its
+    attempts) counts as one success or failure, and an open circuit raises
+    CircuitOpenError without calling. Returns (result, attempts used).
+    """
+    if breaker is not None and not breaker.allow():
+        raise CircuitOpenError(f"Circuit open, retry in {breaker.retry_after():.1f}s")
+    attempts = max(1, attempts)
+    succeeded = None
+    try:
+        for attempt in range(attempts):
+            try:
+                if timeout is None:
+                    result = await call()
+                else:
+                    result = await asyncio.wait_for(call(), timeout)
+            except retry_on as e:
+                if not retry_timeouts and isinstance(e, asyncio.TimeoutError):
+                    logger.error(f"Attempt {attempt + 1} timed out, not retrying")
+                    raise
+                if attempt == attempts - 1:
+                    logger.error(f"Failed after {attempts} attempts: {e!r}")
+                    raise
+                delay = backoff_delay(attempt, base_delay, max_delay, jitter)
+                logger.warning(f"Attempt {attempt + 1} failed: {e!r}, retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+            else:
+                succeeded = True
+                return result, attempt + 1
+    except Exception:
+        succeeded = False
+        raise
+    finally:
+        if breaker is not None:
+            if succeeded:
+                breaker.record_success()
+            elif succeeded is False:
+                breaker.record_failure()
+            else:
+                # Cancelled by the caller: not the function's fault
+                breaker.release()
+
+def retry_on_failure(max_retries: int = 3, delay: float = 1, max_delay: float = 30.0, jitter: float = 1.0,
+                     timeout: Optional[float] = None):
+    """Decorator for retrying failed async function calls with non-blocking exponential backoff"""
     def decorator(func: Callable):
         @wraps(func)
         async def wrapper(*args, **kwargs):
-            for attempt in range(max_retries):
-                try:
-                    return await func(*args, **kwargs)
-                except Exception as e:
-                    if attempt == max_retries - 1:
-                        logger.error(f"Failed after {max_retries} attempts: {str(e)}")
-                        raise
-                    logger.warning(f"Attempt {attempt + 1} failed: {str(e)}")
-                    time.sleep(delay)
-            return None
+            result, _ = await call_with_retries(lambda: func(*args, **kwargs), max_retries, timeout,
+                                                delay, max_delay, jitter)
+            return result
         return wrapper
     return decorator
 
@@ -38,19 +159,19 @@ def validate_function_input(data: Dict[str, Any], schema: Dict[str, Any]) -> boo
         logger.error(f"Error validating function input: {str(e)}")
         return False
 
+def sanitize_value(value: Any) -> Any:
+    """Sanitize one input value: strings stripped, containers sanitized recursively, unknown types dropped"""
+    if isinstance(value, str):
+        # Basic string sanitization
+        return value.strip()
+    if isinstance(value, (int, float, bool)):
+        return value
+    if isinstance(value, dict):
+        return {key: sanitize_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [sanitize_value(item) for item in value]
+    return None
+
 def sanitize_input(data: Dict[str, Any]) -> Dict[str, Any]:
     """Sanitize function input data"""
-    sanitized = {}
-    for key, value in data.items():
-        if isinstance(value, str):
-            # Basic string sanitization
-            sanitized[key] = value.strip()
-        elif isinstance(value, (int, float, bool)):
-            sanitized[key] = value
-        elif isinstance(value, dict):
-            sanitized[key] = sanitize_input(value)
-        elif isinstance(value, list):
-            sanitized[key] = [sanitize_input({"item": v})["item"] for v in value]
-        else:
-            sanitized[key] = None
-    return sanitized
\ No newline at end of file
+    return {key: sanitize_value(value) for key, value in data.items()}
@@ -0,0 +1,284 @@
+from typing import Dict, Any, Callable, List, Optional, Tuple
+import re
+import logging
+from .utils import sanitize_value
+
+logger = logging.getLogger(__name__)
+
+# A compiled validator takes a value and returns it validated and coerced, or raises ValidationError
+Validator = Callable[[Any], Any]
+
+# JSON types checked by isinstance alone; the others get their own compilers
+SIMPLE_TYPES: Dict[str, Tuple[type, ...]] = {
+    'boolean': (bool,),
+    'null': (type(None),),
+}
+
+_MISSING = object()
+
+class ValidationError(ValueError):
+    """Function parameters that don't match the registered schema"""
+
+def _fail(path: str, message: str) -> None:
+    raise ValidationError(f"{path or 'parameters'}: {message}")
+
+def _bounds(low: int, high: Optional[int], unit: str) -> str:
+    return f'at least {low} {unit}' if high is None else f'between {low} and {high} {unit}'
+
+def _is_json_schema(schema: Dict[str, Any]) -> bool:
+    # Type maps can have fields named 'type' or 'properties', but their values are Python types
+    return isinstance(schema.get('properties'), dict) or isinstance(schema.get('type'), (str, list))
+
+def compile_schema(schema: Dict[str, Any], sanitize: bool = True, type_check: bool = True) -> Validator:
+    """Compile a ``{field: type}`` map or JSON-Schema ``parameters`` into a validator/coercer raising ValidationError"""
+    parameters = schema.get('parameters') if isinstance(schema.get('parameters'), dict) else schema
+    if _is_json_schema(parameters):
+        return _compile_json(parameters, '', sanitize, type_check)
+    return _compile_type_map(parameters, sanitize, type_check)
+
+def _check_type(field: str, field_type: Any) -> None:
+    """Reject declared types isinstance can't check, e.g. ``'str'``, at compile time rather than per call"""
+    try:
+        isinstance(None, field_type)
+    except TypeError:
+        _fail(field, f'invalid type in schema: {field_type!r}')
+
+def _compile_type_map(schema: Dict[str, Any], sanitize: bool, type_check: bool) -> Validator:
+    """Validator for the ``{field: type}`` format, matching validate_function_input + sanitize_input"""
+    fields: List[Tuple[str, Any, Optional[Validator]]] = []
+    for field, field_type in schema.items():
+        if isinstance(field_type, dict):
+            # A JSON-Schema property mixed into a type map
+            fields.append((field, None, _compile_json(field_type, field, sanitize, type_check)))
+        else:
+            _check_type(field, field_type)
+            fields.append((field, field_type if type_check else None, _compile_plain(field_type, sanitize, type_check)))
+    known = frozenset(field for field, _, _ in fields)
+    extras = _sanitize_nested if sanitize else None
+
+    def validate(data: Any) -> Dict[str, Any]:
+        if not isinstance(data, dict):
+            _fail('', 'expected an object')
+        result = {}
+        for field, field_type, convert in fields:
+            value = data.get(field, _MISSING)
+            if value is _MISSING:
+                _fail(field, 'missing required field')
+            if field_type is not None and not isinstance(value, field_type):
+                _fail(field, f'expected {getattr(field_type, "__name__", field_type)}')
+            result[field] = convert(value) if convert is not None else value
+        if len(result) != len(data):
+            # Fields outside the schema pass through, sanitized like the rest
+            for key, value in data.items():
+                if key not in known:
+                    result[key] = extras(value) if extras is not None else value
+        return result
+    return validate
+
+def _compile_plain(field_type: Any, sanitize: bool, type_check: bool) -> Optional[Validator]:
+    """The sanitize_input step specialized for a field's declared Python type"""
+    if not sanitize:
+        return None
+    if not type_check:
+        # Unchecked values may be of any type
+        return _sanitize_nested
+    if field_type is str:
+        return str.strip
+    if field_type in (int, float, bool):
+        return None
+    return _sanitize_nested
+
+# Classes sanitize_value returns unchanged
+_SCALARS = frozenset((int, float, bool, type(None)))
+
+def _sanitize_nested(value: Any) -> Any:
+    """Same result as sanitize_value, but container leaves are handled inline rather than with a call each"""
+    cls = value.__class__
+    if cls is dict:
+        return {key: item.strip() if item.__class__ is str else
+                item if item.__class__ in _SCALARS else _sanitize_nested(item)
+                for key, item in value.items()}
+    if cls is list:
+        return [item.strip() if item.__class__ is str else
+                item if item.__class__ in _SCALARS else _sanitize_nested(item)
+                for item in value]
+    if cls is str:
+        return value.strip()
+    # Subclasses and other types: the generic rules decide
+    return sanitize_value(value)
+
+def _compile_json(schema: Dict[str, Any], path: str, sanitize: bool, type_check: bool) -> Validator:
+    """Validator for one JSON-Schema node; ``path`` names it in error messages"""
+    if not isinstance(schema, dict):
+        _fail(path, f'invalid schema: {schema!r}')
+    types = schema.get('type')
+    if isinstance(types, list):
+        options = [_compile_json({**schema, 'type': option}, path, sanitize, type_check) for option in types]
+        return _any_of(options, path, '/'.join(types))
+    if types == 'object' or isinstance(schema.get('properties'), dict):
+        check = _compile_object(schema, path, sanitize, type_check)
+    elif types == 'array':
+        check = _compile_array(schema, path, sanitize, type_check)
+    elif types in ('integer', 'number'):
+        check = _compile_number(schema, path, types == 'integer', type_check)
+    elif types == 'string':
+        check = _compile_string(schema, path, sanitize, type_check)
+    elif types in SIMPLE_TYPES:
+        check = _compile_type(SIMPLE_TYPES[types], path, types, type_check)
+    elif types is not None:
+        _fail(path, f'unknown type in schema: {types!r}')
+    else:
+        # Untyped: anything goes, sanitized generically
+        check = sanitize_value if sanitize else None
+
+    enum = schema.get('enum')
+    if enum is not None:
+        allowed = list(enum)
+        inner = check
+
+        def check(value: Any) -> Any:
+            if inner is not None:
+                value = inner(value)
+            if value not in allowed:
+                _fail(path, f'must be one of {allowed}')
+            return value
+    if check is None:
+        return _identity
+    return check
+
+def _identity(value: Any) -> Any:
+    return value
+
+def _any_of(options: List[Validator], path: str, label: str) -> Validator:
+    def check(value: Any) -> Any:
+        for option in options:
+            try:
+                return option(value)
+            except ValidationError:
+                continue
+        _fail(path, f'expected {label}')
+    return check
+
+def _compile_type(allowed: Tuple[type, ...], path: str, label: str, type_check: bool) -> Optional[Validator]:
+    if not type_check:
+        return None
+
+    def check(value: Any) -> Any:
+        if not isinstance(value, allowed):
+            _fail(path, f'expected {label}')
+        return value
+    return check
+
+def _compile_string(schema: Dict[str, Any], path: str, sanitize: bool, type_check: bool) -> Validator:
+    min_length = schema.get('minLength', 0)
+    max_length = schema.get('maxLength')
+    try:
+        pattern = re.compile(schema['pattern']) if 'pattern' in schema else None
+    except (re.error, TypeError) as e:
+        _fail(path, f'invalid pattern in schema: {e}')
+    if not type_check and not sanitize and not min_length and max_length is None and pattern is None:
+        return _identity
+
+    def check(value: Any) -> Any:
+        if not isinstance(value, str):
+            if type_check:
+                _fail(path, 'expected string')
+            return value
+        if sanitize:
+            value = value.strip()
+        if len(value) < min_length or (max_length is not None and len(value) > max_length):
+            _fail(path, f'must have {_bounds(min_length, max_length, "characters")}')
+        if pattern is not None and not pattern.search(value):
+            _fail(path, f'must match {pattern.pattern}')
+        return value
+    return check
+
+def _compile_number(schema: Dict[str, Any], path: str, integer: bool, type_check: bool) -> Validator:
+    minimum = schema.get('minimum')
+    maximum = schema.get('maximum')
+    label = 'integer' if integer else 'number'
+
+    def check(value: Any) -> Any:
+        # bool is an int subclass but never a valid number
+        if value.__class__ is bool or not isinstance(value, (int, float)):
+            if type_check:
+                _fail(path, f'expected {label}')
+            return value
+        if integer and value.__class__ is not int:
+            if not (isinstance(value, float) and value.is_integer()):
+                _fail(path, 'expected integer')
+            # JSON encoders may write 3 as 3.0
+            value = int(value)
+        if minimum is not None and value < minimum:
+            _fail(path, f'must be >= {minimum}')
+        if maximum is not None and value > maximum:
+            _fail(path, f'must be <= {maximum}')
+        return value
+    return check
+
+def _compile_array(schema: Dict[str, Any], path: str, sanitize: bool, type_check: bool) -> Validator:
+    items = schema.get('items')
+    item_check = _compile_json(items, f'{path}[]', sanitize, type_check) if isinstance(items, dict) else None
+    if item_check is _identity:
+        item_check = None
+    if item_check is None and sanitize:
+        item_check = sanitize_value
+    min_items = schema.get('minItems', 0)
+    max_items = schema.get('maxItems')
+
+    def check(value: Any) -> Any:
+        if not isinstance(value, (list, tuple)):
+            if type_check:
+                _fail(path, 'expected array')
+            return value
+        if len(value) < min_items or (max_items is not None and len(value) > max_items):
+            _fail(path, f'must have {_bounds(min_items, max_items, "items")}')
+        if item_check is None:
+            return list(value)
+        return [item_check(item) for item in value]
+    return check
+
+def _compile_object(schema: Dict[str, Any], path: str, sanitize: bool, type_check: bool) -> Validator:
+    required = set(schema.get('required', ()))
+    fields: List[Tuple[str, Validator, bool, Any]] = []
+    for name, property_schema in (schema.get('properties') or {}).items():
+        check = _compile_json(property_schema, f'{path}.{name}' if path else name, sanitize, type_check)
+        fields.append((name, check, name in required, property_schema.get('default', _MISSING)))
+    for name in sorted(required - set(schema.get('properties') or {})):
+        # Required without a property schema: only presence is checked
+        fields.append((name, sanitize_value if sanitize else _identity, True, _MISSING))
+    known = frozenset(name for name, _, _, _ in fields)
+    additional = schema.get('additionalProperties', True)
+    if isinstance(additional, dict):
+        extra_check = _compile_json(additional, f'{path}.*' if path else '*', sanitize, type_check)
+    elif additional is False:
+        extra_check = None
+    else:
+        extra_check = sanitize_value if sanitize else _identity
+
+    def check(value: Any) -> Any:
+        if not isinstance(value, dict):
+            if type_check:
+                _fail(path, 'expected object')
+            return value
+        result = {}
+        found = 0
+        for name, convert, is_required, default in fields:
+            field_value = value.get(name, _MISSING)
+            if field_value is _MISSING:
+                if is_required:
+                    _fail(f'{path}.{name}' if path else name, 'missing required field')
+                if default is not _MISSING:
+                    result[name] = default
+                continue
+            result[name] = convert(field_value)
+            found += 1
+        if len(value) > found:
+            for key, field_value in value.items():
+                if key in known:
+                    continue
+                if extra_check is None:
+                    _fail(f'{path}.{key}' if path else key, 'unexpected field')
+                result[key] = extra_check(field_value)
+        return result
+    return check
@@ -5,38 +5,140 @@ querying a knowledge base, enabling Retrieval-Augmented Generation (RAG)
 for enhanced response generation.
 """
 
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Awaitable, Callable, Optional
 from pathlib import Path
+from .config import KnowledgeBaseConfig
+from .core import KnowledgeBase
+from .cache import SemanticCache
+from .embeddings import EmbeddingProvider, HashingEmbedder
+from .filters import freeze_filters
+from .loaders import DirectoryLoader, Parser
+
+# Given the question and the packed context, return the answer text
+AnswerGenerator = Callable[[str, str], Awaitable[str]]
+
+ANSWER_PROMPT = (
+    "Answer the question using only the context below. "
+    "If the context does not contain the answer, say that you do not know."
+)
 
 class KnowledgeBaseAgent:
     """Agent for knowledge base management and querying."""
 
-    def __init__(self, openai_api_key: str):
+    def __init__(self, openai_api_key: str, config: Optional[KnowledgeBaseConfig] = None,
+                 answer_generator: Optional[AnswerGenerator] = None):
         """Initialize the Knowledge Base agent.
 
         Args:
             openai_api_key: OpenAI API key for accessing GPT services
+            config: Knowledge base configuration, defaults to KnowledgeBaseConfig()
+            answer_generator: Coroutine producing an answer from (query, context),
+                defaults to an OpenAI chat completion with config.model_name
         """
         self.api_key = openai_api_key
-        self.index = None
+        self.config = config or KnowledgeBaseConfig()
+        self.index: Optional[KnowledgeBase] = None
+        self.answer_generator = answer_generator or self._complete
+        self._client = None
+        settings = self.config.answer_settings
+        self.answer_cache: Optional[SemanticCache] = None
+        if settings.get('cache_enabled', True):
+            self.answer_cache = SemanticCache(
+                settings.get('cache_size', 1024),
+                settings.get('cache_ttl', 3600),
+                settings.get('cache_threshold', 0.92)
+            )
+        self._cache_embedder: Optional[EmbeddingProvider] = None
 
-    async def build_index(self, documents_path: Path) -> None:
+    async def build_index(self, documents_path: Path, parsers: Optional[Dict[str, Parser]] = None,
+                          workers: Optional[int] = None) -> Dict[str, Any]:
         """Build knowledge index from documents.
 
+        Files are parsed in a process pool and their sections are streamed
+        into the bulk ingestion pipeline as each file finishes.
+
         Args:
             documents_path: Path to directory containing documents
+            parsers: Extra parsers keyed by file suffix, e.g. {'.rst': parse_rst}
+            workers: Parsing processes, defaults to the CPU count
+
+        Returns:
+            Ingestion summary plus the number of files loaded and failed
         """
-        # TODO: Implement index building logic using LlamaIndex
-        raise NotImplementedError
+        if self.index is None:
+            self.index = KnowledgeBase(self.config)
+        loader = DirectoryLoader(documents_path, parsers=parsers, workers=workers)
+        result = await self.index.add_knowledge_batch(loader.load())
+        result['files_loaded'] = loader.files_loaded
+        result['files_failed'] = loader.files_failed
+        return result
 
-    async def query_knowledge(self, query: str) -> Dict[str, Any]:
-        """Query the knowledge base.
+    async def query_knowledge(self, query: str, filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Answer a query from the retrieved context, reusing semantically cached answers that are still current.
 
         Args:
             query: User's natural language query
+            filters: Metadata filters for retrieval, see MetadataIndex
 
         Returns:
-            Dictionary containing query results and relevant sources
+            Dictionary containing the answer, its sources and whether it came from the cache
         """
-        # TODO: Implement knowledge querying logic
-        raise NotImplementedError
\ No newline at end of file
+        if self.index is None:
+            self.index = KnowledgeBase(self.config)
+        index = self.index
+        frozen_filters = freeze_filters(filters)
+        embedding = None
+        if self.answer_cache is not None:
+            embedding = self.cache_embedder.embed([query])[0]
+            cached = self.answer_cache.get(embedding, frozen_filters, index._is_cache_entry_fresh)
+            if cached is not None:
+                answer, similarity = cached
+                return {**answer, 'query': query, 'cached': True, 'similarity': similarity}
+
+        # The answer depends on what the retrieval read: the generation of its snapshot and the retrievers it used
+        retrieval = await index.retrieve_with_dependencies(query, filters=filters)
+        results = retrieval.value
+        context = index.pack_context(results, self.config.answer_settings.get('context_tokens', 3000))
+        answer = {
+            'answer': await self.answer_generator(query, context['context']),
+            'sources': [
+                {key: result[key] for key in ('knowledge_id', 'chunk_index', 'start', 'end', 'metadata',
+                                              'relevance_score') if key in result}
+                for result in results
+            ]
+        }
+        if self.answer_cache is not None:
+            self.answer_cache.put(embedding, answer, retrieval.generation, frozen_filters, retrieval.dependencies)
+        return {**answer, 'query': query, 'cached': False}
+
+    @property
+    def cache_embedder(self) -> EmbeddingProvider:
+        """Embedder for answer cache keys: the index's own, or an offline hashing embedder"""
+        if self.index is not None and self.index.embedder is not None:
+            return self.index.embedder
+        if self._cache_embedder is None:
+            self._cache_embedder = HashingEmbedder(self.config.answer_settings.get('cache_dimension', 256))
+        return self._cache_embedder
+
+    async def _complete(self, query: str, context: str) -> str:
+        """Default answer generator: one OpenAI chat completion over the retrieved context"""
+        if self._client is None:
+            try:
+                from openai import AsyncOpenAI
+            except ImportError as e:
+                raise ImportError("query_knowledge requires the openai package") from e
+            self._client = AsyncOpenAI(api_key=self.api_key)
+        response = await self._client.chat.completions.create(
+            model=self.config.model_name,
+            temperature=self.config.temperature,
+            max_tokens=self.config.max_tokens,
+            messages=[
+                {'role': 'system', 'content': ANSWER_PROMPT},
+                {'role': 'user', 'content': f"Context:\n{context}\n\nQuestion: {query}"}
+            ]
+        )
+        return response.choices[0].message.content
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters of the semantic answer cache"""
+        return self.answer_cache.stats() if self.answer_cache is not None else {'status': 'cache_disabled'}
\ No newline at end of file
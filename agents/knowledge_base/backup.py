@@ -0,0 +1,196 @@
+from typing import Dict, Any, Iterator, List, Optional
+import argparse
+import base64
+import gzip
+import json
+import logging
+import os
+import uuid
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+from .utils import make_chunk_id
+
+logger = logging.getLogger(__name__)
+
+# Record fields carried in a backup besides content/metadata/source
+_EXTRA_FIELDS = ('timestamp', 'updated_at', 'versions')
+
+def encode_vector(vector: Any) -> str:
+    """Compact JSON-safe form of an embedding: base64 of its float32 bytes"""
+    return base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode('ascii')
+
+def decode_vector(encoded: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(encoded), dtype=np.float32)
+
+class BackupManager:
+    """Incremental backup chain: one full base snapshot followed by deltas.
+
+    Layout of the backup directory::
+
+        manifest.json                       chain id, the ordered list of backups and the config they were made with
+        manifest-<chain>.json               manifests of earlier, superseded chains
+        backup-<chain>-<n>-full.jsonl.gz    every entry at the time of the base backup
+        backup-<chain>-<n>-delta.jsonl.gz   entries written or deleted since backup n-1
+    """
+
+    def __init__(self, path: str, compression_level: int = 6):
+        self.path = Path(path)
+        self.compression_level = compression_level
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.path / 'manifest.json'
+
+    def read_manifest(self) -> Optional[Dict[str, Any]]:
+        if not self.manifest_path.exists():
+            return None
+        return json.loads(self.manifest_path.read_text(encoding='utf-8'))
+
+    def _write_manifest(self, manifest: Dict[str, Any]) -> None:
+        tmp = self.path / 'manifest.json.tmp'
+        tmp.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding='utf-8')
+        os.replace(tmp, self.manifest_path)
+
+    def backup(self, knowledge_base, full: bool = False) -> Dict[str, Any]:
+        """Write a full or delta backup of a knowledge base and append it to the manifest"""
+        self.path.mkdir(parents=True, exist_ok=True)
+        manifest = self.read_manifest()
+        if manifest is None or manifest['chain_id'] != knowledge_base._backup_chain:
+            full = True
+        if full:
+            if manifest is not None:
+                # Keep the superseded chain restorable
+                os.replace(self.manifest_path, self.path / f"manifest-{manifest['chain_id']}.json")
+            manifest = {'chain_id': uuid.uuid4().hex[:12], 'backups': []}
+            knowledge_ids = list(knowledge_base.knowledge_store)
+        else:
+            knowledge_ids = sorted(knowledge_base._backup_dirty)
+
+        sequence = len(manifest['backups'])
+        kind = 'full' if full else 'delta'
+        filename = f"backup-{manifest['chain_id']}-{sequence:04d}-{kind}.jsonl.gz"
+        tmp = self.path / (filename + '.tmp')
+        written = deleted = 0
+        with gzip.open(tmp, 'wt', encoding='utf-8', compresslevel=self.compression_level) as f:
+            for knowledge_id in knowledge_ids:
+                entry = self._entry(knowledge_base, knowledge_id)
+                if entry['op'] == 'put':
+                    written += 1
+                else:
+                    deleted += 1
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        os.replace(tmp, self.path / filename)
+
+        record = {
+            'sequence': sequence,
+            'type': kind,
+            'file': filename,
+            'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'documents': written,
+            'deleted': deleted,
+            'bytes': (self.path / filename).stat().st_size
+        }
+        manifest['backups'].append(record)
+        manifest['config'] = json.loads(knowledge_base.config.model_dump_json())
+        self._write_manifest(manifest)
+        knowledge_base._backup_chain = manifest['chain_id']
+        knowledge_base._backup_dirty.clear()
+        logger.info(f"Wrote {kind} backup {sequence} with {written} entries and {deleted} deletions")
+        return record
+
+    @staticmethod
+    def _entry(knowledge_base, knowledge_id: str) -> Dict[str, Any]:
+        """Backup line for one entry: its record and chunk embeddings, or a deletion"""
+        knowledge = knowledge_base.knowledge_store.get(knowledge_id)
+        if knowledge is None:
+            return {'op': 'delete', 'knowledge_id': knowledge_id}
+        record = {field: knowledge[field] for field in ('content', 'metadata', 'source')}
+        record.update({field: knowledge[field] for field in _EXTRA_FIELDS if field in knowledge})
+        vectors = [knowledge_base.embeddings.get(make_chunk_id(knowledge_id, chunk_hash))
+                   for chunk_hash in knowledge['chunk_hashes']]
+        if vectors and all(vector is not None for vector in vectors):
+            record['embeddings'] = [encode_vector(vector) for vector in vectors]
+        return {'op': 'put', 'knowledge_id': knowledge_id, 'record': record}
+
+    def iter_chain(self, upto: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Stream the entries of the base backup and every delta up to sequence ``upto``"""
+        manifest = self.read_manifest()
+        if manifest is None:
+            raise ValueError(f"No backup manifest in {self.path}")
+        for backup in manifest['backups']:
+            if upto is not None and backup['sequence'] > upto:
+                break
+            with gzip.open(self.path / backup['file'], 'rt', encoding='utf-8') as f:
+                for line in f:
+                    yield json.loads(line)
+
+    def restore(self, knowledge_base, upto: Optional[int] = None) -> Dict[str, int]:
+        """Apply the backup chain to an empty knowledge base"""
+        if knowledge_base.knowledge_store:
+            raise ValueError("Backups can only be restored into an empty knowledge base")
+        restored = deleted = 0
+        for entry in self.iter_chain(upto):
+            knowledge_id = entry['knowledge_id']
+            if knowledge_id in knowledge_base.knowledge_store:
+                knowledge_base._remove_knowledge(knowledge_id)
+            if entry['op'] == 'delete':
+                deleted += 1
+                continue
+            record = dict(entry['record'])
+            if record.get('embeddings') is not None:
+                record['embeddings'] = [decode_vector(vector) for vector in record['embeddings']]
+            extra_fields = {field: record[field] for field in ('updated_at', 'versions') if field in record}
+            knowledge_base._insert_knowledge(knowledge_id, record, record.get('timestamp'), extra_fields=extra_fields)
+            restored += 1
+
+        # The restored state is exactly the chain's last backup, so the next delta can extend it
+        knowledge_base._backup_chain = self.read_manifest()['chain_id'] if upto is None else None
+        knowledge_base._backup_dirty.clear()
+        if knowledge_base.storage is not None:
+            knowledge_base.checkpoint()
+        return {'restored': restored, 'deleted': deleted, 'documents': len(knowledge_base.knowledge_store)}
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Command line entry point: back up or restore an mmap-backed knowledge base"""
+    from .config import KnowledgeBaseConfig
+    from .core import KnowledgeBase
+
+    parser = argparse.ArgumentParser(description='Knowledge base backups')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    backup_parser = subparsers.add_parser('backup', help='write a full or delta backup')
+    backup_parser.add_argument('storage', help='mmap storage directory of the knowledge base')
+    backup_parser.add_argument('backup_dir')
+    backup_parser.add_argument('--full', action='store_true', help='start a new chain with a full backup')
+    backup_parser.add_argument('--config', help='KnowledgeBaseConfig JSON file, defaults to the one saved in the storage directory')
+    restore_parser = subparsers.add_parser('restore', help='apply a backup chain to a new storage directory')
+    restore_parser.add_argument('backup_dir')
+    restore_parser.add_argument('storage', help='empty mmap storage directory to restore into')
+    restore_parser.add_argument('--upto', type=int, default=None, help='last backup sequence to apply')
+    restore_parser.add_argument('--config', help='KnowledgeBaseConfig JSON file, defaults to the one in the backup manifest')
+    args = parser.parse_args(argv)
+
+    # Chunking and embedding settings must match the ones the entries were written with
+    if args.config is not None:
+        saved = json.loads(Path(args.config).read_text(encoding='utf-8'))
+    elif args.command == 'backup':
+        path = Path(args.storage) / 'config.json'
+        saved = json.loads(path.read_text(encoding='utf-8')) if path.exists() else None
+    else:
+        saved = (BackupManager(args.backup_dir).read_manifest() or {}).get('config')
+    if saved is None:
+        parser.error('no saved configuration found, pass --config')
+    config = KnowledgeBaseConfig.model_validate(saved)
+    config.storage_settings = {**config.storage_settings, 'backend': 'mmap', 'path': args.storage}
+    knowledge_base = KnowledgeBase(config)
+    try:
+        if args.command == 'backup':
+            result = knowledge_base.backup_knowledge(args.backup_dir, full=args.full)
+        else:
+            result = knowledge_base.restore_knowledge(args.backup_dir, args.upto)
+    finally:
+        knowledge_base.close()
+    print(json.dumps(result, ensure_ascii=False))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+from typing import Dict, Any, Callable, Hashable, Optional, Tuple
+from collections import OrderedDict
+from dataclasses import dataclass, field
+import itertools
+import logging
+import time
+import numpy as np
+from .vector_store import EmbeddingStore
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class CacheEntry:
+    """Cached value plus the store generation it was computed at"""
+    value: Any
+    generation: int
+    created_at: float
+    dependencies: Dict[str, Any] = field(default_factory=dict)
+
+class QueryCache:
+    """Bounded LRU cache with a TTL and validity checks on lookup.
+
+    Entries are never flushed wholesale on writes; instead ``get`` asks a
+    caller-supplied validator whether anything the entry depends on has
+    changed since its generation, and drops just that entry if so.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = 300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: 'OrderedDict[Hashable, CacheEntry]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, is_valid: Optional[Callable[[CacheEntry], bool]] = None) -> Optional[Any]:
+        """Return the cached value for a key, or None on a miss"""
+        entry = self.get_entry(key, is_valid)
+        return entry.value if entry is not None else None
+
+    def get_entry(self, key: Hashable, is_valid: Optional[Callable[[CacheEntry], bool]] = None) -> Optional[CacheEntry]:
+        """Return the cached entry for a key, with its generation and dependencies, or None on a miss"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if self.ttl is not None and time.monotonic() - entry.created_at > self.ttl:
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        if is_valid is not None and not is_valid(entry):
+            del self._entries[key]
+            self.invalidations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: Hashable, value: Any, generation: int, dependencies: Optional[Dict[str, Any]] = None) -> None:
+        """Cache a value, evicting the least recently used entries beyond max_size"""
+        if self.max_size <= 0:
+            return
+        self._entries[key] = CacheEntry(value, generation, time.monotonic(), dependencies or {})
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for sizing the cache"""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations
+        }
+
+class SemanticCache:
+    """LRU cache with a TTL whose lookups match by embedding similarity.
+
+    A lookup returns the most similar cached entry whose cosine similarity
+    to the query embedding reaches ``threshold``, so paraphrases of an
+    earlier query hit. Entries live in separate partitions (e.g. per filter
+    spec) that never match each other. As with QueryCache, ``is_valid``
+    decides on lookup whether an entry is still current; expired and
+    invalid candidates are dropped and the next best one is tried.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = 3600, threshold: float = 0.92,
+                 candidates: int = 4):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.threshold = threshold
+        self.candidates = candidates
+        self._entries: 'OrderedDict[str, Tuple[Hashable, CacheEntry]]' = OrderedDict()
+        self._stores: Dict[Hashable, EmbeddingStore] = {}
+        self._ids = itertools.count()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remove(self, entry_id: str) -> None:
+        partition, _ = self._entries.pop(entry_id)
+        store = self._stores[partition]
+        store.remove([entry_id])
+        if not len(store):
+            del self._stores[partition]
+
+    def get(self, embedding: Any, partition: Hashable = None,
+            is_valid: Optional[Callable[[CacheEntry], bool]] = None) -> Optional[Tuple[Any, float]]:
+        """Return (value, similarity) of the closest valid entry, or None on a miss"""
+        store = self._stores.get(partition)
+        if store is None:
+            self.misses += 1
+            return None
+        now = time.monotonic()
+        for entry_id, similarity in store.search(embedding, self.candidates, self.threshold):
+            entry = self._entries[entry_id][1]
+            if self.ttl is not None and now - entry.created_at > self.ttl:
+                self._remove(entry_id)
+                self.expirations += 1
+                continue
+            if is_valid is not None and not is_valid(entry):
+                self._remove(entry_id)
+                self.invalidations += 1
+                continue
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            return entry.value, similarity
+        self.misses += 1
+        return None
+
+    def put(self, embedding: Any, value: Any, generation: int, partition: Hashable = None,
+            dependencies: Optional[Dict[str, Any]] = None) -> None:
+        """Cache a value under an embedding, evicting the least recently used entries beyond max_size"""
+        if self.max_size <= 0:
+            return
+        if not np.any(np.asarray(embedding, dtype=np.float32)):
+            # A zero vector can never be matched
+            return
+        entry_id = str(next(self._ids))
+        store = self._stores.get(partition)
+        if store is None:
+            store = self._stores[partition] = EmbeddingStore(initial_capacity=64)
+        store.add([entry_id], embedding)
+        self._entries[entry_id] = (partition, CacheEntry(value, generation, time.monotonic(), dependencies or {}))
+        while len(self._entries) > self.max_size:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._stores.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for sizing the cache and tuning the threshold"""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'threshold': self.threshold,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations
+        }
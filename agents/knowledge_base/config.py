@@ -7,15 +7,81 @@ class KnowledgeBaseConfig(BaseModel):
     temperature: float = 0.3
     max_tokens: int = 1600
     embedding_model: str = "text-embedding-ada-002"
+    embedding_settings: Dict[str, Any] = {
+        "provider": None,  # None disables embedding, "hashing" is the offline embedder
+        "dimension": 1536,
+        "batch_size": 64,
+        "cache_path": None  # SQLite file for the embedding cache, in memory when None
+    }
     knowledge_settings: Dict[str, Any] = {
         "chunk_size": 1000,
         "chunk_overlap": 200,
-        "index_type": "faiss"
+        "chunk_boundary": None,  # None, "sentence" or "paragraph"
+        "chunk_unit": "chars",  # "chars" (chunk_size/chunk_overlap) or "tokens" (chunk_tokens/chunk_overlap_tokens)
+        "chunk_tokens": 512,
+        "chunk_overlap_tokens": 64,
+        "tokenizer": "regex",  # "regex" (offline estimate) or "tiktoken:<encoding>"
+        "index_type": "flat",  # "flat" (exact), "ivf" (approximate), "int8" or "pq" (compressed)
+        "nlist": 256,  # IVF coarse clusters
+        "nprobe": 8,  # IVF clusters scanned per query
+        "pq_subvectors": 96,  # PQ code bytes per vector, lowered to a divisor of the dimension if needed
+        "rescore": False,  # re-rank compressed candidates against float32 originals kept alongside the codes
+        "rescore_factor": 4,  # candidates rescored per requested result
+        "quantizer_train_size": 1024,  # vectors staged exactly before the quantizer is trained
+        "filter_fields": ["tags", "category"],  # metadata fields indexed for filters=
+        "snapshot_isolation": False,  # segmented copy-on-write indexes; queries read a consistent snapshot
+        "max_segments": 8,  # segments before the background merger compacts them
+        "merge_factor": 4,  # minimum segments combined per merge
+        "memtable_size": 1024,  # buffered chunks and vectors that force a segment to be published
+        "refresh_interval": 1.0  # seconds before buffered writes are published without a query asking for them
+    }
+    ingest_settings: Dict[str, Any] = {
+        "batch_size": 256,  # chunks per embedding call
+        "queue_size": 1024,  # documents buffered between pipeline stages
+        "workers": None,  # chunking processes, defaults to the CPU count
+        "use_processes": True,
+        "group_size": 32  # documents per chunking task
+    }
+    dedup_settings: Dict[str, Any] = {
+        "enabled": False,
+        "policy": "skip",  # "skip", "merge" (metadata into the existing entry) or "version"
+        "threshold": 0.85,  # estimated shingle Jaccard similarity of a near-duplicate
+        "num_perm": 128,  # MinHash signature length
+        "bands": 16,  # LSH bands, num_perm / bands rows each
+        "shingle_size": 3  # tokens per shingle
     }
     retrieval_config: Dict[str, Any] = {
+        "mode": "auto",  # "auto", "lexical", "vector" or "hybrid"
         "top_k": 5,
-        "similarity_threshold": 0.7,
-        "rerank_results": True
+        "similarity_threshold": "auto",  # minimum cosine for vector hits; "auto" uses the embedder's default, None disables
+        "rerank_results": True,
+        "granularity": "chunk",  # "chunk" (matching chunk with offsets) or "document" (whole content)
+        "neighbor_window": 0,  # chunks added on each side of a matching chunk
+        "candidate_k": 50,  # candidates per retriever in hybrid mode
+        "rrf_k": 60,  # reciprocal-rank-fusion damping constant
+        "rerank_top_n": 20,  # fused candidates passed to the reranker
+        "cache_size": 1024,  # cached queries, 0 disables the result cache
+        "cache_ttl": 300  # seconds
+    }
+    answer_settings: Dict[str, Any] = {
+        "context_tokens": 3000,  # retrieved context packed into the prompt
+        "cache_enabled": True,  # semantic answer cache in front of the LLM
+        "cache_threshold": 0.92,  # cosine similarity for a query to reuse a cached answer
+        "cache_size": 1024,  # cached answers, least recently used evicted first
+        "cache_ttl": 3600,  # seconds
+        "cache_dimension": 256  # hashing embedder dimension when no embedding provider is configured
+    }
+    storage_settings: Dict[str, Any] = {
+        "backend": "memory",  # "memory", "mmap" or "sqlite" (WAL database with FTS5 lexical search)
+        "path": None,  # storage directory for the mmap and sqlite backends, or the sqlite database file
+        "checkpoint_interval": 1000,  # logged writes between automatic snapshots
+        "backup_path": None  # directory of the incremental backup chain, in-memory backups when None
+    }
+    namespace_settings: Dict[str, Any] = {
+        "quota_bytes": None,  # per-namespace quota in bytes (see NamespacedKnowledgeBase.quota_usage), writes beyond it fail
+        "max_loaded": 64,  # namespaces kept in memory, least recently used unloaded beyond it
+        "max_loaded_bytes": None,  # memory budget of all loaded namespaces
+        "idle_seconds": 900  # namespaces unused this long are unloaded by unload_idle()
     }
     update_policy: Dict[str, bool] = {
         "auto_update": True,
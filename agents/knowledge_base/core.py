@@ -1,65 +1,652 @@
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, AsyncIterable, Iterable, List, Optional, Set, Tuple, Union
+import asyncio
+import heapq
+from contextlib import contextmanager
 import logging
+import sys
+import time
 from datetime import datetime
+import numpy as np
 from .config import KnowledgeBaseConfig
-from .utils import validate_knowledge_input, process_chunk, calculate_similarity
+from .utils import (validate_knowledge_input, generate_knowledge_id, make_chunk_id, split_chunk_id,
+                    normalize_query, tokenize)
+from .vector_index import create_vector_index
+from .lexical_index import InvertedIndex
+from .embeddings import EmbeddingProvider, create_embedder
+from .persistence import MmapStorage
+from .sqlite_storage import SQLiteStorage
+from .cache import CacheEntry, QueryCache
+from .ingest import IngestionPipeline, PreparedDocument, prepare_document
+from .rerank import Reranker, TermCoverageReranker, reciprocal_rank_fusion
+from .filters import MetadataIndex, freeze_filters
+from .dedup import create_duplicate_detector, merge_metadata
+from .backup import BackupManager
+from .tokenizers import TokenCounter, create_token_counter
+from .segments import IndexSnapshot, SegmentStore
 
 logger = logging.getLogger(__name__)
 
+# Rough in-memory cost of one posting entry (dict slot, key reference, boxed frequency)
+POSTING_BYTES = 72
+
 class KnowledgeBase:
     """Core class for knowledge base management"""
     
-    def __init__(self, config: KnowledgeBaseConfig = None):
+    def __init__(self, config: KnowledgeBaseConfig = None, embedder: Optional[EmbeddingProvider] = None,
+                 reranker: Optional[Reranker] = None, token_counter: Optional[TokenCounter] = None):
         self.config = config or KnowledgeBaseConfig()
+        self.token_counter = token_counter or create_token_counter(self.config.knowledge_settings.get('tokenizer'))
+        self.embedder = embedder or create_embedder(self.config.embedding_settings)
+        self.reranker = reranker or TermCoverageReranker()
         self.knowledge_store: Dict[str, Any] = {}
-        self.embeddings: Dict[str, List[float]] = {}
+        self.embeddings = create_vector_index(self.config.knowledge_settings)
+        self.lexical_index = InvertedIndex()
+        self.metadata_index = MetadataIndex(self.config.knowledge_settings.get('filter_fields', ['tags', 'category']))
+        self.dedup = create_duplicate_detector(self.config.dedup_settings)
+        self.storage = None
+        self.segments: Optional[SegmentStore] = None
+        self._pipeline: Optional[IngestionPipeline] = None
+        
+        # Write generations let the query cache invalidate only affected entries
+        self.generation = 0
+        self._vector_generation = 0
+        self._metadata_generation = 0
+        self._term_generations: Dict[str, int] = {}
+        self._knowledge_generations: Dict[str, int] = {}
+        # Entries written or deleted since the last backup of chain _backup_chain
+        self._backup_dirty: Set[str] = set()
+        self._backup_chain: Optional[str] = None
+        # Bytes of the content strings held in knowledge_store, kept current by every write
+        self._content_bytes = 0
+        self.query_cache = QueryCache(
+            self.config.retrieval_config.get('cache_size', 1024),
+            self.config.retrieval_config.get('cache_ttl', 300)
+        )
+        
+        storage_settings = self.config.storage_settings
+        backend = storage_settings.get('backend', 'memory')
+        if backend == 'mmap':
+            self.storage = MmapStorage(storage_settings['path'], storage_settings.get('checkpoint_interval', 1000))
+            self.storage.save_config(self.config)
+            self.storage.load(self)
+        elif backend == 'sqlite':
+            self.storage = SQLiteStorage(storage_settings['path'], storage_settings.get('checkpoint_interval', 1000))
+            self.storage.load(self)
+        elif backend != 'memory':
+            raise ValueError(f"Unknown storage backend: {backend}")
+        self._content_bytes = self._count_content_bytes()
+        
+        # With snapshot isolation the indexes become segmented views; wrapping after load lets replay use plain ones
+        settings = self.config.knowledge_settings
+        if settings.get('snapshot_isolation'):
+            if backend == 'sqlite':
+                raise ValueError("snapshot_isolation needs an in-memory lexical index, not the sqlite backend")
+            self.segments = SegmentStore.from_indexes(
+                self.knowledge_store, self.lexical_index, self.embeddings,
+                lambda: create_vector_index(settings),
+                max_segments=settings.get('max_segments', 8),
+                merge_factor=settings.get('merge_factor', 4),
+                memtable_size=settings.get('memtable_size', 1024),
+                refresh_interval=settings.get('refresh_interval', 1.0),
+                filter_fields=self.metadata_index.fields,
+                clock=lambda: self.generation
+            )
+            self.lexical_index = self.segments.lexical
+            self.embeddings = self.segments.vectors
         
     async def add_knowledge(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """Add new knowledge to the knowledge base"""
         if not validate_knowledge_input(data):
             raise ValueError("Invalid knowledge input format")
             
-        knowledge_id = f"k_{datetime.now().timestamp()}"
-        chunks = process_chunk(
-            data['content'],
-            self.config.knowledge_settings['chunk_size'],
-            self.config.knowledge_settings['chunk_overlap']
-        )
+        return self._add_prepared(data, self._prepare(data['content']))
+    
+    async def add_knowledge_batch(self, documents: Union[Iterable[Dict[str, Any]], AsyncIterable[Dict[str, Any]]],
+                                  **pipeline_options) -> Dict[str, Any]:
+        """Add many documents through the pipelined ingestion path"""
+        if pipeline_options:
+            # One-off settings get their own pipeline, and pool, for this call only
+            pipeline = IngestionPipeline(self, **{**self.config.ingest_settings, **pipeline_options})
+        else:
+            if self._pipeline is None:
+                self._pipeline = IngestionPipeline(self, **self.config.ingest_settings)
+            pipeline = self._pipeline
+        try:
+            if self.storage is None:
+                return await pipeline.run(documents)
+            with self.storage.batch():
+                return await pipeline.run(documents)
+        finally:
+            if pipeline is not self._pipeline:
+                pipeline.close()
+    
+    def _add_prepared(self, data: Dict[str, Any], prepared: PreparedDocument,
+                      embeddings: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Insert an already chunked document under a fresh id and log the write.
+
+        With dedup enabled, a near-duplicate of an existing entry is instead
+        skipped, merged into it or recorded as its new version.
+        """
+        signature = None
+        if self.dedup is not None:
+            signature = self.dedup.signature(prepared.chunks(data['content']).values())
+            duplicate = self.dedup.find(signature)
+            if duplicate is not None:
+                return self._resolve_duplicate(*duplicate, data)
+        knowledge_id = generate_knowledge_id()
+        chunks_count = self._insert_knowledge(knowledge_id, data, prepared=prepared, embeddings=embeddings,
+                                              signature=signature)
+        self._log_operation('add', knowledge_id, data)
         
-        self.knowledge_store[knowledge_id] = {
-            'content': data['content'],
-            'metadata': data['metadata'],
-            'source': data['source'],
-            'chunks': chunks,
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        return {
+            'knowledge_id': knowledge_id,
+            'chunks_count': chunks_count
         }
+    
+    def _insert_knowledge(self, knowledge_id: str, data: Dict[str, Any], timestamp: Optional[str] = None,
+                          prepared: Optional[PreparedDocument] = None,
+                          embeddings: Optional[Dict[str, Any]] = None,
+                          signature: Optional[np.ndarray] = None,
+                          extra_fields: Optional[Dict[str, Any]] = None) -> int:
+        """Store, chunk and index a new knowledge entry; ``extra_fields`` (e.g. restored versions) join its record"""
+        prepared = prepared or self._prepare(data['content'])
+        if embeddings is None:
+            embeddings = self._supplied_embeddings(data, prepared.hashes)
         
-        # TODO: Generate and store embeddings
+        with self._writing():
+            self.knowledge_store[knowledge_id] = {
+                'content': data['content'],
+                'metadata': data['metadata'],
+                'source': data['source'],
+                'chunk_spans': prepared.spans,
+                'chunk_hashes': prepared.hashes,
+                'chunk_tokens': prepared.token_counts,
+                'timestamp': timestamp or datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                **(extra_fields or {})
+            }
+            self._content_bytes += self._record_bytes(self.knowledge_store[knowledge_id])
+            chunks = prepared.chunks(data['content'])
+            self._index_metadata(knowledge_id)
+            self._index_chunks(knowledge_id, chunks, embeddings, prepared.term_counts)
+            if self.dedup is not None:
+                self.dedup.add(knowledge_id, signature if signature is not None else self.dedup.signature(chunks.values()))
+        return len(prepared.hashes)
+    
+    @contextmanager
+    def _writing(self):
+        """Make the enclosed index changes visible to queries as one atomic snapshot.
+        
+        A no-op without snapshot isolation; otherwise the outermost block
+        holds the segment writer lock and publishes on exit.
+        """
+        if self.segments is None:
+            yield
+            return
+        with self.segments.writing():
+            yield
+    
+    def _resolve_duplicate(self, duplicate_id: str, similarity: float, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Apply the dedup policy to a document that near-duplicates an existing entry"""
+        policy = self.config.dedup_settings.get('policy', 'skip')
+        result = {
+            'knowledge_id': duplicate_id,
+            'chunks_count': 0,
+            'duplicate_of': duplicate_id,
+            'similarity': similarity
+        }
+        if policy == 'merge':
+            self._merge_metadata(duplicate_id, data['metadata'])
+            self._log_operation('merge', duplicate_id, {'metadata': data['metadata']})
+            result['dedup_action'] = 'merged'
+        elif policy == 'version':
+            result.update(self._add_version(duplicate_id, data))
+            self._log_operation('version', duplicate_id, data)
+            result['dedup_action'] = 'versioned'
+            result['version'] = len(self.knowledge_store[duplicate_id]['versions']) + 1
+        else:
+            result['dedup_action'] = 'skipped'
+        logger.info(f"Near-duplicate of {duplicate_id} (similarity {similarity:.2f}) {result['dedup_action']}")
+        return result
+    
+    def _merge_metadata(self, knowledge_id: str, metadata: Dict[str, Any]) -> None:
+        """Fold a duplicate's metadata into an existing entry"""
+        with self._writing():
+            knowledge = self.knowledge_store[knowledge_id]
+            self.knowledge_store[knowledge_id] = {**knowledge, 'metadata': merge_metadata(knowledge['metadata'], metadata)}
+            self._index_metadata(knowledge_id)
+            self._bump_generation(knowledge_id)
+    
+    def _add_version(self, knowledge_id: str, data: Dict[str, Any], timestamp: Optional[str] = None) -> Dict[str, int]:
+        """Make a near-duplicate the current content of an entry, keeping the previous content as a version"""
+        with self._writing():
+            knowledge = self.knowledge_store[knowledge_id]
+            self.knowledge_store[knowledge_id] = {**knowledge, 'versions': knowledge.get('versions', []) + [{
+                'content': knowledge['content'],
+                'metadata': knowledge['metadata'],
+                'source': knowledge['source'],
+                'timestamp': knowledge.get('updated_at', knowledge['timestamp'])
+            }]}
+            self._content_bytes += sys.getsizeof(knowledge['content'])
+            return self._replace_knowledge(knowledge_id, data, timestamp)
+    
+    def _chunk_args(self, tokenize_chunks: bool = False) -> Tuple:
+        """Positional chunking arguments of prepare_document after the content"""
+        settings = self.config.knowledge_settings
+        if settings.get('chunk_unit', 'chars') == 'tokens':
+            size, overlap = settings.get('chunk_tokens', 512), settings.get('chunk_overlap_tokens', 64)
+        else:
+            size, overlap = settings['chunk_size'], settings['chunk_overlap']
+        return (size, overlap, settings.get('chunk_boundary'), tokenize_chunks, self.token_counter,
+                settings.get('chunk_unit', 'chars'))
+    
+    def _prepare(self, content: str) -> PreparedDocument:
+        """Chunk and hash content with the configured chunk settings"""
+        return prepare_document(content, *self._chunk_args())
+    
+    def _iter_chunks(self, knowledge_id: str):
+        """Yield the text of each chunk of a knowledge entry, sliced on demand"""
+        knowledge = self.knowledge_store[knowledge_id]
+        content = knowledge['content']
+        for start, end in knowledge['chunk_spans'].tolist():
+            yield content[start:end]
+    
+    def get_chunks(self, knowledge_id: str) -> List[str]:
+        """Get the chunk texts of a knowledge entry"""
+        if knowledge_id not in self.knowledge_store:
+            raise ValueError(f"Knowledge ID {knowledge_id} not found")
+        return list(self._iter_chunks(knowledge_id))
+    
+    def chunk_token_counts(self, knowledge_id: str) -> np.ndarray:
+        """Cached token count of each chunk of an entry"""
+        knowledge = self.knowledge_store[knowledge_id]
+        if knowledge.get('chunk_tokens') is None:
+            # Entries stored before token counts were cached
+            knowledge['chunk_tokens'] = np.array([self.token_counter.count(chunk)
+                                                  for chunk in self._iter_chunks(knowledge_id)], dtype=np.int32)
+        return knowledge['chunk_tokens']
+    
+    def pack_context(self, results: List[Dict[str, Any]], max_tokens: int, separator: str = '\n\n') -> Dict[str, Any]:
+        """Pack retrieved chunks, best result first, into a prompt context of at most ``max_tokens`` tokens.
         
+        Uses the cached per-chunk token counts, so nothing is re-tokenized.
+        Chunk results contribute the chunks of their ``window``; whole
+        entries contribute all their chunks in order. Chunks that do not fit
+        are skipped so smaller later ones can still fill the budget.
+        """
+        separator_tokens = self.token_counter.count(separator) if separator else 0
+        parts: List[str] = []
+        packed: List[Dict[str, Any]] = []
+        used = 0
+        for result in results:
+            knowledge_id = result['knowledge_id']
+            if knowledge_id not in self.knowledge_store:
+                continue
+            counts = self.chunk_token_counts(knowledge_id)
+            spans = self.knowledge_store[knowledge_id]['chunk_spans']
+            if result.get('window') is not None:
+                indexes = range(result['window'][0], result['window'][1] + 1)
+            elif result.get('chunk_index') is not None:
+                indexes = [result['chunk_index']]
+            else:
+                indexes = range(len(spans))
+            for index in indexes:
+                cost = int(counts[index]) + (separator_tokens if parts else 0)
+                if used + cost > max_tokens:
+                    continue
+                start, end = spans[index]
+                parts.append(self.knowledge_store[knowledge_id]['content'][start:end])
+                packed.append({'knowledge_id': knowledge_id, 'chunk_index': int(index), 'tokens': int(counts[index])})
+                used += cost
         return {
-            'knowledge_id': knowledge_id,
-            'chunks_count': len(chunks)
+            'context': separator.join(parts),
+            'tokens': used,
+            'chunks': packed
         }
     
-    async def retrieve_knowledge(self, query: str, top_k: int = None) -> List[Dict[str, Any]]:
-        """Retrieve relevant knowledge based on query"""
+    def _index_chunks(self, knowledge_id: str, chunks: Dict[str, str],
+                      embeddings: Optional[Dict[str, Any]] = None,
+                      term_counts: Optional[Dict[str, Dict[str, int]]] = None) -> None:
+        """Index chunks (keyed by content hash) lexically and, when possible, by embedding"""
+        ids = [make_chunk_id(knowledge_id, chunk_hash) for chunk_hash in chunks]
+        terms = set()
+        for chunk_id, (chunk_hash, chunk) in zip(ids, chunks.items()):
+            terms |= self.lexical_index.add(chunk_id, chunk, term_counts.get(chunk_hash) if term_counts else None)
+        
+        vectors = None
+        if chunks and embeddings is not None:
+            vectors = [embeddings[chunk_hash] for chunk_hash in chunks]
+        elif chunks and self.embedder is not None:
+            vectors = self.embedder.embed(list(chunks.values()))
+        if vectors is not None:
+            self.embeddings.add(ids, vectors)
+        self._bump_generation(knowledge_id, terms, vectors_changed=vectors is not None)
+    
+    def _unindex_chunks(self, knowledge_id: str, chunks: Dict[str, str]) -> None:
+        """Remove chunks (keyed by content hash) from the lexical and vector indexes"""
+        ids = [make_chunk_id(knowledge_id, chunk_hash) for chunk_hash in chunks]
+        terms = set()
+        for chunk_id, chunk in zip(ids, chunks.values()):
+            terms |= self.lexical_index.remove(chunk_id, chunk)
+        vectors_changed = self.embeddings.remove(ids) > 0
+        self._bump_generation(knowledge_id, terms, vectors_changed)
+    
+    def _index_metadata(self, knowledge_id: str, remove: bool = False) -> None:
+        """Refresh the filter indexes for one entry"""
+        if remove:
+            self.metadata_index.remove(knowledge_id)
+        else:
+            self.metadata_index.add(knowledge_id, self.knowledge_store[knowledge_id])
+        self.generation += 1
+        self._metadata_generation = self.generation
+    
+    def _bump_generation(self, knowledge_id: str, terms: Set[str] = frozenset(), vectors_changed: bool = False) -> None:
+        """Advance the store generation and record what a write touched"""
+        self.generation += 1
+        self._knowledge_generations[knowledge_id] = self.generation
+        self._backup_dirty.add(knowledge_id)
+        if self.segments is not None:
+            self.segments.record_changed(knowledge_id)
+        for term in terms:
+            self._term_generations[term] = self.generation
+        if vectors_changed:
+            self._vector_generation = self.generation
+    
+    def _is_cache_entry_fresh(self, entry: CacheEntry) -> bool:
+        """Check that no write since the entry was cached could change its results"""
+        for knowledge_id in entry.dependencies['knowledge_ids']:
+            if self._knowledge_generations.get(knowledge_id, 0) > entry.generation:
+                return False
+        if entry.dependencies.get('filters') is not None and self._metadata_generation > entry.generation:
+            return False
+        mode = entry.dependencies['mode']
+        if mode in ('vector', 'hybrid') and self._vector_generation > entry.generation:
+            return False
+        if mode in ('lexical', 'hybrid'):
+            return all(self._term_generations.get(term, 0) <= entry.generation
+                       for term in entry.dependencies['terms'])
+        return True
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss/eviction counters of the query result cache"""
+        return self.query_cache.stats()
+    
+    def _chunk_map(self, knowledge_id: str) -> Dict[str, str]:
+        """Map each distinct chunk hash of an entry to its text"""
+        return dict(zip(self.knowledge_store[knowledge_id]['chunk_hashes'], self._iter_chunks(knowledge_id)))
+    
+    def _snapshot(self) -> Optional[IndexSnapshot]:
+        """The index snapshot a query should hold, None without snapshot isolation.
+        
+        Buffered writes are published first unless another thread is
+        mid-write, in which case the query reads the last published snapshot.
+        """
+        return self.segments.refresh(wait=False) if self.segments is not None else None
+    
+    def _record(self, knowledge_id: str, snapshot: Optional[IndexSnapshot] = None) -> Optional[Dict[str, Any]]:
+        """A knowledge record as seen by a query holding ``snapshot``"""
+        if snapshot is not None:
+            return snapshot.record(knowledge_id)
+        return self.knowledge_store.get(knowledge_id)
+    
+    def _allowed_chunks(self, filters: Optional[Dict[str, Any]],
+                        snapshot: Optional[IndexSnapshot] = None) -> Optional[Set[str]]:
+        """Chunk ids of the entries matching a filter spec, or None when unfiltered"""
+        index = snapshot if snapshot is not None else self.metadata_index
+        knowledge_ids = index.resolve(filters)
+        if knowledge_ids is None:
+            return None
+        allowed = set()
+        for knowledge_id in knowledge_ids:
+            knowledge = self._record(knowledge_id, snapshot)
+            if knowledge is not None:
+                allowed.update(make_chunk_id(knowledge_id, chunk_hash) for chunk_hash in knowledge['chunk_hashes'])
+        return allowed
+    
+    def _lexical_search(self, query: str, top_k: int, allowed: Optional[Set[str]] = None,
+                        snapshot: Optional[IndexSnapshot] = None) -> List[Tuple[str, float, str]]:
+        """Rank knowledge entries by the BM25 score of their best chunk"""
+        best: Dict[str, Tuple[str, float, str]] = {}
+        index = snapshot if snapshot is not None else self.lexical_index
+        if hasattr(index, 'search_knowledge'):
+            # Database-backed indexes rank and limit entries themselves
+            return [(knowledge_id, score, split_chunk_id(chunk_id)[1])
+                    for knowledge_id, score, chunk_id in index.search_knowledge(query, top_k, allowed)]
+        for chunk_id, score in index.score(query, allowed).items():
+            knowledge_id, chunk_hash = split_chunk_id(chunk_id)
+            if knowledge_id not in best or score > best[knowledge_id][1]:
+                best[knowledge_id] = (knowledge_id, score, chunk_hash)
+        return heapq.nlargest(top_k, best.values(), key=lambda item: item[1])
+    
+    @staticmethod
+    def _supplied_embeddings(data: Dict[str, Any], hashes: List[str]) -> Optional[Dict[str, Any]]:
+        """Map caller-supplied per-chunk embeddings onto chunk hashes"""
+        if data.get('embeddings') is None:
+            return None
+        if len(data['embeddings']) != len(hashes):
+            raise ValueError(f"Expected {len(hashes)} chunk embeddings, got {len(data['embeddings'])}")
+        return dict(zip(hashes, data['embeddings']))
+    
+    def _similarity_threshold(self) -> Optional[float]:
+        """Configured minimum cosine of a vector hit, resolving "auto" to the embedder's calibrated default"""
+        threshold = self.config.retrieval_config.get('similarity_threshold', 'auto')
+        if threshold == 'auto':
+            return getattr(self.embedder, 'similarity_threshold', None)
+        return threshold
+    
+    def _vector_search(self, query_embedding: List[float], top_k: int, allowed: Optional[Set[str]] = None,
+                       snapshot: Optional[IndexSnapshot] = None) -> List[Tuple[str, float, str]]:
+        """Rank knowledge entries by their best-matching chunk embedding"""
+        threshold = self._similarity_threshold()
+        index = snapshot if snapshot is not None else self.embeddings
+        chunk_k = top_k
+        while True:
+            hits = index.search(query_embedding, chunk_k, threshold, allowed)
+            best: Dict[str, Tuple[str, float, str]] = {}
+            for chunk_id, score in hits:
+                knowledge_id, chunk_hash = split_chunk_id(chunk_id)
+                if knowledge_id not in best:
+                    best[knowledge_id] = (knowledge_id, score, chunk_hash)
+            # Several chunks of one entry can crowd out others; widen the chunk window until enough entries surface
+            if len(best) >= top_k or len(hits) < chunk_k:
+                return list(best.values())[:top_k]
+            chunk_k *= 4
+    
+    def _retrieval_mode(self, query_embedding: Optional[List[float]] = None) -> str:
+        """Resolve retrieval_config['mode'] against what the store can serve"""
+        mode = self.config.retrieval_config.get('mode', 'auto')
+        can_embed = len(self.embeddings) > 0 and (query_embedding is not None or self.embedder is not None)
+        if mode == 'auto':
+            return 'vector' if can_embed else 'lexical'
+        if mode in ('vector', 'hybrid') and not can_embed:
+            return 'lexical'
+        if mode not in ('lexical', 'vector', 'hybrid'):
+            raise ValueError(f"Unknown retrieval mode: {mode}")
+        return mode
+    
+    async def retrieve_knowledge(self, query: str, top_k: int = None,
+                                 query_embedding: Optional[List[float]] = None,
+                                 filters: Optional[Dict[str, Any]] = None,
+                                 neighbor_window: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Retrieve relevant knowledge based on query.
+        
+        ``filters`` (see MetadataIndex) restricts scoring to matching entries.
+        With retrieval_config['granularity'] == 'chunk' each result is the
+        best-matching chunk of an entry, widened by ``neighbor_window``
+        chunks on each side; 'document' returns whole entries. In 'auto'
+        mode a vector search with no hit above the similarity threshold
+        falls back to lexical matching.
+        """
+        return (await self.retrieve_with_dependencies(query, top_k, query_embedding, filters, neighbor_window)).value
+    
+    async def retrieve_with_dependencies(self, query: str, top_k: int = None,
+                                         query_embedding: Optional[List[float]] = None,
+                                         filters: Optional[Dict[str, Any]] = None,
+                                         neighbor_window: Optional[int] = None) -> CacheEntry:
+        """Retrieve as retrieve_knowledge, returning the results with the generation and dependencies they were read at"""
         if top_k is None:
             top_k = self.config.retrieval_config['top_k']
+        if neighbor_window is None:
+            neighbor_window = self.config.retrieval_config.get('neighbor_window', 0)
             
-        results = []
-        # TODO: Implement embedding-based retrieval
-        
-        for knowledge_id, knowledge in self.knowledge_store.items():
-            # Temporary simple text matching until embeddings are implemented
-            if query.lower() in knowledge['content'].lower():
-                results.append({
-                    'knowledge_id': knowledge_id,
-                    'content': knowledge['content'],
-                    'metadata': knowledge['metadata'],
-                    'relevance_score': 1.0
-                })
-                
-        return sorted(results, key=lambda x: x['relevance_score'], reverse=True)[:top_k]
+        mode = self._retrieval_mode(query_embedding)
+        frozen_filters = freeze_filters(filters)
+        cache_key = None
+        if query_embedding is None:
+            cache_key = (mode, normalize_query(query), top_k, frozen_filters, neighbor_window)
+            cached = self.query_cache.get_entry(cache_key, self._is_cache_entry_fresh)
+            if cached is not None:
+                return CacheEntry([dict(result) for result in cached.value], cached.generation, cached.created_at,
+                                  cached.dependencies)
+        
+        snapshot = self._snapshot()
+        # Read before the search so writes that land while it runs still invalidate the entry; a snapshot
+        # may lag behind buffered writes, so it carries the generation it reflects
+        generation = snapshot.generation if snapshot is not None else self.generation
+        # The retrievers whose index changes can invalidate a cached answer
+        dependency_mode = mode
+        if mode == 'hybrid':
+            results = (await self.hybrid_search(query, top_k, query_embedding, filters, neighbor_window))['results']
+        else:
+            allowed = self._allowed_chunks(filters, snapshot)
+            if mode == 'vector':
+                if query_embedding is None:
+                    query_embedding = self.embedder.embed([query])[0]
+                ranked = self._vector_search(query_embedding, top_k, allowed, snapshot)
+                if not ranked and self.config.retrieval_config.get('mode', 'auto') == 'auto':
+                    # Nothing cleared the similarity threshold; lexical matches beat an empty answer
+                    ranked = self._lexical_search(query, top_k, allowed, snapshot)
+                    dependency_mode = 'hybrid'
+            else:
+                ranked = self._lexical_search(query, top_k, allowed, snapshot)
+            results = [self._format_result(knowledge_id, score, chunk_hash, neighbor_window, snapshot)
+                       for knowledge_id, score, chunk_hash in ranked]
+        
+        dependencies = {
+            'mode': dependency_mode,
+            'filters': frozen_filters,
+            'terms': set(tokenize(query)),
+            'knowledge_ids': [result['knowledge_id'] for result in results]
+        }
+        if cache_key is not None:
+            self.query_cache.put(cache_key, [dict(result) for result in results], generation, dependencies)
+        return CacheEntry(results, generation, time.monotonic(), dependencies)
+    
+    def _format_result(self, knowledge_id: str, score: float, chunk_hash: Optional[str] = None,
+                       neighbor_window: int = 0, snapshot: Optional[IndexSnapshot] = None) -> Dict[str, Any]:
+        """Shape a ranked knowledge entry as a retrieval result.
+        
+        In chunk granularity the result carries the matching chunk (plus
+        ``neighbor_window`` chunks either side) and its character offsets
+        instead of the whole content.
+        """
+        knowledge = self._record(knowledge_id, snapshot)
+        granularity = self.config.retrieval_config.get('granularity', 'chunk')
+        if granularity == 'document' or chunk_hash is None:
+            return {
+                'knowledge_id': knowledge_id,
+                'content': knowledge['content'],
+                'metadata': knowledge['metadata'],
+                'relevance_score': score
+            }
+        if granularity != 'chunk':
+            raise ValueError(f"Unknown result granularity: {granularity}")
+        
+        spans = knowledge['chunk_spans']
+        chunk_index = knowledge['chunk_hashes'].index(chunk_hash)
+        first = max(chunk_index - neighbor_window, 0)
+        last = min(chunk_index + neighbor_window, len(spans) - 1)
+        start, end = int(spans[first][0]), int(spans[last][1])
+        return {
+            'knowledge_id': knowledge_id,
+            'chunk_index': chunk_index,
+            'start': start,
+            'end': end,
+            'window': [first, last],
+            'content': knowledge['content'][start:end],
+            'metadata': knowledge['metadata'],
+            'relevance_score': score
+        }
+    
+    def _chunk_text(self, knowledge_id: str, chunk_hash: str, snapshot: Optional[IndexSnapshot] = None) -> str:
+        """Text of one chunk of a knowledge entry"""
+        knowledge = self._record(knowledge_id, snapshot)
+        start, end = knowledge['chunk_spans'][knowledge['chunk_hashes'].index(chunk_hash)]
+        return knowledge['content'][start:end]
+    
+    async def hybrid_search(self, query: str, top_k: int = None,
+                            query_embedding: Optional[List[float]] = None,
+                            filters: Optional[Dict[str, Any]] = None, neighbor_window: int = 0) -> Dict[str, Any]:
+        """Fuse lexical and vector candidates with RRF, then rerank the fused top-N.
+        
+        Returns the results together with per-stage timings in milliseconds.
+        With snapshot isolation both retrievers run in worker threads against
+        the same immutable index snapshot, so concurrent writes cannot skew
+        one stage against the other. Without it they run in turn on the event
+        loop: the live indexes are mutated there and must not be read from
+        other threads.
+        """
+        settings = self.config.retrieval_config
+        if top_k is None:
+            top_k = settings['top_k']
+        candidate_k = max(top_k, settings.get('candidate_k', 50))
+        loop = asyncio.get_running_loop()
+        timings: Dict[str, float] = {}
+        started = time.perf_counter()
+        snapshot = self._snapshot()
+        allowed = self._allowed_chunks(filters, snapshot)
+        
+        def timed(stage: str, func, *args):
+            stage_started = time.perf_counter()
+            result = func(*args)
+            timings[stage] = (time.perf_counter() - stage_started) * 1000
+            return result
+        
+        def vector_candidates():
+            embedding = query_embedding
+            if embedding is None:
+                embedding = self.embedder.embed([query])[0]
+            return self._vector_search(embedding, candidate_k, allowed, snapshot)
+        
+        stages = [('lexical_ms', self._lexical_search, query, candidate_k, allowed, snapshot)]
+        if len(self.embeddings) and (query_embedding is not None or self.embedder is not None):
+            stages.append(('vector_ms', vector_candidates))
+        if snapshot is not None:
+            rankings = await asyncio.gather(*(loop.run_in_executor(None, timed, *stage) for stage in stages))
+        else:
+            rankings = [timed(*stage) for stage in stages]
+        
+        fusion_started = time.perf_counter()
+        best_chunks: Dict[str, str] = {}
+        for ranking in rankings:
+            for knowledge_id, _, chunk_hash in ranking:
+                best_chunks.setdefault(knowledge_id, chunk_hash)
+        fused = reciprocal_rank_fusion(
+            [[knowledge_id for knowledge_id, _, _ in ranking] for ranking in rankings],
+            settings.get('rrf_k', 60)
+        )
+        ranked = heapq.nlargest(max(top_k, settings.get('rerank_top_n', 20)), fused.items(), key=lambda item: item[1])
+        timings['fusion_ms'] = (time.perf_counter() - fusion_started) * 1000
+        
+        if settings.get('rerank_results') and self.reranker is not None and ranked:
+            rerank_started = time.perf_counter()
+            passages = [self._chunk_text(knowledge_id, best_chunks[knowledge_id], snapshot)
+                        for knowledge_id, _ in ranked]
+            rerank_scores = self.reranker.rerank(query, passages)
+            # Fused score breaks ties between equally reranked candidates
+            ranked = sorted(
+                ((knowledge_id, rerank_score + fused_score) for (knowledge_id, fused_score), rerank_score
+                 in zip(ranked, rerank_scores)),
+                key=lambda item: item[1],
+                reverse=True
+            )
+            timings['rerank_ms'] = (time.perf_counter() - rerank_started) * 1000
+        
+        timings['total_ms'] = (time.perf_counter() - started) * 1000
+        return {
+            'results': [self._format_result(knowledge_id, score, best_chunks[knowledge_id], neighbor_window, snapshot)
+                        for knowledge_id, score in ranked[:top_k]],
+            'timings': timings
+        }
     
     async def update_knowledge(self, knowledge_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
         """Update existing knowledge"""
@@ -69,25 +656,81 @@ class KnowledgeBase:
         if not validate_knowledge_input(data):
             raise ValueError("Invalid knowledge input format")
             
-        chunks = process_chunk(
-            data['content'],
-            self.config.knowledge_settings['chunk_size'],
-            self.config.knowledge_settings['chunk_overlap']
-        )
+        changes = self._replace_knowledge(knowledge_id, data)
+        self._log_operation('update', knowledge_id, data)
         
-        self.knowledge_store[knowledge_id].update({
-            'content': data['content'],
-            'metadata': data['metadata'],
-            'source': data['source'],
-            'chunks': chunks,
-            'updated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        })
+        return {
+            'knowledge_id': knowledge_id,
+            **changes
+        }
+    
+    def _replace_knowledge(self, knowledge_id: str, data: Dict[str, Any], timestamp: Optional[str] = None) -> Dict[str, int]:
+        """Replace the content of a knowledge entry, re-indexing only chunks that changed"""
+        prepared = self._prepare(data['content'])
+        supplied = self._supplied_embeddings(data, prepared.hashes)
+        
+        old_chunks = self._chunk_map(knowledge_id)
+        new_chunks = prepared.chunks(data['content'])
+        added = {h: chunk for h, chunk in new_chunks.items() if h not in old_chunks}
+        removed = {h: chunk for h, chunk in old_chunks.items() if h not in new_chunks}
         
-        # TODO: Update embeddings
+        with self._writing():
+            self._unindex_chunks(knowledge_id, removed)
+            self._content_bytes += sys.getsizeof(data['content']) - sys.getsizeof(self.knowledge_store[knowledge_id]['content'])
+            self.knowledge_store[knowledge_id] = {
+                **self.knowledge_store[knowledge_id],
+                'content': data['content'],
+                'metadata': data['metadata'],
+                'source': data['source'],
+                'chunk_spans': prepared.spans,
+                'chunk_hashes': prepared.hashes,
+                'chunk_tokens': prepared.token_counts,
+                'updated_at': timestamp or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            }
+            self._index_metadata(knowledge_id)
+            self._index_chunks(knowledge_id, added, supplied)
+            if self.dedup is not None:
+                self.dedup.add(knowledge_id, self.dedup.signature(new_chunks.values()))
+            if supplied is not None:
+                # Explicit embeddings also refresh the vectors of unchanged chunks
+                reused = [chunk_hash for chunk_hash in new_chunks if chunk_hash not in added]
+                if reused:
+                    self.embeddings.add([make_chunk_id(knowledge_id, h) for h in reused], [supplied[h] for h in reused])
         
         return {
-            'knowledge_id': knowledge_id,
-            'chunks_count': len(chunks)
+            'chunks_count': len(prepared.hashes),
+            'chunks_reused': len(new_chunks) - len(added),
+            'chunks_added': len(added),
+            'chunks_removed': len(removed)
+        }
+    
+    @staticmethod
+    def _record_bytes(knowledge: Dict[str, Any]) -> int:
+        """Size of the content strings of a record, including kept versions"""
+        return sys.getsizeof(knowledge['content']) + sum(sys.getsizeof(version['content'])
+                                                         for version in knowledge.get('versions', ()))
+    
+    def _count_content_bytes(self) -> int:
+        """Re-sum the content bytes of the store, from the snapshot index where the store has one"""
+        if hasattr(self.knowledge_store, 'content_bytes'):
+            return self.knowledge_store.content_bytes()
+        return sum(self._record_bytes(knowledge) for knowledge in self.knowledge_store.values())
+    
+    def memory_usage(self) -> Dict[str, int]:
+        """Approximate bytes held in memory by content, vectors and the lexical index, e.g. for quotas"""
+        embeddings = self.embeddings
+        if hasattr(embeddings, 'memory_usage'):
+            vectors = sum(embeddings.memory_usage().values())
+        else:
+            dim = getattr(embeddings, 'dim', None) or self.config.embedding_settings.get('dimension', 0)
+            vectors = len(embeddings) * dim * 4
+        # Postings never outnumber indexed terms, so this bounds the lexical index from above
+        lexical = getattr(self.lexical_index, 'total_length', 0) * POSTING_BYTES
+        return {
+            'content': self._content_bytes,
+            'vectors': vectors,
+            'lexical': lexical,
+            'total': self._content_bytes + vectors + lexical
         }
     
     def get_knowledge(self, knowledge_id: str) -> Optional[Dict[str, Any]]:
@@ -97,24 +740,104 @@ class KnowledgeBase:
     def delete_knowledge(self, knowledge_id: str) -> bool:
         """Delete knowledge by ID"""
         if knowledge_id in self.knowledge_store:
-            del self.knowledge_store[knowledge_id]
-            if knowledge_id in self.embeddings:
-                del self.embeddings[knowledge_id]
+            self._remove_knowledge(knowledge_id)
+            self._log_operation('delete', knowledge_id)
             return True
         return False
     
-    def backup_knowledge(self) -> Dict[str, Any]:
-        """Create backup of knowledge base"""
+    def _remove_knowledge(self, knowledge_id: str) -> None:
+        """Drop a knowledge entry and everything indexed for it"""
+        with self._writing():
+            self._unindex_chunks(knowledge_id, self._chunk_map(knowledge_id))
+            self._index_metadata(knowledge_id, remove=True)
+            if self.dedup is not None:
+                self.dedup.remove(knowledge_id)
+            self._content_bytes -= self._record_bytes(self.knowledge_store.pop(knowledge_id))
+    
+    def _log_operation(self, operation: str, knowledge_id: str, data: Optional[Dict[str, Any]] = None) -> None:
+        """Append a write to the storage log, checkpointing when the log grows long"""
+        if self.storage is None:
+            return
+        if data is not None:
+            data = {field: data[field] for field in ('content', 'metadata', 'source', 'embeddings') if field in data}
+            if data.get('embeddings') is not None:
+                data['embeddings'] = np.asarray(data['embeddings'], dtype=np.float32).tolist()
+        self.storage.append(operation, knowledge_id, data)
+        if self.storage.should_checkpoint():
+            # Written on a background thread so the event loop is not blocked
+            self.storage.checkpoint(self, wait=False)
+    
+    def _apply_operation(self, entry: Dict[str, Any]) -> None:
+        """Re-apply a logged write during storage recovery"""
+        knowledge_id = entry['knowledge_id']
+        if entry['op'] == 'add':
+            self._insert_knowledge(knowledge_id, entry['data'], entry.get('timestamp'))
+        elif entry['op'] == 'update':
+            self._replace_knowledge(knowledge_id, entry['data'], entry.get('timestamp'))
+        elif entry['op'] == 'delete':
+            self._remove_knowledge(knowledge_id)
+        elif entry['op'] == 'merge':
+            self._merge_metadata(knowledge_id, entry['data']['metadata'])
+        elif entry['op'] == 'version':
+            self._add_version(knowledge_id, entry['data'], entry.get('timestamp'))
+        elif entry['op'] == 'backup':
+            self._backup_chain = entry['data']['chain_id']
+            self._backup_dirty.clear()
+        else:
+            raise ValueError(f"Unknown logged operation: {entry['op']}")
+    
+    def checkpoint(self) -> Dict[str, Any]:
+        """Write a storage snapshot and truncate the operation log"""
+        if self.storage is None:
+            return {'status': 'storage_disabled'}
+        return {
+            'status': 'success',
+            'generation': self.storage.checkpoint(self)
+        }
+    
+    def close(self) -> None:
+        """Release storage resources and stop the segment merger and chunking processes"""
+        if self._pipeline is not None:
+            self._pipeline.close()
+            self._pipeline = None
+        if self.segments is not None:
+            self.segments.close()
+        if self.storage is not None:
+            self.storage.close()
+    
+    def backup_knowledge(self, path: Optional[str] = None, full: bool = False) -> Dict[str, Any]:
+        """Stream a full or delta backup to ``path`` or storage_settings['backup_path'], else return the store in memory"""
         if not self.config.update_policy['backup_enabled']:
             return {'status': 'backup_disabled'}
+        
+        path = path or self.config.storage_settings.get('backup_path')
+        if path is not None:
+            backup = BackupManager(path).backup(self, full=full or not self.config.update_policy['version_control'])
+            if self.storage is not None:
+                # Replaying this marker clears the change set, so deltas survive a restart
+                self.storage.append('backup', '', {'chain_id': self._backup_chain})
+            return {
+                'status': 'success',
+                'backup': backup
+            }
             
         backup = {
             'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
             'knowledge_store': self.knowledge_store,
-            'embeddings': self.embeddings
+            'embeddings': self.embeddings.as_dict()
         }
         
         return {
             'status': 'success',
             'backup_data': backup
-        }
\ No newline at end of file
+        }
+    
+    def restore_knowledge(self, path: Optional[str] = None, upto: Optional[int] = None) -> Dict[str, Any]:
+        """Rebuild an empty knowledge base from a backup chain, optionally stopping at sequence ``upto``"""
+        path = path or self.config.storage_settings.get('backup_path')
+        if path is None:
+            raise ValueError("No backup path configured")
+        return {
+            'status': 'success',
+            **BackupManager(path).restore(self, upto)
+        }
@@ -0,0 +1,151 @@
+from typing import Dict, Any, Iterable, List, Optional, Set, Tuple
+import hashlib
+import logging
+import numpy as np
+from .utils import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Smallest prime above 2**32: with 32-bit hashes and coefficients, a * x + b stays below 2**64
+_PRIME = np.uint64(4294967311)
+
+DEDUP_POLICIES = ('skip', 'merge', 'version')
+
+def shingle_hashes(text: str, shingle_size: int = 3) -> np.ndarray:
+    """32-bit hashes of the overlapping token n-grams of a text"""
+    tokens = tokenize(text)
+    if len(tokens) < shingle_size:
+        shingles = {' '.join(tokens)} if tokens else set()
+    else:
+        shingles = {' '.join(tokens[i:i + shingle_size]) for i in range(len(tokens) - shingle_size + 1)}
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=4).digest(), 'little')
+         for shingle in shingles),
+        dtype=np.uint64,
+        count=len(shingles)
+    )
+
+def merge_metadata(existing: Dict[str, Any], incoming: Dict[str, Any]) -> Dict[str, Any]:
+    """Union list values, keep existing scalars and add new keys"""
+    merged = dict(existing)
+    for key, value in incoming.items():
+        if key not in merged:
+            merged[key] = value
+        elif isinstance(merged[key], list) and isinstance(value, list):
+            merged[key] = merged[key] + [item for item in value if item not in merged[key]]
+    return merged
+
+class DuplicateDetector:
+    """Incremental near-duplicate index: MinHash signatures bucketed by LSH bands.
+
+    A document's signature is the element-wise minimum of its chunk
+    signatures, i.e. the MinHash of the union of its shingles. Signatures
+    are split into ``bands`` bands of ``num_perm // bands`` rows; documents
+    sharing any band bucket become candidates, and a candidate is a
+    duplicate when the fraction of agreeing signature rows (an estimate of
+    shingle Jaccard similarity) reaches ``threshold``. Adding or removing a
+    document only touches its own band buckets.
+    """
+
+    def __init__(self, num_perm: int = 128, bands: int = 16, threshold: float = 0.85,
+                 shingle_size: int = 3, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError(f"num_perm {num_perm} is not divisible into {bands} bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 2 ** 32, num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 2 ** 32, num_perm, dtype=np.uint64)
+        self.signatures: Dict[str, np.ndarray] = {}
+        self._buckets: List[Dict[bytes, Set[str]]] = [{} for _ in range(bands)]
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+    def __contains__(self, knowledge_id: str) -> bool:
+        return knowledge_id in self.signatures
+
+    def chunk_signature(self, chunk: str) -> np.ndarray:
+        """MinHash signature of one chunk's shingles"""
+        hashes = shingle_hashes(chunk, self.shingle_size)
+        if len(hashes) == 0:
+            return np.full(self.num_perm, np.iinfo(np.uint64).max, dtype=np.uint64)
+        return ((np.outer(hashes, self._a) + self._b) % _PRIME).min(axis=0)
+
+    def signature(self, chunks: Iterable[str]) -> np.ndarray:
+        """MinHash signature of a document from its chunks"""
+        signature = np.full(self.num_perm, np.iinfo(np.uint64).max, dtype=np.uint64)
+        for chunk in chunks:
+            np.minimum(signature, self.chunk_signature(chunk), out=signature)
+        return signature
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """Indexed ids and their signatures as arrays, e.g. to write to disk"""
+        signatures = list(self.signatures.values())
+        return {
+            'ids': np.array(list(self.signatures), dtype=str),
+            'signatures': np.stack(signatures) if signatures else np.empty((0, self.num_perm), dtype=np.uint64)
+        }
+
+    def load_arrays(self, arrays: Dict[str, np.ndarray]) -> bool:
+        """Index the signatures of ``to_arrays``; False when they were made with another ``num_perm``"""
+        if arrays['signatures'].shape[1] != self.num_perm:
+            return False
+        for knowledge_id, signature in zip(arrays['ids'].tolist(), arrays['signatures']):
+            self.add(knowledge_id, signature)
+        return True
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def similarity(self, first: np.ndarray, second: np.ndarray) -> float:
+        """Estimated Jaccard similarity of two signatures"""
+        return float(np.mean(first == second))
+
+    def find(self, signature: np.ndarray, exclude: Optional[str] = None) -> Optional[Tuple[str, float]]:
+        """Most similar indexed document at or above the threshold, as (knowledge_id, similarity)"""
+        candidates: Set[str] = set()
+        for band, key in enumerate(self._band_keys(signature)):
+            candidates |= self._buckets[band].get(key, set())
+        candidates.discard(exclude)
+        best = None
+        for knowledge_id in candidates:
+            similarity = self.similarity(signature, self.signatures[knowledge_id])
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (knowledge_id, similarity)
+        return best
+
+    def add(self, knowledge_id: str, signature: np.ndarray) -> None:
+        """Index a document signature, replacing any previous one for the id"""
+        self.remove(knowledge_id)
+        self.signatures[knowledge_id] = signature
+        for band, key in enumerate(self._band_keys(signature)):
+            self._buckets[band].setdefault(key, set()).add(knowledge_id)
+
+    def remove(self, knowledge_id: str) -> None:
+        """Drop a document from every band bucket"""
+        signature = self.signatures.pop(knowledge_id, None)
+        if signature is None:
+            return
+        for band, key in enumerate(self._band_keys(signature)):
+            bucket = self._buckets[band].get(key)
+            if bucket is not None:
+                bucket.discard(knowledge_id)
+                if not bucket:
+                    del self._buckets[band][key]
+
+def create_duplicate_detector(settings: Dict[str, Any]) -> Optional[DuplicateDetector]:
+    """Build the detector described by ``dedup_settings``, or None when dedup is disabled"""
+    if not settings.get('enabled'):
+        return None
+    if settings.get('policy', 'skip') not in DEDUP_POLICIES:
+        raise ValueError(f"Unknown dedup policy: {settings.get('policy')}")
+    return DuplicateDetector(
+        num_perm=settings.get('num_perm', 128),
+        bands=settings.get('bands', 16),
+        threshold=settings.get('threshold', 0.85),
+        shingle_size=settings.get('shingle_size', 3)
+    )
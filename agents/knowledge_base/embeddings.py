@@ -0,0 +1,147 @@
+from typing import Dict, Any, List, Optional
+import hashlib
+import logging
+import sqlite3
+import threading
+import numpy as np
+from .utils import tokenize
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingProvider:
+    """Base class for embedding backends.
+
+    Providers always receive a batch of texts and return one row per text.
+    ``similarity_threshold`` is the cosine below which a chunk is not
+    considered relevant for this model, or None when its scores are not
+    calibrated enough for a fixed cutoff.
+    """
+    model_name: str = ''
+    dimension: int = 0
+    similarity_threshold: Optional[float] = None
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed a batch of texts into a (len(texts), dimension) float32 array"""
+        raise NotImplementedError
+
+class HashingEmbedder(EmbeddingProvider):
+    """Deterministic offline embedder based on the signed hashing trick.
+
+    Each term from ``tokenize`` is hashed to a column and a sign, which is a
+    fixed random projection of the bag-of-terms vector. Needs no model files
+    or network access, so it suits tests and air-gapped deployments.
+    Cosines scale with term overlap and chunk length (a relevant query
+    often scores 0.4-0.7), so no similarity threshold applies by default.
+    """
+
+    def __init__(self, dimension: int = 1536):
+        self.dimension = dimension
+        self.model_name = f"hashing-{dimension}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        rows, columns, signs = [], [], []
+        buckets: Dict[str, tuple] = {}
+        for row, text in enumerate(texts):
+            for term in tokenize(text):
+                bucket = buckets.get(term)
+                if bucket is None:
+                    digest = int.from_bytes(hashlib.blake2b(term.encode('utf-8'), digest_size=8).digest(), 'little')
+                    bucket = buckets[term] = (digest % self.dimension, 1.0 if digest >> 63 else -1.0)
+                rows.append(row)
+                columns.append(bucket[0])
+                signs.append(bucket[1])
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        np.add.at(vectors, (np.array(rows, dtype=np.int64), np.array(columns, dtype=np.int64)),
+                  np.array(signs, dtype=np.float32))
+        return vectors
+
+class CachedEmbedder(EmbeddingProvider):
+    """Persistent embedding cache in front of another provider.
+
+    Vectors are keyed by (model name, sha256 of the text) in a SQLite table,
+    so re-ingesting unchanged text never reaches the wrapped provider. Misses
+    are de-duplicated and sent to the provider in batches of ``batch_size``.
+    Safe to call from several threads (ingestion and queries embed from
+    executor threads): the shared connection is only used under a lock.
+    """
+
+    def __init__(self, provider: EmbeddingProvider, cache_path: Optional[str] = None, batch_size: int = 64):
+        self.provider = provider
+        self.model_name = provider.model_name
+        self.dimension = provider.dimension
+        self.similarity_threshold = provider.similarity_threshold
+        self.batch_size = batch_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(cache_path or ':memory:', check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS embedding_cache ("
+            "model TEXT NOT NULL, digest TEXT NOT NULL, vector BLOB NOT NULL, "
+            "PRIMARY KEY (model, digest))"
+        )
+
+    @staticmethod
+    def digest(text: str) -> str:
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def _lookup(self, digests: List[str]) -> Dict[str, np.ndarray]:
+        """Fetch cached vectors for the given digests"""
+        found = {}
+        # Stay well below SQLite's bound-parameter limit
+        for start in range(0, len(digests), 500):
+            batch = digests[start:start + 500]
+            placeholders = ','.join('?' * len(batch))
+            with self._lock:
+                rows = self._connection.execute(
+                    f"SELECT digest, vector FROM embedding_cache WHERE model = ? AND digest IN ({placeholders})",
+                    [self.model_name, *batch]
+                ).fetchall()
+            for digest, blob in rows:
+                found[digest] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        digests = [self.digest(text) for text in texts]
+        vectors = self._lookup(list(set(digests)))
+
+        missing: Dict[str, str] = {}
+        missed = 0
+        for digest, text in zip(digests, texts):
+            if digest not in vectors:
+                missed += 1
+                missing.setdefault(digest, text)
+        with self._lock:
+            self.hits += len(digests) - missed
+            self.misses += missed
+
+        pending = list(missing.items())
+        for start in range(0, len(pending), self.batch_size):
+            batch = pending[start:start + self.batch_size]
+            embedded = np.asarray(self.provider.embed([text for _, text in batch]), dtype=np.float32)
+            with self._lock, self._connection:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO embedding_cache (model, digest, vector) VALUES (?, ?, ?)",
+                    [(self.model_name, digest, vector.tobytes()) for (digest, _), vector in zip(batch, embedded)]
+                )
+            for (digest, _), vector in zip(batch, embedded):
+                vectors[digest] = vector
+
+        if not texts:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        return np.stack([vectors[digest] for digest in digests])
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+def create_embedder(settings: Dict[str, Any]) -> Optional[EmbeddingProvider]:
+    """Build the cached embedding provider selected by ``embedding_settings``"""
+    provider_name = settings.get('provider')
+    if provider_name is None:
+        return None
+    if provider_name == 'hashing':
+        provider = HashingEmbedder(settings.get('dimension', 1536))
+    else:
+        raise ValueError(f"Unknown embedding provider: {provider_name}")
+    return CachedEmbedder(provider, settings.get('cache_path'), settings.get('batch_size', 64))
@@ -0,0 +1,119 @@
+from typing import Dict, Any, Hashable, Iterable, List, Optional, Set, Tuple
+import bisect
+import logging
+
+logger = logging.getLogger(__name__)
+
+def freeze_filters(filters: Optional[Dict[str, Any]]) -> Optional[Tuple]:
+    """Hashable, order-independent form of a filter spec for cache keys"""
+    if not filters:
+        return None
+    frozen = []
+    for field, value in sorted(filters.items()):
+        if isinstance(value, (list, tuple, set)):
+            value = tuple(sorted(value, key=str))
+        frozen.append((field, value))
+    return tuple(frozen)
+
+class MetadataIndex:
+    """Secondary indexes used to pre-filter retrieval candidates.
+
+    Keeps value -> knowledge-id sets for ``source`` and the configured
+    metadata fields (list values such as tags index every element), plus a
+    sorted timestamp list for range queries. ``resolve`` turns a filter
+    spec into the set of knowledge ids that may be scored.
+
+    Filter spec: ``{field: value or [values]}`` with any-of semantics
+    within a field and all-of across fields; ``timestamp_from`` and
+    ``timestamp_to`` bound the entry timestamp (inclusive).
+    """
+
+    def __init__(self, fields: Iterable[str] = ('tags', 'category')):
+        self.fields = list(fields)
+        self.values: Dict[str, Dict[Hashable, Set[str]]] = {field: {} for field in ['source', *self.fields]}
+        self.timestamps: List[Tuple[str, str]] = []
+        self._entries: Dict[str, Dict[str, Any]] = {}
+
+    def _field_values(self, knowledge: Dict[str, Any]) -> Dict[str, List[Hashable]]:
+        """Indexable values of each field of a knowledge record"""
+        values = {'source': [knowledge.get('source')]}
+        metadata = knowledge.get('metadata') or {}
+        for field in self.fields:
+            value = metadata.get(field)
+            if value is None:
+                continue
+            values[field] = list(value) if isinstance(value, (list, tuple, set)) else [value]
+        return values
+
+    def add(self, knowledge_id: str, knowledge: Dict[str, Any]) -> None:
+        """Index a knowledge record, replacing any previous entry for the id"""
+        self.remove(knowledge_id)
+        field_values = self._field_values(knowledge)
+        for field, values in field_values.items():
+            for value in values:
+                if isinstance(value, Hashable):
+                    self.values[field].setdefault(value, set()).add(knowledge_id)
+        timestamp = knowledge.get('timestamp', '')
+        bisect.insort(self.timestamps, (timestamp, knowledge_id))
+        self._entries[knowledge_id] = {'values': field_values, 'timestamp': timestamp}
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Indexed values of every entry, e.g. to write to disk"""
+        return {'fields': list(self.fields), 'entries': dict(self._entries)}
+
+    @classmethod
+    def from_dict(cls, state: Dict[str, Any]) -> 'MetadataIndex':
+        index = cls(state['fields'])
+        for knowledge_id, entry in state['entries'].items():
+            for field, values in entry['values'].items():
+                for value in values:
+                    if isinstance(value, Hashable):
+                        index.values[field].setdefault(value, set()).add(knowledge_id)
+            index.timestamps.append((entry['timestamp'], knowledge_id))
+            index._entries[knowledge_id] = entry
+        index.timestamps.sort()
+        return index
+
+    def remove(self, knowledge_id: str) -> None:
+        """Drop a knowledge id from every index"""
+        entry = self._entries.pop(knowledge_id, None)
+        if entry is None:
+            return
+        for field, values in entry['values'].items():
+            for value in values:
+                ids = self.values[field].get(value) if isinstance(value, Hashable) else None
+                if ids is not None:
+                    ids.discard(knowledge_id)
+                    if not ids:
+                        del self.values[field][value]
+        position = bisect.bisect_left(self.timestamps, (entry['timestamp'], knowledge_id))
+        if position < len(self.timestamps) and self.timestamps[position] == (entry['timestamp'], knowledge_id):
+            del self.timestamps[position]
+
+    def resolve(self, filters: Optional[Dict[str, Any]]) -> Optional[Set[str]]:
+        """Knowledge ids matching a filter spec, or None when nothing is filtered"""
+        if not filters:
+            return None
+        allowed: Optional[Set[str]] = None
+        for field, wanted in filters.items():
+            if field in ('timestamp_from', 'timestamp_to'):
+                continue
+            if field not in self.values:
+                raise ValueError(f"Field {field} is not indexed for filtering")
+            wanted = wanted if isinstance(wanted, (list, tuple, set)) else [wanted]
+            matches: Set[str] = set()
+            for value in wanted:
+                matches |= self.values[field].get(value, set())
+            allowed = matches if allowed is None else allowed & matches
+            if not allowed:
+                return set()
+
+        if 'timestamp_from' in filters or 'timestamp_to' in filters:
+            low = bisect.bisect_left(self.timestamps, (filters.get('timestamp_from', ''),))
+            high = len(self.timestamps)
+            if 'timestamp_to' in filters:
+                # '\uffff' sorts after any id, so entries stamped exactly timestamp_to stay in range
+                high = bisect.bisect_right(self.timestamps, (filters['timestamp_to'], '\uffff'))
+            in_range = {knowledge_id for _, knowledge_id in self.timestamps[low:high]}
+            allowed = in_range if allowed is None else allowed & in_range
+        return allowed
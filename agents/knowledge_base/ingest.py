@@ -0,0 +1,229 @@
+from typing import Dict, Any, AsyncIterable, Iterable, List, Optional, Union
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+import asyncio
+import logging
+import numpy as np
+from .utils import validate_knowledge_input, iter_chunk_spans, iter_token_chunk_spans, hash_chunk, tokenize
+from .tokenizers import TokenCounter
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class PreparedDocument:
+    """Chunk layout of a document, computed before it touches the indexes"""
+    spans: np.ndarray
+    hashes: List[str]
+    term_counts: Optional[Dict[str, Dict[str, int]]] = None
+    token_counts: Optional[np.ndarray] = None
+
+    def chunks(self, content: str) -> Dict[str, str]:
+        """Map each distinct chunk hash to its text"""
+        return {chunk_hash: content[start:end] for chunk_hash, (start, end) in zip(self.hashes, self.spans.tolist())}
+
+def prepare_document(content: str, chunk_size: int, chunk_overlap: int,
+                     chunk_boundary: Optional[str] = None, tokenize_chunks: bool = False,
+                     token_counter: Optional[TokenCounter] = None, chunk_unit: str = 'chars') -> PreparedDocument:
+    """Chunk and hash a document, optionally pre-tokenizing and token-counting each chunk"""
+    token_counts = None
+    if chunk_unit == 'tokens':
+        if token_counter is None:
+            raise ValueError("Token-budget chunking needs a token counter")
+        layout = list(iter_token_chunk_spans(content, token_counter.token_spans(content),
+                                             chunk_size, chunk_overlap, chunk_boundary))
+        spans = np.array([span[:2] for span in layout], dtype=np.int64).reshape(-1, 2)
+        token_counts = np.array([span[2] for span in layout], dtype=np.int32)
+    elif chunk_unit == 'chars':
+        spans = np.array(
+            [offset for span in iter_chunk_spans(content, chunk_size, chunk_overlap, chunk_boundary) for offset in span],
+            dtype=np.int64
+        ).reshape(-1, 2)
+    else:
+        raise ValueError(f"Unknown chunk unit: {chunk_unit}")
+
+    hashes = []
+    term_counts = {} if tokenize_chunks else None
+    counted = [] if token_counts is None and token_counter is not None else None
+    for start, end in spans.tolist():
+        chunk = content[start:end]
+        chunk_hash = hash_chunk(chunk)
+        hashes.append(chunk_hash)
+        if tokenize_chunks and chunk_hash not in term_counts:
+            term_counts[chunk_hash] = dict(Counter(tokenize(chunk)))
+        if counted is not None:
+            counted.append(token_counter.count(chunk))
+    if counted is not None:
+        token_counts = np.array(counted, dtype=np.int32)
+    return PreparedDocument(spans, hashes, term_counts, token_counts)
+
+def prepare_documents(contents: List[str], *args) -> List[PreparedDocument]:
+    """Prepare a group of documents in one worker call to amortize IPC"""
+    return [prepare_document(content, *args) for content in contents]
+
+_DONE = object()
+
+class IngestionPipeline:
+    """Pipelined bulk ingestion: validate -> chunk -> embed in batches -> index"""
+
+    def __init__(self, knowledge_base, batch_size: int = 256, queue_size: int = 1024,
+                 workers: Optional[int] = None, use_processes: bool = True, group_size: int = 32):
+        self.knowledge_base = knowledge_base
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.group_size = group_size
+        self.workers = workers
+        self.use_processes = use_processes
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        """Chunking pool shared by every run, started on first use"""
+        if self.use_processes and self._executor is None:
+            self._executor = ProcessPoolExecutor(self.workers)
+        return self._executor
+
+    def close(self) -> None:
+        """Stop the chunking processes"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    async def run(self, documents: Union[Iterable[Dict[str, Any]], AsyncIterable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Ingest documents, returning per-document results in input order"""
+        loop = asyncio.get_running_loop()
+        chunk_args = self.knowledge_base._chunk_args(tokenize_chunks=True)
+        prepared_queue: asyncio.Queue = asyncio.Queue(max(1, self.queue_size // self.group_size))
+        embedded_queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        results: Dict[int, Dict[str, Any]] = {}
+        executor = self._get_executor()
+
+        async def produce():
+            group: List[tuple] = []
+            
+            async def submit():
+                contents = [data['content'] for _, data in group]
+                future = loop.run_in_executor(executor, prepare_documents, contents, *chunk_args)
+                await prepared_queue.put((list(group), future))
+                group.clear()
+            
+            position = 0
+            async for data in _iterate(documents):
+                if not validate_knowledge_input(data):
+                    results[position] = {'index': position, 'error': 'Invalid knowledge input format'}
+                else:
+                    group.append((position, data))
+                    if len(group) >= self.group_size:
+                        await submit()
+                position += 1
+            if group:
+                await submit()
+            await prepared_queue.put(_DONE)
+
+        async def embed():
+            batch: List[tuple] = []
+            pending_chunks = 0
+            while True:
+                item = await prepared_queue.get()
+                if item is _DONE:
+                    break
+                group, future = item
+                try:
+                    prepared_group = await future
+                except Exception as e:
+                    if isinstance(e, BrokenProcessPool) and self._executor is executor:
+                        # A dead worker breaks the pool for good; the next run starts a new one
+                        self._executor = None
+                    for position, _ in group:
+                        results[position] = {'index': position, 'error': str(e)}
+                    continue
+                for (position, data), prepared in zip(group, prepared_group):
+                    batch.append((position, data, prepared))
+                    pending_chunks += len(set(prepared.hashes))
+                if pending_chunks >= self.batch_size:
+                    await self._embed_batch(loop, batch, results, embedded_queue)
+                    batch, pending_chunks = [], 0
+            if batch:
+                await self._embed_batch(loop, batch, results, embedded_queue)
+            await embedded_queue.put(_DONE)
+
+        async def index():
+            while True:
+                item = await embedded_queue.get()
+                if item is _DONE:
+                    break
+                position, data, prepared, embeddings = item
+                try:
+                    results[position] = self.knowledge_base._add_prepared(data, prepared, embeddings)
+                except Exception as e:
+                    logger.error(f"Error indexing document {position}: {str(e)}")
+                    results[position] = {'index': position, 'error': str(e)}
+                # Keep the event loop responsive between documents
+                await asyncio.sleep(0)
+
+        stages = [asyncio.ensure_future(stage()) for stage in (produce, embed, index)]
+        try:
+            await asyncio.gather(*stages)
+        finally:
+            # A failed (or cancelled) run must not leave sibling stages or queued chunking work behind
+            for stage in stages:
+                stage.cancel()
+            await asyncio.gather(*stages, return_exceptions=True)
+            while not prepared_queue.empty():
+                item = prepared_queue.get_nowait()
+                if item is not _DONE:
+                    item[1].cancel()
+
+        ordered = [results[position] for position in sorted(results)]
+        failed = sum(1 for result in ordered if 'error' in result)
+        return {
+            'status': 'success' if not failed else 'partial',
+            'added': len(ordered) - failed,
+            'failed': failed,
+            'results': ordered
+        }
+
+    async def _embed_batch(self, loop, batch: List[tuple], results: Dict[int, Dict[str, Any]],
+                           embedded_queue: asyncio.Queue) -> None:
+        """Embed every new chunk of a batch of documents in one provider call"""
+        embedder = self.knowledge_base.embedder
+        texts: Dict[str, str] = {}
+        for _, data, prepared in batch:
+            if data.get('embeddings') is None and embedder is not None:
+                texts.update(prepared.chunks(data['content']))
+        vectors: Dict[str, Any] = {}
+        failure = None
+        if texts:
+            try:
+                embedded = await loop.run_in_executor(None, embedder.embed, list(texts.values()))
+                vectors = dict(zip(texts, embedded))
+            except Exception as e:
+                logger.error(f"Error embedding a batch of {len(batch)} documents: {str(e)}")
+                failure = str(e)
+
+        for position, data, prepared in batch:
+            if data.get('embeddings') is not None:
+                if len(data['embeddings']) != len(prepared.hashes):
+                    results[position] = {
+                        'index': position,
+                        'error': f"Expected {len(prepared.hashes)} chunk embeddings, got {len(data['embeddings'])}"
+                    }
+                    continue
+                embeddings = dict(zip(prepared.hashes, data['embeddings']))
+            elif failure is not None:
+                results[position] = {'index': position, 'error': failure}
+                continue
+            elif embedder is not None:
+                embeddings = {chunk_hash: vectors[chunk_hash] for chunk_hash in prepared.hashes}
+            else:
+                embeddings = None
+            await embedded_queue.put((position, data, prepared, embeddings))
+
+async def _iterate(documents):
+    """Iterate a sync or async iterable of documents"""
+    if hasattr(documents, '__aiter__'):
+        async for data in documents:
+            yield data
+    else:
+        for data in documents:
+            yield data
@@ -0,0 +1,129 @@
+from typing import AbstractSet, Any, Dict, List, Optional, Set, Tuple
+from collections import Counter
+import heapq
+import logging
+import math
+from .utils import tokenize
+
+logger = logging.getLogger(__name__)
+
+class InvertedIndex:
+    """Incrementally maintained inverted index with BM25 scoring.
+
+    Each posting list maps a term to ``{chunk_id: term_frequency}``, so a
+    query only touches the postings of its own terms.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.chunk_lengths: Dict[str, int] = {}
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.chunk_lengths)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Copy of the postings and chunk lengths, e.g. to write to disk"""
+        return {
+            'k1': self.k1,
+            'b': self.b,
+            'postings': {term: dict(posting) for term, posting in self.postings.items()},
+            'chunk_lengths': dict(self.chunk_lengths)
+        }
+
+    @classmethod
+    def from_dict(cls, state: Dict[str, Any]) -> 'InvertedIndex':
+        index = cls(state['k1'], state['b'])
+        index.postings = state['postings']
+        index.chunk_lengths = state['chunk_lengths']
+        index.total_length = sum(index.chunk_lengths.values())
+        return index
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self.chunk_lengths
+
+    @property
+    def average_length(self) -> float:
+        """Average number of terms per indexed chunk"""
+        return self.total_length / len(self.chunk_lengths) if self.chunk_lengths else 0.0
+
+    def add(self, chunk_id: str, text: str, term_counts: Optional[Dict[str, int]] = None) -> Set[str]:
+        """Index a chunk, replacing any previous postings for the same id, and return its terms.
+
+        ``term_counts`` may carry the chunk's already computed term frequencies.
+        """
+        if chunk_id in self.chunk_lengths:
+            self.remove(chunk_id)
+        if term_counts is None:
+            term_counts = Counter(tokenize(text))
+        for term, frequency in term_counts.items():
+            self.postings.setdefault(term, {})[chunk_id] = frequency
+        length = sum(term_counts.values())
+        self.chunk_lengths[chunk_id] = length
+        self.total_length += length
+        return set(term_counts)
+
+    def remove(self, chunk_id: str, text: Optional[str] = None) -> Set[str]:
+        """Remove a chunk's postings and return the terms it was indexed under.
+
+        Passing the chunk text limits the work to that chunk's own terms;
+        otherwise every posting list is checked.
+        """
+        length = self.chunk_lengths.pop(chunk_id, None)
+        if length is None:
+            return set()
+        self.total_length -= length
+        candidates = set(tokenize(text)) if text is not None else list(self.postings)
+        removed = set()
+        for term in candidates:
+            posting = self.postings.get(term)
+            if posting and posting.pop(chunk_id, None) is not None:
+                removed.add(term)
+                if not posting:
+                    del self.postings[term]
+        return removed
+
+    def idf(self, term: str) -> float:
+        """BM25 inverse document frequency of a term"""
+        document_frequency = len(self.postings.get(term, ()))
+        return math.log(1 + (len(self.chunk_lengths) - document_frequency + 0.5) / (document_frequency + 0.5))
+
+    def score(self, query: str, allowed: Optional[Set[str]] = None, excluded: AbstractSet[str] = frozenset(),
+              corpus=None) -> Dict[str, float]:
+        """BM25 score of every chunk sharing at least one term with the query.
+
+        With ``allowed``, only those chunk ids are scored; each posting list
+        is walked from whichever side is smaller. ``excluded`` chunks are
+        skipped, and ``corpus`` (anything with ``idf`` and
+        ``average_length``) supplies collection statistics when this index
+        is one segment of a larger collection.
+        """
+        scores: Dict[str, float] = {}
+        if not self.chunk_lengths or (allowed is not None and not allowed):
+            return scores
+        corpus = corpus or self
+        average_length = corpus.average_length or 1.0
+        for term, query_frequency in Counter(tokenize(query)).items():
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = corpus.idf(term) * query_frequency
+            if allowed is None:
+                entries = posting.items()
+            elif len(allowed) < len(posting):
+                entries = ((chunk_id, posting[chunk_id]) for chunk_id in allowed if chunk_id in posting)
+            else:
+                entries = ((chunk_id, frequency) for chunk_id, frequency in posting.items() if chunk_id in allowed)
+            for chunk_id, frequency in entries:
+                if chunk_id in excluded:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.chunk_lengths[chunk_id] / average_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return scores
+
+    def search(self, query: str, top_k: int, allowed: Optional[Set[str]] = None) -> List[Tuple[str, float]]:
+        """Return up to ``top_k`` (chunk_id, BM25 score) pairs, best first"""
+        scores = self.score(query, allowed)
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
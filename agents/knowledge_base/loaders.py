@@ -0,0 +1,186 @@
+from typing import Dict, Any, AsyncIterator, Callable, Iterator, List, Optional, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import asyncio
+import json
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+# Tried in order; GB18030 is a superset of GBK, which data/knowledge_base.json uses
+ENCODINGS = ('utf-8-sig', 'gb18030')
+
+HEADING_PATTERN = re.compile(r'^(#{1,6})\s+(.+?)\s*#*\s*$')
+
+Parser = Callable[[str], Iterator[Dict[str, Any]]]
+
+def read_text(path: str) -> str:
+    """Decode a file with the first encoding in ENCODINGS that fits"""
+    data = Path(path).read_bytes()
+    for encoding in ENCODINGS:
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    raise ValueError(f"Cannot decode {path} as any of {', '.join(ENCODINGS)}")
+
+def parse_text(path: str, section_size: int = 100000) -> Iterator[Dict[str, Any]]:
+    """Plain text: sections of up to ``section_size`` characters, split at blank lines"""
+    section: List[str] = []
+    length = 0
+    index = 0
+    for paragraph in re.split(r'\n\s*\n', read_text(path)):
+        if section and length + len(paragraph) > section_size:
+            yield {'content': '\n\n'.join(section), 'metadata': {'section': index}, 'source': path}
+            section, length, index = [], 0, index + 1
+        if paragraph.strip():
+            section.append(paragraph)
+            length += len(paragraph) + 2
+    if section:
+        yield {'content': '\n\n'.join(section), 'metadata': {'section': index}, 'source': path}
+
+def parse_markdown(path: str) -> Iterator[Dict[str, Any]]:
+    """Markdown: one section per heading, carrying the heading path as metadata"""
+    headings: List[str] = []
+    lines: List[str] = []
+    in_code = False
+
+    def section():
+        content = '\n'.join(lines).strip()
+        if content:
+            return {
+                'content': content,
+                'metadata': {'title': headings[-1] if headings else Path(path).stem, 'headings': list(headings)},
+                'source': path
+            }
+        return None
+
+    for line in read_text(path).splitlines():
+        if line.lstrip().startswith('```'):
+            in_code = not in_code
+        match = None if in_code else HEADING_PATTERN.match(line)
+        if match:
+            document = section()
+            if document:
+                yield document
+            level = len(match.group(1))
+            headings = headings[:level - 1] + [match.group(2)]
+            lines = [line]
+        else:
+            lines.append(line)
+    document = section()
+    if document:
+        yield document
+
+def parse_json(path: str) -> Iterator[Dict[str, Any]]:
+    """JSON: the ``{"categories": [{"name", "entries": [...]}]}`` knowledge layout,
+    a list of entries, or a single entry with ``content``
+    """
+    data = json.loads(read_text(path))
+    if isinstance(data, dict) and 'categories' in data:
+        for category in data['categories']:
+            for entry in category.get('entries', []):
+                yield _json_document(entry, path, category.get('name'))
+    elif isinstance(data, list):
+        for entry in data:
+            if isinstance(entry, dict) and entry.get('content'):
+                yield _json_document(entry, path)
+    elif isinstance(data, dict) and data.get('content'):
+        yield _json_document(data, path)
+    else:
+        logger.warning(f"No knowledge entries found in {path}")
+
+def _json_document(entry: Dict[str, Any], path: str, category: Optional[str] = None) -> Dict[str, Any]:
+    """Knowledge input for one JSON entry; the title leads the content so it is searchable"""
+    title = entry.get('title')
+    content = entry['content'] if not title else f"{title}\n{entry['content']}"
+    metadata = {key: value for key, value in entry.items() if key != 'content'}
+    if category is not None:
+        metadata['category'] = category
+    return {'content': content, 'metadata': metadata, 'source': path}
+
+PARSERS: Dict[str, Parser] = {
+    '.txt': parse_text,
+    '.text': parse_text,
+    '.md': parse_markdown,
+    '.markdown': parse_markdown,
+    '.json': parse_json,
+}
+
+def register_parser(suffix: str, parser: Parser) -> None:
+    """Register a parser for a file suffix.
+
+    Parsers run in worker processes, so they must be importable module-level
+    functions.
+    """
+    PARSERS[suffix.lower()] = parser
+
+def parse_file(path: str, parser: Parser) -> List[Dict[str, Any]]:
+    """Run a parser over one file; a module-level function so it can run in a worker process"""
+    return list(parser(path))
+
+class DirectoryLoader:
+    """Parallel, streaming loader of a document directory.
+
+    Discovers files with a registered parser, parses them in a process pool
+    and yields each file's sections as soon as that file is done, in
+    completion order. At most ``max_pending`` files are in flight, so memory
+    stays bounded by a few parsed files regardless of the folder size, and
+    a slow consumer (e.g. the ingestion pipeline) throttles parsing.
+    """
+
+    def __init__(self, path: Path, parsers: Optional[Dict[str, Parser]] = None, workers: Optional[int] = None,
+                 max_pending: Optional[int] = None, recursive: bool = True, use_processes: bool = True):
+        self.path = Path(path)
+        self.parsers = {**PARSERS, **(parsers or {})}
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 2
+        self.recursive = recursive
+        self.use_processes = use_processes
+        self.files_loaded = 0
+        self.files_failed: List[str] = []
+
+    def discover(self) -> Iterator[Path]:
+        """Files under the directory that have a parser, in path order"""
+        if self.path.is_file():
+            candidates: Sequence[Path] = [self.path]
+        else:
+            candidates = sorted(self.path.rglob('*') if self.recursive else self.path.iterdir())
+        for candidate in candidates:
+            if candidate.is_file() and candidate.suffix.lower() in self.parsers:
+                yield candidate
+
+    async def load(self) -> AsyncIterator[Dict[str, Any]]:
+        """Yield knowledge inputs ({'content', 'metadata', 'source'}) as files finish parsing"""
+        loop = asyncio.get_running_loop()
+        executor = ProcessPoolExecutor(self.workers) if self.use_processes else None
+        pending: Dict[asyncio.Future, Path] = {}
+        files = self.discover()
+        try:
+            while True:
+                for path in files:
+                    parser = self.parsers[path.suffix.lower()]
+                    pending[loop.run_in_executor(executor, parse_file, str(path), parser)] = path
+                    if len(pending) >= self.max_pending:
+                        break
+                if not pending:
+                    break
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    path = pending.pop(future)
+                    try:
+                        documents = future.result()
+                    except Exception as e:
+                        logger.error(f"Error parsing {path}: {str(e)}")
+                        self.files_failed.append(str(path))
+                        continue
+                    self.files_loaded += 1
+                    for document in documents:
+                        yield document
+        finally:
+            for future in pending:
+                future.cancel()
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
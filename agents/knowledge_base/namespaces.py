@@ -0,0 +1,279 @@
+from typing import Dict, Any, AsyncIterable, AsyncIterator, Iterable, List, Optional, Union
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+import logging
+import re
+import shutil
+import time
+from .config import KnowledgeBaseConfig
+from .core import KnowledgeBase
+from .embeddings import EmbeddingProvider, create_embedder
+from .rerank import Reranker
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_.-]{0,127}$')
+
+class NamespacedKnowledgeBase:
+    """Many isolated knowledge bases ("namespaces", e.g. one per tenant) in one process.
+
+    Each namespace is a full ``KnowledgeBase`` with its own store, indexes
+    and query cache, persisted under ``storage_settings['path']/<name>``
+    with the configured backend (mmap unless sqlite is chosen), so a query
+    only ever touches its own namespace's data. Namespaces are loaded on
+    first use and unloaded to disk again when more than ``max_loaded`` are
+    in memory, when the loaded ones exceed ``max_loaded_bytes``, or, via
+    ``unload_idle``, after ``idle_seconds`` without use. Writes to a
+    namespace at or over its quota (see ``quota_usage``) raise ValueError.
+    The embedding provider (and its cache) is shared by all namespaces.
+    """
+
+    def __init__(self, config: KnowledgeBaseConfig = None, embedder: Optional[EmbeddingProvider] = None,
+                 reranker: Optional[Reranker] = None):
+        self.config = config or KnowledgeBaseConfig()
+        root = self.config.storage_settings.get('path')
+        if root is None:
+            raise ValueError("Namespaces need storage_settings['path'] to unload to")
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.embedder = embedder or create_embedder(self.config.embedding_settings)
+        self.reranker = reranker
+        settings = self.config.namespace_settings
+        self.quota_bytes: Optional[int] = settings.get('quota_bytes')
+        self.max_loaded: int = settings.get('max_loaded', 64)
+        self.max_loaded_bytes: Optional[int] = settings.get('max_loaded_bytes')
+        self.idle_seconds: Optional[float] = settings.get('idle_seconds', 900)
+        # Per-namespace overrides of quota_bytes
+        self.quotas: Dict[str, Optional[int]] = {}
+        self._loaded: 'OrderedDict[str, KnowledgeBase]' = OrderedDict()
+        self._last_used: Dict[str, float] = {}
+        self._active: Dict[str, int] = {}
+        self.loads = 0
+        self.unloads = 0
+
+    def _namespace_config(self, name: str) -> KnowledgeBaseConfig:
+        config = self.config.model_copy(deep=True)
+        backend = config.storage_settings.get('backend', 'memory')
+        config.storage_settings.update({
+            'backend': backend if backend in ('mmap', 'sqlite') else 'mmap',
+            'path': str(self.root / name)
+        })
+        if config.storage_settings.get('backup_path'):
+            config.storage_settings['backup_path'] = str(Path(config.storage_settings['backup_path']) / name)
+        return config
+
+    @staticmethod
+    def _check_name(name: str) -> None:
+        if not NAMESPACE_PATTERN.match(name):
+            raise ValueError(f"Invalid namespace name: {name!r}")
+
+    def namespace(self, name: str) -> KnowledgeBase:
+        """The knowledge base of a namespace, loading (or creating) it on first use"""
+        self._check_name(name)
+        knowledge_base = self._loaded.get(name)
+        if knowledge_base is None:
+            knowledge_base = KnowledgeBase(self._namespace_config(name), embedder=self.embedder, reranker=self.reranker)
+            self._loaded[name] = knowledge_base
+            self.loads += 1
+            usage = self._measure(knowledge_base, recount=True)
+            logger.info(f"Loaded namespace {name} with {len(knowledge_base.knowledge_store)} entries, {usage} bytes")
+        self._loaded.move_to_end(name)
+        self._last_used[name] = time.monotonic()
+        self._enforce_limits()
+        return knowledge_base
+
+    @contextmanager
+    def _using(self, name: str):
+        """Pin a namespace in memory for the duration of an operation"""
+        knowledge_base = self.namespace(name)
+        self._active[name] = self._active.get(name, 0) + 1
+        try:
+            yield knowledge_base
+        finally:
+            self._active[name] -= 1
+            if not self._active[name]:
+                del self._active[name]
+            self._last_used[name] = time.monotonic()
+            self._enforce_limits()
+
+    def quota(self, name: str) -> Optional[int]:
+        return self.quotas.get(name, self.quota_bytes)
+
+    def set_quota(self, name: str, quota_bytes: Optional[int]) -> None:
+        """Override the memory quota of one namespace; None lifts it"""
+        self._check_name(name)
+        self.quotas[name] = quota_bytes
+
+    @staticmethod
+    def _measure(knowledge_base: KnowledgeBase, recount: bool = False) -> int:
+        """Bytes of a namespace's data counted against its quota.
+
+        Unlike ``memory_usage``, which reports what is resident right now,
+        vectors count at full precision whether they sit in memory or are
+        memory-mapped from disk, so a namespace measures the same before an
+        unload and after the reload. ``recount`` re-sums the content from
+        the store rather than trusting the running counter.
+        """
+        if recount:
+            knowledge_base._content_bytes = knowledge_base._count_content_bytes()
+        usage = knowledge_base.memory_usage()
+        embeddings = knowledge_base.embeddings
+        dim = getattr(embeddings, 'dim', None) or knowledge_base.config.embedding_settings.get('dimension', 0)
+        return usage['content'] + len(embeddings) * dim * 4 + usage['lexical']
+
+    def quota_usage(self, name: str) -> int:
+        """Bytes a namespace counts against its quota, loading it if needed"""
+        with self._using(name) as knowledge_base:
+            return self._measure(knowledge_base)
+
+    def _over_quota(self, name: str, knowledge_base: KnowledgeBase) -> bool:
+        quota = self.quota(name)
+        return quota is not None and self._measure(knowledge_base) >= quota
+
+    def _check_quota(self, name: str, knowledge_base: KnowledgeBase) -> None:
+        if self._over_quota(name, knowledge_base):
+            raise ValueError(f"Namespace {name} has reached its memory quota of {self.quota(name)} bytes")
+
+    def unload(self, name: str) -> bool:
+        """Write a namespace to disk and drop it from memory"""
+        knowledge_base = self._loaded.pop(name, None)
+        if knowledge_base is None:
+            return False
+        if knowledge_base.storage is not None and knowledge_base.storage.pending_operations:
+            # Reloading from a fresh snapshot beats replaying a long log
+            knowledge_base.checkpoint()
+        knowledge_base.close()
+        self._last_used.pop(name, None)
+        self.unloads += 1
+        logger.info(f"Unloaded namespace {name}")
+        return True
+
+    def unload_idle(self, idle_seconds: Optional[float] = None) -> List[str]:
+        """Unload namespaces unused for ``idle_seconds`` (namespace_settings default)"""
+        idle_seconds = self.idle_seconds if idle_seconds is None else idle_seconds
+        if idle_seconds is None:
+            return []
+        cutoff = time.monotonic() - idle_seconds
+        idle = [name for name in self._loaded if name not in self._active and self._last_used.get(name, 0) <= cutoff]
+        for name in idle:
+            self.unload(name)
+        return idle
+
+    def _loaded_bytes(self) -> int:
+        return sum(knowledge_base.memory_usage()['total'] for knowledge_base in self._loaded.values())
+
+    def _enforce_limits(self) -> None:
+        """Unload least recently used, unpinned namespaces until back under the count and memory limits"""
+        for name in list(self._loaded):
+            over_count = len(self._loaded) > self.max_loaded
+            if not over_count and (self.max_loaded_bytes is None or self._loaded_bytes() <= self.max_loaded_bytes):
+                break
+            # The most recently used namespace always stays
+            if name not in self._active and name != next(reversed(self._loaded)):
+                self.unload(name)
+
+    def namespaces(self) -> List[str]:
+        """Every namespace, on disk or loaded"""
+        on_disk = {path.name for path in self.root.iterdir() if path.is_dir() and NAMESPACE_PATTERN.match(path.name)}
+        return sorted(on_disk | set(self._loaded))
+
+    def loaded(self) -> List[str]:
+        """Namespaces currently in memory, least recently used first"""
+        return list(self._loaded)
+
+    def drop_namespace(self, name: str) -> bool:
+        """Delete a namespace and all of its data"""
+        self._check_name(name)
+        if name in self._active:
+            raise ValueError(f"Namespace {name} is in use")
+        knowledge_base = self._loaded.pop(name, None)
+        if knowledge_base is not None:
+            knowledge_base.close()
+        self._last_used.pop(name, None)
+        self.quotas.pop(name, None)
+        path = self.root / name
+        if not path.exists():
+            return knowledge_base is not None
+        shutil.rmtree(path)
+        return True
+
+    async def add_knowledge(self, name: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        with self._using(name) as knowledge_base:
+            self._check_quota(name, knowledge_base)
+            return await knowledge_base.add_knowledge(data)
+
+    async def add_knowledge_batch(self, name: str,
+                                  documents: Union[Iterable[Dict[str, Any]], AsyncIterable[Dict[str, Any]]],
+                                  **pipeline_options) -> Dict[str, Any]:
+        """Bulk ingest into a namespace; stops taking documents once the quota is reached.
+
+        The pipeline keeps documents in flight (up to its embedding batch and
+        queue sizes), so a batch can overshoot the quota by that much; the
+        summary then has ``quota_exceeded``.
+        """
+        with self._using(name) as knowledge_base:
+            self._check_quota(name, knowledge_base)
+            state = {'quota_exceeded': False}
+
+            async def until_quota() -> AsyncIterator[Dict[str, Any]]:
+                if hasattr(documents, '__aiter__'):
+                    async for document in documents:
+                        if self._over_quota(name, knowledge_base):
+                            state['quota_exceeded'] = True
+                            return
+                        yield document
+                else:
+                    for document in documents:
+                        if self._over_quota(name, knowledge_base):
+                            state['quota_exceeded'] = True
+                            return
+                        yield document
+
+            result = await knowledge_base.add_knowledge_batch(until_quota(), **pipeline_options)
+            result['quota_exceeded'] = state['quota_exceeded']
+            return result
+
+    async def update_knowledge(self, name: str, knowledge_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        with self._using(name) as knowledge_base:
+            self._check_quota(name, knowledge_base)
+            return await knowledge_base.update_knowledge(knowledge_id, data)
+
+    def delete_knowledge(self, name: str, knowledge_id: str) -> bool:
+        with self._using(name) as knowledge_base:
+            return knowledge_base.delete_knowledge(knowledge_id)
+
+    def get_knowledge(self, name: str, knowledge_id: str) -> Optional[Dict[str, Any]]:
+        with self._using(name) as knowledge_base:
+            return knowledge_base.get_knowledge(knowledge_id)
+
+    async def retrieve_knowledge(self, name: str, query: str, top_k: int = None, **options) -> List[Dict[str, Any]]:
+        """Retrieve from one namespace only; see KnowledgeBase.retrieve_knowledge for ``options``"""
+        with self._using(name) as knowledge_base:
+            return await knowledge_base.retrieve_knowledge(query, top_k, **options)
+
+    async def hybrid_search(self, name: str, query: str, top_k: int = None, **options) -> Dict[str, Any]:
+        with self._using(name) as knowledge_base:
+            return await knowledge_base.hybrid_search(query, top_k, **options)
+
+    def memory_usage(self, name: Optional[str] = None) -> Dict[str, Any]:
+        """Memory estimate of one loaded namespace, or per loaded namespace plus the total"""
+        if name is not None:
+            knowledge_base = self._loaded.get(name)
+            return knowledge_base.memory_usage() if knowledge_base is not None else {'total': 0}
+        usage = {loaded: knowledge_base.memory_usage()['total'] for loaded, knowledge_base in self._loaded.items()}
+        return {'namespaces': usage, 'total': sum(usage.values())}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'namespaces': len(self.namespaces()),
+            'loaded': len(self._loaded),
+            'loads': self.loads,
+            'unloads': self.unloads,
+            'loaded_bytes': self._loaded_bytes()
+        }
+
+    def close(self) -> None:
+        """Unload every namespace"""
+        for name in list(self._loaded):
+            self.unload(name)
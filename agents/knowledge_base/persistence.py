@@ -0,0 +1,467 @@
+from typing import Dict, Any, Callable, Iterator, List, Optional, Set, Tuple
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+import json
+import logging
+import mmap
+import os
+import shutil
+import threading
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+from .filters import MetadataIndex
+from .lexical_index import InvertedIndex
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+def _encode_record(knowledge: Dict[str, Any]) -> Dict[str, Any]:
+    encoded = {
+        'content': knowledge['content'],
+        'metadata': knowledge['metadata'],
+        'source': knowledge['source'],
+        'chunk_spans': np.asarray(knowledge['chunk_spans']).tolist(),
+        'chunk_hashes': list(knowledge['chunk_hashes']),
+        'chunk_tokens': None if knowledge.get('chunk_tokens') is None else np.asarray(knowledge['chunk_tokens']).tolist(),
+        'timestamp': knowledge['timestamp']
+    }
+    for field in ('updated_at', 'versions'):
+        if field in knowledge:
+            encoded[field] = knowledge[field]
+    return encoded
+
+def _decode_record(encoded: Dict[str, Any]) -> Dict[str, Any]:
+    encoded['chunk_spans'] = np.array(encoded['chunk_spans'], dtype=np.int64).reshape(-1, 2)
+    if encoded['chunk_tokens'] is not None:
+        encoded['chunk_tokens'] = np.array(encoded['chunk_tokens'], dtype=np.int32)
+    return encoded
+
+class SnapshotFile:
+    """Records of one snapshot: a JSONL file read through mmap by line offset"""
+
+    def __init__(self, directory: Path):
+        with open(directory / 'records.ids.json', 'r', encoding='utf-8') as f:
+            self.ids: List[str] = json.load(f)
+        self.positions = {knowledge_id: position for position, knowledge_id in enumerate(self.ids)}
+        # (offset, length, content bytes) of each line
+        self.index = np.load(directory / 'records.index.npy', mmap_mode='r')
+        with open(directory / 'records.jsonl', 'rb') as f:
+            # An empty file cannot be mapped
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.ids else b''
+        self.content_bytes = int(self.index[:, 2].sum())
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def line(self, position: int) -> bytes:
+        offset, length = int(self.index[position, 0]), int(self.index[position, 1])
+        return self._data[offset:offset + length]
+
+    def record(self, position: int) -> Dict[str, Any]:
+        return _decode_record(json.loads(self.line(position)))
+
+class SnapshotRecords(MutableMapping):
+    """Knowledge store over a snapshot file: records decode on access, writes since it stay in memory"""
+
+    def __init__(self, base: Optional[SnapshotFile], record_bytes: Callable[[Dict[str, Any]], int],
+                 cache_size: int = 1024):
+        self.record_bytes = record_bytes
+        self.cache_size = cache_size
+        self._cache: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._set_base(base, {}, set())
+
+    def _set_base(self, base: Optional[SnapshotFile], changed: Dict[str, Dict[str, Any]], deleted: Set[str]) -> None:
+        self._base = base
+        self._positions = base.positions if base is not None else {}
+        self._changed = changed
+        self._deleted = deleted
+        self._added = sum(1 for knowledge_id in changed if knowledge_id not in self._positions)
+        with self._lock:
+            self._cache.clear()
+
+    def __contains__(self, knowledge_id: object) -> bool:
+        return knowledge_id in self._changed or (knowledge_id in self._positions and knowledge_id not in self._deleted)
+
+    def __getitem__(self, knowledge_id: str) -> Dict[str, Any]:
+        record = self._changed.get(knowledge_id)
+        if record is not None:
+            return record
+        if knowledge_id in self._deleted or knowledge_id not in self._positions:
+            raise KeyError(knowledge_id)
+        with self._lock:
+            record = self._cache.get(knowledge_id)
+            if record is not None:
+                self._cache.move_to_end(knowledge_id)
+                return record
+        record = self._base.record(self._positions[knowledge_id])
+        with self._lock:
+            self._cache[knowledge_id] = record
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return record
+
+    def __setitem__(self, knowledge_id: str, record: Dict[str, Any]) -> None:
+        if knowledge_id not in self._changed and knowledge_id not in self._positions:
+            self._added += 1
+        self._changed[knowledge_id] = record
+        self._deleted.discard(knowledge_id)
+
+    def __delitem__(self, knowledge_id: str) -> None:
+        if knowledge_id not in self:
+            raise KeyError(knowledge_id)
+        self._changed.pop(knowledge_id, None)
+        if knowledge_id in self._positions:
+            self._deleted.add(knowledge_id)
+            with self._lock:
+                self._cache.pop(knowledge_id, None)
+        else:
+            self._added -= 1
+
+    def __iter__(self) -> Iterator[str]:
+        if self._base is not None:
+            for knowledge_id in self._base.ids:
+                if knowledge_id in self._changed or knowledge_id not in self._deleted:
+                    yield knowledge_id
+        for knowledge_id in list(self._changed):
+            if knowledge_id not in self._positions:
+                yield knowledge_id
+
+    def __len__(self) -> int:
+        return len(self._positions) - len(self._deleted) + self._added
+
+    def content_bytes(self) -> int:
+        """Content bytes of every record, without decoding the snapshot"""
+        total = self._base.content_bytes if self._base is not None else 0
+        for knowledge_id in self._deleted | (self._changed.keys() & self._positions.keys()):
+            total -= int(self._base.index[self._positions[knowledge_id], 2])
+        return total + sum(self.record_bytes(record) for record in self._changed.values())
+
+    def capture(self) -> Tuple[Optional[SnapshotFile], Dict[str, Dict[str, Any]], Set[str]]:
+        """The current contents, for writing a snapshot while writes continue"""
+        return self._base, dict(self._changed), set(self._deleted)
+
+    def rebase(self, base: SnapshotFile, captured: Tuple[Any, Dict[str, Dict[str, Any]], Set[str]]) -> None:
+        """Switch to a snapshot written from ``captured``, keeping the writes made since"""
+        _, written, _ = captured
+        changed = {knowledge_id: record for knowledge_id, record in self._changed.items()
+                   if written.get(knowledge_id) is not record}
+        deleted = {knowledge_id for knowledge_id in self._deleted if knowledge_id in base.positions}
+        deleted.update(knowledge_id for knowledge_id in written if knowledge_id not in self)
+        self._set_base(base, changed, deleted)
+
+class MmapStorage:
+    """On-disk knowledge store: memory-mapped snapshot plus append-only log.
+
+    Layout of the storage directory::
+
+        CURRENT                          generation of the live snapshot
+        snapshot-<n>/manifest.json       backup state and the index type the snapshot was written with
+        snapshot-<n>/records.jsonl       one knowledge record per line, read lazily
+        snapshot-<n>/records.index.npy   (offset, length, content bytes) of each line
+        snapshot-<n>/vectors.npy         float32 embedding matrix, opened with mmap
+        snapshot-<n>/index.npz           trained vector index state, e.g. a quantizer
+        snapshot-<n>/lexical.json        inverted index
+        snapshot-<n>/metadata.json       filter index
+        snapshot-<n>/dedup.npz           near-duplicate signatures
+        oplog-<n>.jsonl                  operations applied after snapshot <n>
+        config.json                      KnowledgeBaseConfig the store was last opened with
+    """
+
+    def __init__(self, path: str, checkpoint_interval: int = 1000):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.checkpoint_interval = checkpoint_interval
+        self.generation = self._read_generation()
+        self.log_generation = self.generation
+        self.pending_operations = 0
+        self._log = None
+        self._batch_depth = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._writing: Optional[Tuple[Future, SnapshotRecords, Any, int]] = None
+
+    def save_config(self, config) -> None:
+        """Record the settings the store is chunked and embedded with, e.g. for the backup command line"""
+        tmp = self.path / 'config.json.tmp'
+        tmp.write_text(config.model_dump_json(indent=2), encoding='utf-8')
+        os.replace(tmp, self.path / 'config.json')
+
+    def _read_generation(self) -> int:
+        current = self.path / 'CURRENT'
+        if not current.exists():
+            return 0
+        return int(current.read_text().strip())
+
+    def _snapshot_dir(self, generation: int) -> Path:
+        return self.path / f'snapshot-{generation}'
+
+    def _log_path(self, generation: int) -> Path:
+        return self.path / f'oplog-{generation}.jsonl'
+
+    def load(self, knowledge_base) -> int:
+        """Open the live snapshot in a knowledge base and replay the logs after it, returning replayed operations"""
+        self._remove_stale()
+        snapshot = self._snapshot_dir(self.generation)
+        knowledge_base.knowledge_store = SnapshotRecords(None, knowledge_base._record_bytes)
+        if snapshot.exists():
+            if not (snapshot / 'manifest.json').exists():
+                raise ValueError(f"{snapshot} is not in a supported snapshot format; restore it from a backup")
+            self._load_snapshot(knowledge_base, snapshot)
+
+        replayed = 0
+        generation = self.generation
+        while self._log_path(generation).exists():
+            replayed += self._replay(knowledge_base, self._log_path(generation))
+            generation += 1
+        self.log_generation = max(self.generation, generation - 1)
+        self.pending_operations = replayed
+        self._log = open(self._log_path(self.log_generation), 'a', encoding='utf-8')
+        logger.info(f"Loaded knowledge snapshot {self.generation} and replayed {replayed} operations")
+        return replayed
+
+    def _load_snapshot(self, knowledge_base, snapshot: Path) -> None:
+        with open(snapshot / 'manifest.json', 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        knowledge_base.knowledge_store = SnapshotRecords(SnapshotFile(snapshot), knowledge_base._record_bytes)
+        knowledge_base._backup_chain = manifest['backup_chain']
+        knowledge_base._backup_dirty = set(manifest['backup_dirty'])
+
+        with open(snapshot / 'lexical.json', 'r', encoding='utf-8') as f:
+            knowledge_base.lexical_index = InvertedIndex.from_dict(json.load(f))
+        with open(snapshot / 'metadata.json', 'r', encoding='utf-8') as f:
+            metadata = json.load(f)
+        if metadata['fields'] == knowledge_base.metadata_index.fields:
+            knowledge_base.metadata_index = MetadataIndex.from_dict(metadata)
+        else:
+            for knowledge_id, knowledge in knowledge_base.knowledge_store.items():
+                knowledge_base.metadata_index.add(knowledge_id, knowledge)
+
+        dedup = knowledge_base.dedup
+        if dedup is not None:
+            loaded = False
+            if (snapshot / 'dedup.npz').exists():
+                with np.load(snapshot / 'dedup.npz', allow_pickle=False) as arrays:
+                    loaded = dedup.load_arrays(dict(arrays))
+            if not loaded:
+                for knowledge_id in knowledge_base.knowledge_store:
+                    dedup.add(knowledge_id, dedup.signature(knowledge_base._chunk_map(knowledge_id).values()))
+
+        if manifest['vectors']:
+            with open(snapshot / 'vector_ids.json', 'r', encoding='utf-8') as f:
+                vector_ids = json.load(f)
+            vectors = np.load(snapshot / 'vectors.npy', mmap_mode='c')
+            state = None
+            index_type = knowledge_base.config.knowledge_settings.get('index_type', 'flat')
+            if manifest['index_type'] == index_type and (snapshot / 'index.npz').exists():
+                with np.load(snapshot / 'index.npz', allow_pickle=False) as arrays:
+                    state = dict(arrays)
+            if state:
+                # Reuse the trained index state instead of retraining on every open
+                knowledge_base.embeddings.attach(vector_ids, vectors, state=state)
+            else:
+                knowledge_base.embeddings.attach(vector_ids, vectors)
+
+    @staticmethod
+    def _replay(knowledge_base, log_path: Path) -> int:
+        replayed = 0
+        valid = 0
+        with open(log_path, 'rb') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final write from a crash; everything before it is intact
+                    logger.warning(f"Ignoring incomplete log entry in {log_path}")
+                    break
+                knowledge_base._apply_operation(entry)
+                replayed += 1
+                valid += len(line)
+        if valid < log_path.stat().st_size:
+            os.truncate(log_path, valid)
+        return replayed
+
+    def _remove_stale(self) -> None:
+        """Delete snapshots other than the live one and logs it already contains"""
+        for path in self.path.iterdir():
+            name, _, generation = path.stem.partition('-')
+            if not generation.isdigit():
+                continue
+            if (name == 'snapshot' and int(generation) != self.generation) or \
+                    (name == 'oplog' and int(generation) < self.generation):
+                if path.is_dir():
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    path.unlink(missing_ok=True)
+
+    def append(self, operation: str, knowledge_id: str, data: Optional[Dict[str, Any]] = None) -> None:
+        """Append one operation to the log and flush it"""
+        if self._writing is not None and self._writing[0].done():
+            self._finish()
+        entry = {
+            'op': operation,
+            'knowledge_id': knowledge_id,
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+        if data is not None:
+            entry['data'] = data
+        self._log.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        if not self._batch_depth:
+            self._log.flush()
+        self.pending_operations += 1
+
+    @contextmanager
+    def batch(self):
+        """Flush the log once for many operations, e.g. a bulk ingest"""
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth and self._log is not None:
+                self._log.flush()
+
+    def should_checkpoint(self) -> bool:
+        return self._writing is None and self.pending_operations >= self.checkpoint_interval
+
+    def checkpoint(self, knowledge_base, wait: bool = True) -> int:
+        """Write a new snapshot on a background thread and start a new log, returning its generation"""
+        self.wait()
+        generation = self.log_generation + 1
+        state = self._capture(knowledge_base)
+        self._log.close()
+        self._log = open(self._log_path(generation), 'a', encoding='utf-8')
+        self.log_generation = generation
+        operations, self.pending_operations = self.pending_operations, 0
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='checkpoint')
+        future = self._executor.submit(self._write_snapshot, generation, state)
+        self._writing = (future, knowledge_base.knowledge_store, state['records'], operations)
+        if wait:
+            future.exception()
+            error = self._finish()
+            if error is not None:
+                raise error
+        return generation
+
+    def _capture(self, knowledge_base) -> Dict[str, Any]:
+        """Copy what a snapshot needs so writes can go on while it is written"""
+        self._log.flush()
+        embeddings = knowledge_base.embeddings
+        lexical_index = knowledge_base.lexical_index
+        if hasattr(lexical_index, 'materialize'):
+            # Segmented indexes are stored as one plain index
+            lexical_index = lexical_index.materialize()
+        vector_ids = [str(item_id) for item_id in embeddings.ids]
+        return {
+            'records': knowledge_base.knowledge_store.capture(),
+            'record_bytes': knowledge_base._record_bytes,
+            'vector_ids': vector_ids,
+            'vectors': np.array(embeddings.vectors, dtype=np.float32) if vector_ids else None,
+            'index_type': knowledge_base.config.knowledge_settings.get('index_type', 'flat'),
+            'index_state': embeddings.state() if hasattr(embeddings, 'state') else {},
+            'lexical': lexical_index.to_dict(),
+            'metadata': knowledge_base.metadata_index.to_dict(),
+            'dedup': knowledge_base.dedup.to_arrays() if knowledge_base.dedup is not None else None,
+            'backup_chain': knowledge_base._backup_chain,
+            'backup_dirty': sorted(knowledge_base._backup_dirty)
+        }
+
+    def _write_snapshot(self, generation: int, state: Dict[str, Any]) -> None:
+        snapshot = self._snapshot_dir(generation)
+        if snapshot.exists():
+            shutil.rmtree(snapshot)
+        snapshot.mkdir()
+
+        base, changed, deleted = state['records']
+        ids: List[str] = []
+        index: List[Tuple[int, int, int]] = []
+        offset = 0
+        with open(snapshot / 'records.jsonl', 'wb') as f:
+            if base is not None:
+                # Unchanged records are copied as raw lines, without decoding
+                for position, knowledge_id in enumerate(base.ids):
+                    if knowledge_id in changed or knowledge_id in deleted:
+                        continue
+                    line = base.line(position)
+                    f.write(line)
+                    ids.append(knowledge_id)
+                    index.append((offset, len(line), int(base.index[position, 2])))
+                    offset += len(line)
+            for knowledge_id, knowledge in changed.items():
+                line = (json.dumps(_encode_record(knowledge), ensure_ascii=False) + '\n').encode('utf-8')
+                f.write(line)
+                ids.append(knowledge_id)
+                index.append((offset, len(line), state['record_bytes'](knowledge)))
+                offset += len(line)
+            f.flush()
+            os.fsync(f.fileno())
+        np.save(snapshot / 'records.index.npy', np.array(index, dtype=np.int64).reshape(-1, 3))
+        self._write_json(snapshot / 'records.ids.json', ids)
+
+        if state['vector_ids']:
+            np.save(snapshot / 'vectors.npy', state['vectors'])
+            self._write_json(snapshot / 'vector_ids.json', state['vector_ids'])
+        if state['index_state']:
+            np.savez(snapshot / 'index.npz', **state['index_state'])
+        if state['dedup'] is not None:
+            np.savez(snapshot / 'dedup.npz', **state['dedup'])
+        self._write_json(snapshot / 'lexical.json', state['lexical'])
+        self._write_json(snapshot / 'metadata.json', state['metadata'])
+        self._write_json(snapshot / 'manifest.json', {
+            'format': FORMAT_VERSION,
+            'records': len(ids),
+            'vectors': len(state['vector_ids']),
+            'index_type': state['index_type'],
+            'backup_chain': state['backup_chain'],
+            'backup_dirty': state['backup_dirty']
+        })
+
+        current_tmp = self.path / 'CURRENT.tmp'
+        with open(current_tmp, 'w') as f:
+            f.write(str(generation))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(current_tmp, self.path / 'CURRENT')
+
+    @staticmethod
+    def _write_json(path: Path, value: Any) -> None:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(value, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def wait(self) -> None:
+        """Block until a snapshot being written in the background is finished"""
+        if self._writing is not None:
+            self._writing[0].exception()
+            self._finish()
+
+    def _finish(self) -> Optional[BaseException]:
+        future, records, captured, operations = self._writing
+        self._writing = None
+        error = future.exception()
+        if error is not None:
+            # The logs are kept, so the next checkpoint writes everything again
+            self.pending_operations += operations
+            logger.error(f"Failed to write knowledge snapshot: {error}")
+            return error
+        self.generation = self._read_generation()
+        records.rebase(SnapshotFile(self._snapshot_dir(self.generation)), captured)
+        # Old snapshot files may still be mapped; unlinking is safe on POSIX
+        self._remove_stale()
+        logger.info(f"Wrote knowledge snapshot {self.generation}")
+        return None
+
+    def close(self) -> None:
+        self.wait()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        if self._log is not None:
+            self._log.close()
+            self._log = None
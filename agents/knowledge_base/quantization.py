@@ -0,0 +1,436 @@
+from typing import Dict, Any, Iterable, List, Optional, Sequence, Tuple
+import logging
+import numpy as np
+from .vector_store import EmbeddingStore, normalize_rows
+
+logger = logging.getLogger(__name__)
+
+def kmeans(sample: np.ndarray, k: int, iterations: int, rng: np.random.Generator) -> np.ndarray:
+    """Euclidean k-means, returning the (k, dim) centroids"""
+    centroids = sample[rng.choice(len(sample), k, replace=False)].copy()
+    for _ in range(iterations):
+        # argmin |x - c|^2 == argmax (x.c - |c|^2 / 2)
+        labels = np.argmax(sample @ centroids.T - 0.5 * np.einsum('ij,ij->i', centroids, centroids), axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        counts = np.bincount(labels, minlength=k)
+        empty = np.flatnonzero(counts == 0)
+        counts[empty] = 1
+        centroids = sums / counts[:, None]
+        if len(empty):
+            centroids[empty] = sample[rng.choice(len(sample), len(empty), replace=False)]
+    return centroids.astype(np.float32)
+
+class ScalarQuantizer:
+    """8-bit scalar quantizer with a trained value range per dimension.
+
+    Each component is stored as a uint8 step between the sampled minimum and
+    maximum of its dimension (4x smaller than float32); values outside the
+    range are clipped.
+    """
+
+    code_dtype = np.uint8
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.code_size = dim
+        self.minimum: Optional[np.ndarray] = None
+        self.step: Optional[np.ndarray] = None
+
+    @property
+    def is_trained(self) -> bool:
+        return self.minimum is not None
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {'minimum': self.minimum, 'step': self.step}
+
+    @classmethod
+    def from_arrays(cls, dim: int, arrays: Dict[str, np.ndarray]) -> 'ScalarQuantizer':
+        quantizer = cls(dim)
+        quantizer.minimum, quantizer.step = arrays['minimum'], arrays['step']
+        return quantizer
+
+    def train(self, sample: np.ndarray) -> None:
+        self.minimum = sample.min(axis=0)
+        self.step = np.maximum(sample.max(axis=0) - self.minimum, 1e-12) / 255
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.rint((vectors - self.minimum) / self.step)
+        return np.clip(codes, 0, 255).astype(np.uint8)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return (codes.astype(np.float32) * self.step + self.minimum).astype(np.float32)
+
+    def scorer(self, query: np.ndarray):
+        """Return a function computing approximate inner products of code rows with ``query``"""
+        weights = (query * self.step).astype(np.float32)
+        offset = float(query @ self.minimum)
+        return lambda codes: codes.astype(np.float32) @ weights + offset
+
+class ProductQuantizer:
+    """Product quantizer: ``subvectors`` sub-spaces with 256 centroids each.
+
+    A vector is stored as one uint8 centroid index per sub-space, so a
+    1536-dimensional embedding with 96 sub-vectors takes 96 bytes instead of
+    6 KB. Queries use asymmetric distance computation: a (subvectors, 256)
+    table of sub-space inner products, then one lookup per code byte.
+    """
+
+    code_dtype = np.uint8
+
+    def __init__(self, dim: int, subvectors: int = 96, iterations: int = 15, seed: int = 0):
+        if dim % subvectors:
+            raise ValueError(f"Dimension {dim} is not divisible into {subvectors} subvectors")
+        self.dim = dim
+        self.subvectors = subvectors
+        self.code_size = subvectors
+        self.sub_dim = dim // subvectors
+        self.iterations = iterations
+        self.codebooks: Optional[np.ndarray] = None
+        self._rng = np.random.default_rng(seed)
+
+    @property
+    def is_trained(self) -> bool:
+        return self.codebooks is not None
+
+    def _split(self, vectors: np.ndarray) -> np.ndarray:
+        """View (n, dim) rows as (subvectors, n, sub_dim)"""
+        return vectors.reshape(len(vectors), self.subvectors, self.sub_dim).transpose(1, 0, 2)
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {'codebooks': self.codebooks}
+
+    @classmethod
+    def from_arrays(cls, dim: int, arrays: Dict[str, np.ndarray]) -> 'ProductQuantizer':
+        quantizer = cls(dim, subvectors=len(arrays['codebooks']))
+        quantizer.codebooks = arrays['codebooks']
+        return quantizer
+
+    def train(self, sample: np.ndarray) -> None:
+        if len(sample) < 256:
+            raise ValueError(f"Need at least 256 vectors to train, have {len(sample)}")
+        self.codebooks = np.stack([kmeans(np.ascontiguousarray(part), 256, self.iterations, self._rng)
+                                   for part in self._split(sample)])
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.empty((len(vectors), self.subvectors), dtype=np.uint8)
+        for j, part in enumerate(self._split(vectors)):
+            codebook = self.codebooks[j]
+            codes[:, j] = np.argmax(part @ codebook.T - 0.5 * np.einsum('ij,ij->i', codebook, codebook), axis=1)
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        parts = [self.codebooks[j][codes[:, j]] for j in range(self.subvectors)]
+        return np.concatenate(parts, axis=1) if parts else np.empty((0, self.dim), dtype=np.float32)
+
+    def scorer(self, query: np.ndarray):
+        """Return a function computing approximate inner products of code rows with ``query``"""
+        table = np.einsum('jkd,jd->jk', self.codebooks, query.reshape(self.subvectors, self.sub_dim))
+
+        def score(codes: np.ndarray) -> np.ndarray:
+            scores = np.zeros(len(codes), dtype=np.float32)
+            for j in range(self.subvectors):
+                scores += table[j][codes[:, j]]
+            return scores
+        return score
+
+QUANTIZERS = {
+    'int8': ScalarQuantizer,
+    'pq': ProductQuantizer,
+}
+
+class QuantizedIndex:
+    """Exhaustive index over compressed vectors with optional exact rescoring.
+
+    Rows are kept densely packed like ``EmbeddingStore`` but as quantizer
+    codes. A query scores every code, takes the best ``top_k *
+    rescore_factor`` and, when ``rescore`` is on, re-ranks them by exact
+    cosine similarity against the original vectors. Rescoring is opt-in:
+    it keeps the float32 originals next to the codes, which costs as much
+    RAM as a flat index unless they are the memory-mapped snapshot of a
+    storage reload (then only the rescored rows are paged in). Until
+    ``min_train_size`` vectors exist everything lives in one exact staging
+    store, as with ``IVFIndex``.
+    """
+
+    def __init__(self, dim: Optional[int] = None, quantizer: str = 'int8', rescore: bool = False,
+                 rescore_factor: int = 4, min_train_size: int = 1024, quantizer_options: Optional[Dict[str, Any]] = None,
+                 block_size: int = 65536, initial_capacity: int = 1024):
+        if quantizer not in QUANTIZERS:
+            raise ValueError(f"Unknown quantizer: {quantizer}")
+        self.dim = dim
+        self.quantizer_type = quantizer
+        self.quantizer_options = quantizer_options or {}
+        self.quantizer = None
+        self.rescore = rescore
+        self.rescore_factor = max(1, rescore_factor)
+        # PQ trains 256 centroids per sub-space
+        self.min_train_size = max(min_train_size, 256) if quantizer == 'pq' else min_train_size
+        self.block_size = block_size
+        self._staging = EmbeddingStore(dim)
+        self._originals: Optional[EmbeddingStore] = None
+        self._capacity = initial_capacity
+        self._size = 0
+        self._codes: Optional[np.ndarray] = None
+        self._ids = np.empty(initial_capacity, dtype=object)
+        self._positions: Dict[str, int] = {}
+        if dim is not None:
+            self._check_dimension(dim)
+
+    def _check_dimension(self, dim: int) -> None:
+        """Fit the PQ sub-vector count to the dimension before any vector is stored.
+
+        A count that does not divide the dimension falls back to its largest
+        divisor below the configured count, so training cannot fail later.
+        """
+        if self.quantizer_type != 'pq' or self.is_trained:
+            return
+        subvectors = self.quantizer_options.get('subvectors', 96)
+        if dim % subvectors == 0:
+            return
+        fallback = max(divisor for divisor in range(1, min(subvectors, dim) + 1) if dim % divisor == 0)
+        logger.warning(f"Dimension {dim} is not divisible into {subvectors} PQ subvectors, using {fallback}")
+        self.quantizer_options = {**self.quantizer_options, 'subvectors': fallback}
+
+    def __len__(self) -> int:
+        return self._size if self.is_trained else len(self._staging)
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self._positions if self.is_trained else item_id in self._staging
+
+    @property
+    def is_trained(self) -> bool:
+        return self.quantizer is not None
+
+    @property
+    def codes(self) -> np.ndarray:
+        """Quantizer codes aligned with ``ids``"""
+        return self._codes[:self._size]
+
+    @property
+    def ids(self) -> np.ndarray:
+        """Item ids aligned with ``vectors``"""
+        if not self.is_trained:
+            return self._staging.ids
+        if self._originals is not None:
+            return self._originals.ids
+        return self._ids[:self._size]
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """Normalized embedding rows: the originals when kept, otherwise the (lossy) reconstructions"""
+        if not self.is_trained:
+            return self._staging.vectors
+        if self._originals is not None:
+            return self._originals.vectors
+        return normalize_rows(self.quantizer.decode(self.codes))
+
+    def train(self, sample_size: int = 65536, quantizer=None) -> None:
+        """Fit the quantizer on the staged vectors (or adopt a fitted one) and encode them"""
+        ids, vectors = list(self._staging.ids), self._staging.vectors
+        if quantizer is None:
+            if len(vectors) > sample_size:
+                sample = vectors[np.random.default_rng(0).choice(len(vectors), sample_size, replace=False)]
+            else:
+                sample = vectors
+            quantizer = QUANTIZERS[self.quantizer_type](self.dim, **self.quantizer_options)
+            quantizer.train(np.asarray(sample, dtype=np.float32))
+            logger.info(f"Trained {self.quantizer_type} quantizer on {len(sample)} vectors "
+                        f"({quantizer.code_size} bytes per vector)")
+        self.quantizer = quantizer
+        self._codes = np.zeros((self._capacity, quantizer.code_size), dtype=quantizer.code_dtype)
+        if self.rescore:
+            # Keep the staged store as the originals: it may already be a memory map
+            self._originals = self._staging
+        self._staging = EmbeddingStore(self.dim)
+        self._encode(ids, vectors)
+
+    def _reserve(self, extra: int) -> None:
+        """Grow the code and id arrays so that ``extra`` more rows fit"""
+        needed = self._size + extra
+        if needed <= self._capacity:
+            return
+        capacity = max(self._capacity, 1)
+        while capacity < needed:
+            capacity *= 2
+        codes = np.zeros((capacity, self.quantizer.code_size), dtype=self.quantizer.code_dtype)
+        codes[:self._size] = self._codes[:self._size]
+        ids = np.empty(capacity, dtype=object)
+        ids[:self._size] = self._ids[:self._size]
+        self._codes, self._ids, self._capacity = codes, ids, capacity
+
+    def _encode(self, ids: Sequence[str], vectors: np.ndarray) -> None:
+        """Store codes for normalized vectors, overwriting existing ids"""
+        self._reserve(len(ids))
+        for start in range(0, len(ids), self.block_size):
+            block_ids = ids[start:start + self.block_size]
+            codes = self.quantizer.encode(np.asarray(vectors[start:start + self.block_size], dtype=np.float32))
+            for item_id, code in zip(block_ids, codes):
+                position = self._positions.get(item_id)
+                if position is None:
+                    position = self._size
+                    self._positions[item_id] = position
+                    self._ids[position] = item_id
+                    self._size += 1
+                self._codes[position] = code
+
+    def add(self, ids: Sequence[str], vectors: Any) -> None:
+        """Insert or overwrite embeddings for the given ids"""
+        if not self.is_trained:
+            if self.dim is None and len(ids):
+                self._check_dimension(np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1).shape[1])
+            self._staging.add(ids, vectors)
+            self.dim = self._staging.dim
+            if len(self._staging) >= self.min_train_size:
+                self.train()
+            return
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1)
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected embeddings of dimension {self.dim}, got {vectors.shape[1]}")
+        vectors = normalize_rows(vectors)
+        if self._originals is not None:
+            self._originals.add(ids, vectors)
+        self._encode(list(ids), vectors)
+
+    def state(self) -> Dict[str, np.ndarray]:
+        """Arrays of the fitted quantizer, plus the codes when no originals are kept, so ``attach`` can skip training"""
+        if not self.is_trained:
+            return {}
+        state = dict(self.quantizer.to_arrays())
+        if self._originals is None:
+            # ``vectors`` are then lossy reconstructions, which would not re-encode to the same codes
+            state['codes'] = self.codes.copy()
+        return state
+
+    def attach(self, ids: Sequence[str], vectors: np.ndarray, state: Optional[Dict[str, np.ndarray]] = None) -> None:
+        """Load a normalized matrix (e.g. a memory map), quantizing it with the quantizer in ``state`` or a new one"""
+        quantizer = QUANTIZERS[self.quantizer_type].from_arrays(vectors.shape[1], state) if state else None
+        if quantizer is not None and 'codes' in state and not self.rescore:
+            self.dim = vectors.shape[1]
+            self.quantizer = quantizer
+            self._codes = np.array(state['codes'], dtype=quantizer.code_dtype)
+            self._ids = np.array(list(ids), dtype=object)
+            self._positions = {item_id: position for position, item_id in enumerate(self._ids)}
+            self._size = self._capacity = len(self._ids)
+            return
+        if quantizer is None:
+            self._check_dimension(vectors.shape[1])
+        self._staging.attach(ids, vectors)
+        self.dim = self._staging.dim
+        if quantizer is not None or len(self._staging) >= self.min_train_size:
+            self.train(quantizer=quantizer)
+
+    def remove(self, ids: Sequence[str]) -> int:
+        """Remove embeddings by id, returning how many were present"""
+        if not self.is_trained:
+            return self._staging.remove(ids)
+        removed = 0
+        for item_id in ids:
+            position = self._positions.pop(item_id, None)
+            if position is None:
+                continue
+            last = self._size - 1
+            if position != last:
+                moved_id = self._ids[last]
+                self._codes[position] = self._codes[last]
+                self._ids[position] = moved_id
+                self._positions[moved_id] = position
+            self._ids[last] = None
+            self._size -= 1
+            removed += 1
+        if self._originals is not None:
+            self._originals.remove(ids)
+        return removed
+
+    def get(self, item_id: str) -> Optional[np.ndarray]:
+        """Get the normalized embedding stored for an id (reconstructed when originals are not kept)"""
+        if not self.is_trained:
+            return self._staging.get(item_id)
+        if self._originals is not None:
+            return self._originals.get(item_id)
+        position = self._positions.get(item_id)
+        if position is None:
+            return None
+        return normalize_rows(self.quantizer.decode(self._codes[position:position + 1]))[0]
+
+    def _approximate_scores(self, query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Approximate inner products of the query with every (or the given) code row, block by block"""
+        score = self.quantizer.scorer(query)
+        codes = self.codes if rows is None else self._codes[rows]
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), self.block_size):
+            scores[start:start + self.block_size] = score(codes[start:start + self.block_size])
+        return scores
+
+    def search(self, query: Any, top_k: int, threshold: Optional[float] = None,
+               ids: Optional[Iterable[str]] = None, rescore: Optional[bool] = None) -> List[Tuple[str, float]]:
+        """Return up to ``top_k`` (id, cosine similarity) pairs, best first.
+
+        Scores are exact after rescoring and approximate otherwise. With
+        ``ids``, only the rows of those ids are scored.
+        """
+        if not self.is_trained:
+            return self._staging.search(query, top_k, threshold, ids)
+        if self._size == 0 or top_k <= 0:
+            return []
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        if query.shape[0] != self.dim:
+            raise ValueError(f"Expected query of dimension {self.dim}, got {query.shape[0]}")
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+        query = query / norm
+
+        rows = None
+        if ids is not None:
+            rows = np.fromiter((self._positions[item_id] for item_id in ids if item_id in self._positions),
+                               dtype=np.int64)
+        scores = self._approximate_scores(query, rows)
+        rescore = self.rescore if rescore is None else rescore
+        rescore = rescore and self._originals is not None
+        candidate_k = top_k * self.rescore_factor if rescore else top_k
+        candidates = np.arange(len(scores))
+        if len(candidates) > candidate_k:
+            candidates = np.argpartition(scores, -candidate_k)[-candidate_k:]
+        positions = candidates if rows is None else rows[candidates]
+        candidate_ids = [self._ids[position] for position in positions]
+
+        if rescore:
+            exact = np.stack([self._originals.get(item_id) for item_id in candidate_ids]) @ query
+            hits = list(zip(candidate_ids, exact.tolist()))
+        else:
+            hits = list(zip(candidate_ids, scores[candidates].tolist()))
+        if threshold is not None:
+            hits = [hit for hit in hits if hit[1] >= threshold]
+        hits.sort(key=lambda hit: hit[1], reverse=True)
+        return hits[:top_k]
+
+    def estimate_recall(self, queries: Any, top_k: int = 10, rescore: Optional[bool] = None) -> float:
+        """Mean recall@k of quantized search against exact search over the kept originals"""
+        if not self.is_trained or self._originals is None:
+            raise ValueError("Recall can only be measured on a trained index that keeps original vectors")
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        recalls = []
+        for query in queries:
+            exact = {item_id for item_id, _ in self._originals.search(query, top_k)}
+            if not exact:
+                continue
+            found = {item_id for item_id, _ in self.search(query, top_k, rescore=rescore)}
+            recalls.append(len(exact & found) / len(exact))
+        return float(np.mean(recalls)) if recalls else 1.0
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Bytes held by codes and by in-memory original vectors"""
+        usage = {'codes': int(self.codes.nbytes) if self.is_trained else 0, 'originals': 0}
+        originals = self._originals if self.is_trained else self._staging
+        if originals is not None and originals._matrix is not None and not isinstance(originals._matrix, np.memmap):
+            usage['originals'] = int(originals.vectors.nbytes)
+        return usage
+
+    def as_dict(self) -> Dict[str, List[float]]:
+        """Export embeddings as plain lists keyed by id"""
+        if not self.is_trained:
+            return self._staging.as_dict()
+        if self._originals is not None:
+            return self._originals.as_dict()
+        return {item_id: vector.tolist() for item_id, vector in zip(self.ids, self.vectors)}
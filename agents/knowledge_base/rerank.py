@@ -0,0 +1,47 @@
+from typing import Dict, Hashable, List, Sequence
+import logging
+from .utils import normalize_query, tokenize
+
+logger = logging.getLogger(__name__)
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Hashable]], k: int = 60) -> Dict[Hashable, float]:
+    """Fuse several best-first rankings: score(d) = sum over rankings of 1 / (k + rank(d))"""
+    fused: Dict[Hashable, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            fused[item] = fused.get(item, 0.0) + 1.0 / (k + rank)
+    return fused
+
+class Reranker:
+    """Base class for second-stage rerankers.
+
+    A reranker only ever sees the fused top-N candidates, so it may be far
+    more expensive per passage than first-stage retrieval.
+    """
+
+    def rerank(self, query: str, passages: List[str]) -> List[float]:
+        """Score each passage against the query, higher is better"""
+        raise NotImplementedError
+
+class TermCoverageReranker(Reranker):
+    """Offline reranker favouring passages that cover every query term.
+
+    Scores the share of distinct query terms found in the passage, plus a
+    bonus when the whole normalized query occurs verbatim.
+    """
+
+    def __init__(self, phrase_bonus: float = 0.5):
+        self.phrase_bonus = phrase_bonus
+
+    def rerank(self, query: str, passages: List[str]) -> List[float]:
+        query_terms = set(tokenize(query))
+        phrase = normalize_query(query)
+        scores = []
+        for passage in passages:
+            if not query_terms:
+                scores.append(0.0)
+                continue
+            coverage = len(query_terms & set(tokenize(passage))) / len(query_terms)
+            bonus = self.phrase_bonus if phrase and phrase in normalize_query(passage) else 0.0
+            scores.append(coverage + bonus)
+        return scores
@@ -0,0 +1,674 @@
+from typing import Dict, Any, AbstractSet, Callable, Iterable, List, Optional, Sequence, Set, Tuple
+from contextlib import contextmanager
+import heapq
+import logging
+import math
+import threading
+import time
+import numpy as np
+from .filters import MetadataIndex
+from .lexical_index import InvertedIndex
+from .vector_store import EmbeddingStore
+from .utils import tokenize
+
+logger = logging.getLogger(__name__)
+
+_EMPTY: AbstractSet[str] = frozenset()
+
+class Segment:
+    """Immutable slice of the indexes: chunk postings, chunk vectors and the
+    knowledge records written while it was the open segment.
+
+    ``records`` maps a knowledge id to its record as of this segment, or to
+    None when the entry was deleted, and ``metadata`` is the filter index of
+    those records. Nothing in a segment changes once it is published;
+    deletions of its chunks are tombstones kept in the snapshot.
+    """
+
+    __slots__ = ('segment_id', 'lexical', 'vectors', 'records', 'metadata')
+
+    def __init__(self, segment_id: int, lexical: InvertedIndex, vectors: Any,
+                 records: Optional[Dict[str, Optional[Dict[str, Any]]]] = None,
+                 metadata: Optional[MetadataIndex] = None):
+        self.segment_id = segment_id
+        self.lexical = lexical
+        self.vectors = vectors
+        self.records = records if records is not None else {}
+        self.metadata = metadata
+
+    def __len__(self) -> int:
+        return len(self.lexical) + len(self.vectors) + len(self.records)
+
+class CorpusStatistics:
+    """BM25 collection statistics summed over the segments of a snapshot.
+
+    Tombstoned chunks still count, as in Lucene, until a merge drops them.
+    """
+
+    def __init__(self, segments: Sequence[Segment]):
+        self.segments = segments
+        self.chunk_count = sum(len(segment.lexical) for segment in segments)
+        total_length = sum(segment.lexical.total_length for segment in segments)
+        self.average_length = total_length / self.chunk_count if self.chunk_count else 0.0
+        self._idf: Dict[str, float] = {}
+
+    def idf(self, term: str) -> float:
+        idf = self._idf.get(term)
+        if idf is None:
+            document_frequency = sum(len(segment.lexical.postings.get(term, ())) for segment in self.segments)
+            idf = math.log(1 + (self.chunk_count - document_frequency + 0.5) / (document_frequency + 0.5))
+            self._idf[term] = idf
+        return idf
+
+class IndexSnapshot:
+    """Point-in-time view of a segmented index.
+
+    A reader takes ``SegmentStore.snapshot`` once and runs its whole query
+    against it: later writes and merges publish new snapshots instead of
+    touching this one. ``generation`` is the writer's generation counter
+    when the snapshot was published, i.e. the last write it includes.
+    """
+
+    def __init__(self, segments: Tuple[Segment, ...] = (),
+                 deleted_chunks: Optional[Dict[int, AbstractSet[str]]] = None,
+                 deleted_vectors: Optional[Dict[int, AbstractSet[str]]] = None,
+                 generation: int = 0):
+        self.segments = segments
+        self.deleted_chunks = deleted_chunks or {}
+        self.deleted_vectors = deleted_vectors or {}
+        self.generation = generation
+        self.corpus = CorpusStatistics(segments)
+
+    def record(self, knowledge_id: str) -> Optional[Dict[str, Any]]:
+        """The knowledge record as of this snapshot, None if absent or deleted"""
+        for segment in reversed(self.segments):
+            if knowledge_id in segment.records:
+                return segment.records[knowledge_id]
+        return None
+
+    def resolve(self, filters: Optional[Dict[str, Any]]) -> Optional[Set[str]]:
+        """Knowledge ids whose record as of this snapshot matches a filter spec (see MetadataIndex)"""
+        if not filters:
+            return None
+        allowed: Set[str] = set()
+        for position, segment in enumerate(self.segments):
+            if segment.metadata is None:
+                continue
+            newer = self.segments[position + 1:]
+            # A match only counts when no newer segment supersedes (or deletes) the record
+            allowed.update(knowledge_id for knowledge_id in segment.metadata.resolve(filters)
+                           if not any(knowledge_id in later.records for later in newer))
+        return allowed
+
+    def score(self, query: str, allowed: Optional[Set[str]] = None) -> Dict[str, float]:
+        """BM25 scores of live chunks, with collection statistics over every segment"""
+        scores: Dict[str, float] = {}
+        for segment in self.segments:
+            scores.update(segment.lexical.score(query, allowed, self.deleted_chunks.get(segment.segment_id, _EMPTY),
+                                                self.corpus))
+        return scores
+
+    def search(self, query: Any, top_k: int, threshold: Optional[float] = None,
+               ids: Optional[Iterable[str]] = None) -> List[Tuple[str, float]]:
+        """Top-k (chunk id, similarity) pairs over the live vectors of every segment"""
+        if ids is not None and not isinstance(ids, (set, frozenset)):
+            ids = set(ids)
+        hits: List[Tuple[str, float]] = []
+        for segment in self.segments:
+            if not len(segment.vectors):
+                continue
+            deleted = self.deleted_vectors.get(segment.segment_id, _EMPTY)
+            # Over-fetch by the tombstone count so deletions cannot starve the top-k
+            found = segment.vectors.search(query, top_k + len(deleted), threshold, ids)
+            hits.extend((item_id, score) for item_id, score in found if item_id not in deleted)
+        return heapq.nlargest(top_k, hits, key=lambda hit: hit[1])
+
+    def live_chunks(self, segment: Segment) -> Iterable[str]:
+        deleted = self.deleted_chunks.get(segment.segment_id, _EMPTY)
+        return (chunk_id for chunk_id in segment.lexical.chunk_lengths if chunk_id not in deleted)
+
+    def live_vectors(self, segment: Segment) -> Tuple[List[str], np.ndarray]:
+        """Ids and normalized vectors of a segment without its tombstoned rows"""
+        ids = [str(item_id) for item_id in segment.vectors.ids]
+        vectors = segment.vectors.vectors
+        deleted = self.deleted_vectors.get(segment.segment_id, _EMPTY)
+        if deleted:
+            keep = [i for i, item_id in enumerate(ids) if item_id not in deleted]
+            ids, vectors = [ids[i] for i in keep], vectors[keep]
+        return ids, vectors
+
+class SegmentStore:
+    """Copy-on-write segmented lexical and vector index with snapshot reads.
+
+    Writers add to an open in-memory segment (the memtable) and tombstone
+    chunks of older segments; ``publish`` seals the open segment and
+    atomically replaces ``snapshot``, so a query never sees a half-applied
+    write and never waits for one. Writes are buffered: a write publishes
+    only once the memtable holds ``memtable_size`` items or its oldest
+    unpublished change is ``refresh_interval`` seconds old, and ``refresh``
+    publishes on demand (the knowledge base does so before each query
+    unless a writer holds the lock). Writers are serialized by ``lock``,
+    readers never wait for it. A background thread publishes buffered
+    writes when they come due and merges adjacent segments once there are
+    more than ``max_segments``, dropping tombstoned chunks and superseded
+    records, which keeps the per-query segment fan-out bounded.
+
+    ``lexical`` and ``vectors`` are drop-in stand-ins for ``InvertedIndex``
+    and the vector index, so the rest of the knowledge base is unchanged.
+    ``clock`` returns the writer's generation, recorded in each snapshot.
+    """
+
+    def __init__(self, records: Dict[str, Dict[str, Any]], vector_factory: Callable[[], Any],
+                 max_segments: int = 8, merge_factor: int = 4, background_merge: bool = True,
+                 k1: float = 1.5, b: float = 0.75, memtable_size: int = 1024, refresh_interval: float = 1.0,
+                 filter_fields: Iterable[str] = ('tags', 'category'), clock: Optional[Callable[[], int]] = None):
+        self.records = records
+        self.vector_factory = vector_factory
+        self.max_segments = max(max_segments, 1)
+        self.merge_factor = max(merge_factor, 2)
+        self.background_merge = background_merge
+        self.k1 = k1
+        self.b = b
+        self.memtable_size = max(memtable_size, 1)
+        self.refresh_interval = refresh_interval
+        self.filter_fields = list(filter_fields)
+        self.clock = clock or (lambda: 0)
+        self.lock = threading.RLock()
+        self.snapshot = IndexSnapshot()
+        self.merges = 0
+        self._next_id = 0
+        self._open = self._new_segment()
+        self._segments: Dict[int, Segment] = {}
+        # Writer-side routing: which segment holds the live copy of each chunk
+        self._chunk_segments: Dict[str, int] = {}
+        self._vector_segments: Dict[str, int] = {}
+        self._pending_chunk_deletes: Dict[int, Set[str]] = {}
+        self._pending_vector_deletes: Dict[int, Set[str]] = {}
+        self._dirty_records: Set[str] = set()
+        # When the oldest unpublished change was made, None when everything is published
+        self._pending_since: Optional[float] = None
+        self._depth = 0
+        self._merge_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._merger: Optional[threading.Thread] = None
+        self.lexical = SegmentedLexicalIndex(self)
+        self.vectors = SegmentedVectorIndex(self)
+
+    @classmethod
+    def from_indexes(cls, records: Dict[str, Dict[str, Any]], lexical: InvertedIndex, vectors: Any,
+                     vector_factory: Callable[[], Any], **options) -> 'SegmentStore':
+        """Wrap already built indexes (e.g. loaded from storage) as the first segment"""
+        store = cls(records, vector_factory, k1=lexical.k1, b=lexical.b, **options)
+        if records or len(lexical) or len(vectors):
+            base_records = {kid: dict(record) for kid, record in records.items()}
+            base = Segment(store._allocate_id(), lexical, vectors, base_records, store._index_records(base_records))
+            store._segments[base.segment_id] = base
+            store._chunk_segments = dict.fromkeys(lexical.chunk_lengths, base.segment_id)
+            store._vector_segments = dict.fromkeys((str(item_id) for item_id in vectors.ids), base.segment_id)
+            store.snapshot = IndexSnapshot((base,), generation=store.clock())
+        return store
+
+    def _index_records(self, records: Dict[str, Optional[Dict[str, Any]]]) -> Optional[MetadataIndex]:
+        """Filter index over the live records of a segment"""
+        if not any(record is not None for record in records.values()):
+            return None
+        index = MetadataIndex(self.filter_fields)
+        for knowledge_id, record in records.items():
+            if record is not None:
+                index.add(knowledge_id, record)
+        return index
+
+    def _allocate_id(self) -> int:
+        self._next_id += 1
+        return self._next_id
+
+    def _new_segment(self) -> Segment:
+        # Small initial capacity: most open segments hold a single document
+        return Segment(self._allocate_id(), InvertedIndex(self.k1, self.b), EmbeddingStore(initial_capacity=16))
+
+    # Writer side
+
+    @contextmanager
+    def writing(self):
+        """Hold the writer lock; the outermost block's changes are published together, when due"""
+        with self.lock:
+            self._depth += 1
+            try:
+                yield self
+            finally:
+                self._depth -= 1
+                if not self._depth:
+                    self._publish_if_due()
+
+    def _has_pending(self) -> bool:
+        return bool(len(self._open) or self._dirty_records or self._pending_chunk_deletes
+                    or self._pending_vector_deletes)
+
+    def _publish_if_due(self) -> None:
+        """Publish once the memtable is full or its oldest change is refresh_interval old"""
+        if not self._has_pending():
+            return
+        now = time.monotonic()
+        if self._pending_since is None:
+            self._pending_since = now
+        memtable = len(self._open.lexical) + len(self._open.vectors)
+        if memtable >= self.memtable_size or now - self._pending_since >= self.refresh_interval:
+            self.publish()
+        elif self.background_merge:
+            # The background thread publishes when the interval runs out
+            self._start_background()
+            self._wake.set()
+
+    def refresh(self, wait: bool = True) -> IndexSnapshot:
+        """Publish buffered writes and return the latest snapshot.
+
+        Without ``wait`` a writer holding the lock is not waited for: the
+        last published snapshot is returned instead.
+        """
+        if not self._has_pending():
+            return self.snapshot
+        if not self.lock.acquire(blocking=wait):
+            return self.snapshot
+        try:
+            # Inside this thread's own write block: never publish half of it
+            if self._depth or not self._has_pending():
+                return self.snapshot
+            return self.publish()
+        finally:
+            self.lock.release()
+
+    def record_changed(self, knowledge_id: str) -> None:
+        """Mark a record to be copied into the open segment at the next publish"""
+        with self.lock:
+            self._dirty_records.add(knowledge_id)
+
+    def _tombstone(self, routing: Dict[str, int], pending: Dict[int, Set[str]], item_id: str) -> Optional[int]:
+        """Retire the live copy of an item; returns its segment when that was a sealed one"""
+        segment_id = routing.pop(item_id, None)
+        if segment_id is None or segment_id == self._open.segment_id:
+            return None
+        pending.setdefault(segment_id, set()).add(item_id)
+        return segment_id
+
+    def add_chunk(self, chunk_id: str, text: str, term_counts: Optional[Dict[str, int]] = None) -> Set[str]:
+        with self.writing():
+            self._tombstone(self._chunk_segments, self._pending_chunk_deletes, chunk_id)
+            terms = self._open.lexical.add(chunk_id, text, term_counts)
+            self._chunk_segments[chunk_id] = self._open.segment_id
+            return terms
+
+    def remove_chunk(self, chunk_id: str, text: Optional[str] = None) -> Set[str]:
+        with self.writing():
+            if self._chunk_segments.get(chunk_id) == self._open.segment_id:
+                del self._chunk_segments[chunk_id]
+                return self._open.lexical.remove(chunk_id, text)
+            segment_id = self._tombstone(self._chunk_segments, self._pending_chunk_deletes, chunk_id)
+            if segment_id is None:
+                return set()
+            if text is not None:
+                return set(tokenize(text))
+            postings = self._segments[segment_id].lexical.postings
+            return {term for term, posting in postings.items() if chunk_id in posting}
+
+    def add_vectors(self, ids: Sequence[str], vectors: Any) -> None:
+        with self.writing():
+            for item_id in ids:
+                self._tombstone(self._vector_segments, self._pending_vector_deletes, item_id)
+            self._open.vectors.add(ids, vectors)
+            for item_id in ids:
+                self._vector_segments[item_id] = self._open.segment_id
+
+    def remove_vectors(self, ids: Sequence[str]) -> int:
+        removed = 0
+        with self.writing():
+            for item_id in ids:
+                if self._vector_segments.get(item_id) == self._open.segment_id:
+                    del self._vector_segments[item_id]
+                    removed += self._open.vectors.remove([item_id])
+                elif self._tombstone(self._vector_segments, self._pending_vector_deletes, item_id) is not None:
+                    removed += 1
+        return removed
+
+    def get_vector(self, item_id: str) -> Optional[np.ndarray]:
+        with self.lock:
+            segment_id = self._vector_segments.get(item_id)
+            if segment_id is None:
+                return None
+            segment = self._open if segment_id == self._open.segment_id else self._segments[segment_id]
+            return segment.vectors.get(item_id)
+
+    @staticmethod
+    def _apply_deletes(published: Dict[int, AbstractSet[str]],
+                       pending: Dict[int, Set[str]]) -> Dict[int, AbstractSet[str]]:
+        if not pending:
+            return published
+        deleted = dict(published)
+        for segment_id, item_ids in pending.items():
+            deleted[segment_id] = deleted.get(segment_id, _EMPTY) | item_ids
+        pending.clear()
+        return deleted
+
+    def publish(self) -> IndexSnapshot:
+        """Seal the open segment and swap in a snapshot that includes every write so far"""
+        with self.lock:
+            segment = self._open
+            for knowledge_id in self._dirty_records:
+                record = self.records.get(knowledge_id)
+                # A shallow copy: later in-place edits of the live record cannot leak into the snapshot
+                segment.records[knowledge_id] = dict(record) if record is not None else None
+            self._dirty_records.clear()
+            self._pending_since = None
+            current = self.snapshot
+            segments = current.segments
+            if len(segment):
+                segment.metadata = self._index_records(segment.records)
+                segment.vectors.shrink_to_fit()
+                segments = segments + (segment,)
+                self._segments[segment.segment_id] = segment
+                self._open = self._new_segment()
+            if segments is current.segments and not self._pending_chunk_deletes and not self._pending_vector_deletes:
+                return current
+            self.snapshot = IndexSnapshot(
+                segments,
+                self._apply_deletes(current.deleted_chunks, self._pending_chunk_deletes),
+                self._apply_deletes(current.deleted_vectors, self._pending_vector_deletes),
+                self.clock()
+            )
+        if len(segments) > self.max_segments:
+            self._request_merge()
+        return self.snapshot
+
+    # Merging
+
+    def _request_merge(self) -> None:
+        if not self.background_merge:
+            while self.merge():
+                pass
+            return
+        self._start_background()
+        self._wake.set()
+
+    def _start_background(self) -> None:
+        if self._closed:
+            return
+        if self._merger is None or not self._merger.is_alive():
+            self._merger = threading.Thread(target=self._background_loop, name='segment-merger', daemon=True)
+            self._merger.start()
+
+    def _refresh_delay(self) -> Optional[float]:
+        """Seconds until buffered writes are due, None when nothing is buffered"""
+        pending_since = self._pending_since
+        if pending_since is None:
+            return None
+        return max(0.0, pending_since + self.refresh_interval - time.monotonic())
+
+    def _background_loop(self) -> None:
+        while not self._closed:
+            self._wake.wait(self._refresh_delay())
+            self._wake.clear()
+            if self._closed:
+                break
+            try:
+                if self._refresh_delay() == 0.0:
+                    self.refresh()
+                while not self._closed and self.merge():
+                    pass
+            except Exception as e:
+                logger.error(f"Segment merge failed: {str(e)}")
+
+    def _pick_window(self, segments: Tuple[Segment, ...], force: bool) -> Optional[Tuple[int, int]]:
+        """Adjacent run of segments with the smallest total size, wide enough to get back under max_segments"""
+        if force:
+            return (0, len(segments)) if len(segments) > 1 else None
+        if len(segments) <= self.max_segments:
+            return None
+        width = min(len(segments), max(self.merge_factor, len(segments) - self.max_segments + 1))
+        sizes = [len(segment) for segment in segments]
+        total = sum(sizes[:width])
+        best, best_total = 0, total
+        for start in range(1, len(segments) - width + 1):
+            total += sizes[start + width - 1] - sizes[start - 1]
+            if total < best_total:
+                best, best_total = start, total
+        return best, best + width
+
+    def merge(self, force: bool = False) -> bool:
+        """Merge one window of segments into a new one; ``force`` merges everything.
+
+        The merged segment is built from a snapshot without holding the
+        writer lock; only the final swap takes it, carrying over tombstones
+        that writers added to the merged segments in the meantime.
+        """
+        with self._merge_lock:
+            base = self.snapshot
+            window = self._pick_window(base.segments, force)
+            if window is None:
+                return False
+            start, end = window
+            inputs = base.segments[start:end]
+            merged = self._build_merged(base, inputs, drop_deleted_records=start == 0)
+
+            with self.lock:
+                current = self.snapshot
+                input_ids = {segment.segment_id for segment in inputs}
+                merged_id = merged.segment_id
+                deleted_chunks = {k: v for k, v in current.deleted_chunks.items() if k not in input_ids}
+                deleted_vectors = {k: v for k, v in current.deleted_vectors.items() if k not in input_ids}
+                late_chunks: Set[str] = set()
+                late_vectors: Set[str] = set()
+                for segment_id in input_ids:
+                    late_chunks |= current.deleted_chunks.get(segment_id, _EMPTY) - base.deleted_chunks.get(segment_id, _EMPTY)
+                    late_vectors |= current.deleted_vectors.get(segment_id, _EMPTY) - base.deleted_vectors.get(segment_id, _EMPTY)
+                    pending = self._pending_chunk_deletes.pop(segment_id, None)
+                    if pending:
+                        self._pending_chunk_deletes.setdefault(merged_id, set()).update(pending)
+                    pending = self._pending_vector_deletes.pop(segment_id, None)
+                    if pending:
+                        self._pending_vector_deletes.setdefault(merged_id, set()).update(pending)
+                    del self._segments[segment_id]
+                if late_chunks:
+                    deleted_chunks[merged_id] = frozenset(late_chunks)
+                if late_vectors:
+                    deleted_vectors[merged_id] = frozenset(late_vectors)
+                for chunk_id in merged.lexical.chunk_lengths:
+                    if self._chunk_segments.get(chunk_id) in input_ids:
+                        self._chunk_segments[chunk_id] = merged_id
+                for item_id in merged.vectors.ids:
+                    if self._vector_segments.get(item_id) in input_ids:
+                        self._vector_segments[item_id] = merged_id
+                self._segments[merged_id] = merged
+                position = current.segments.index(inputs[0])
+                segments = current.segments[:position] + (merged,) + current.segments[position + len(inputs):]
+                self.snapshot = IndexSnapshot(segments, deleted_chunks, deleted_vectors, current.generation)
+                self.merges += 1
+        logger.debug(f"Merged {len(inputs)} segments into segment {merged_id}")
+        return True
+
+    def _build_merged(self, base: IndexSnapshot, inputs: Sequence[Segment], drop_deleted_records: bool) -> Segment:
+        """A new segment with the live chunks, vectors and newest records of ``inputs``"""
+        with self.lock:
+            segment_id = self._allocate_id()
+        lexical = self._merge_lexical(base, inputs)
+        ids: List[str] = []
+        blocks: List[np.ndarray] = []
+        for segment in inputs:
+            segment_ids, segment_vectors = base.live_vectors(segment)
+            if segment_ids:
+                ids.extend(segment_ids)
+                blocks.append(np.asarray(segment_vectors, dtype=np.float32))
+        if len(ids) < 16:
+            vectors = EmbeddingStore(initial_capacity=16)
+        else:
+            vectors = self.vector_factory()
+        if ids:
+            vectors.add(ids, np.concatenate(blocks))
+            if hasattr(vectors, 'shrink_to_fit'):
+                vectors.shrink_to_fit()
+        records: Dict[str, Optional[Dict[str, Any]]] = {}
+        for segment in inputs:
+            records.update(segment.records)
+        if drop_deleted_records:
+            # Nothing older can be shadowed, so deletion markers have done their job
+            records = {kid: record for kid, record in records.items() if record is not None}
+        return Segment(segment_id, lexical, vectors, records, self._index_records(records))
+
+    def _merge_lexical(self, base: IndexSnapshot, inputs: Sequence[Segment]) -> InvertedIndex:
+        """Union of the live postings of ``inputs``, without re-tokenizing any text"""
+        merged = InvertedIndex(self.k1, self.b)
+        postings = merged.postings
+        # Terms whose posting list was built here; the others are still shared with an input segment
+        owned: Set[str] = set()
+        for segment in inputs:
+            deleted = base.deleted_chunks.get(segment.segment_id, _EMPTY)
+            for term, posting in segment.lexical.postings.items():
+                fresh = False
+                if deleted and not deleted.isdisjoint(posting):
+                    posting = {chunk_id: frequency for chunk_id, frequency in posting.items() if chunk_id not in deleted}
+                    fresh = True
+                if not posting:
+                    continue
+                target = postings.get(term)
+                if target is None:
+                    # Published segments never change, so an input's posting list can be adopted as is
+                    postings[term] = posting
+                    if fresh:
+                        owned.add(term)
+                    continue
+                if term not in owned:
+                    target = postings[term] = dict(target)
+                    owned.add(term)
+                target.update(posting)
+            for chunk_id in base.live_chunks(segment):
+                length = segment.lexical.chunk_lengths[chunk_id]
+                merged.chunk_lengths[chunk_id] = length
+                merged.total_length += length
+        return merged
+
+    def compact(self) -> Dict[str, int]:
+        """Publish buffered writes and merge every segment into one, synchronously"""
+        self.refresh()
+        self.merge(force=True)
+        return self.stats()
+
+    def materialize_lexical(self) -> InvertedIndex:
+        """A plain inverted index over the live chunks, e.g. for a storage snapshot"""
+        snapshot = self.refresh()
+        return self._merge_lexical(snapshot, snapshot.segments)
+
+    def stats(self) -> Dict[str, int]:
+        snapshot = self.snapshot
+        return {
+            'segments': len(snapshot.segments),
+            'merges': self.merges,
+            'deleted_chunks': sum(len(ids) for ids in snapshot.deleted_chunks.values()),
+            'deleted_vectors': sum(len(ids) for ids in snapshot.deleted_vectors.values())
+        }
+
+    def close(self) -> None:
+        """Publish buffered writes and stop the background thread"""
+        self.refresh()
+        self._closed = True
+        self._wake.set()
+        if self._merger is not None:
+            self._merger.join()
+
+class SegmentedLexicalIndex:
+    """``InvertedIndex`` interface over a SegmentStore; reads use the latest snapshot"""
+
+    def __init__(self, store: SegmentStore):
+        self.store = store
+
+    @property
+    def k1(self) -> float:
+        return self.store.k1
+
+    @property
+    def b(self) -> float:
+        return self.store.b
+
+    def __len__(self) -> int:
+        return len(self.store._chunk_segments)
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self.store._chunk_segments
+
+    @property
+    def total_length(self) -> int:
+        """Indexed terms across segments, tombstoned chunks included until merged"""
+        return sum(segment.lexical.total_length for segment in self.store.refresh().segments)
+
+    def add(self, chunk_id: str, text: str, term_counts: Optional[Dict[str, int]] = None) -> Set[str]:
+        return self.store.add_chunk(chunk_id, text, term_counts)
+
+    def remove(self, chunk_id: str, text: Optional[str] = None) -> Set[str]:
+        return self.store.remove_chunk(chunk_id, text)
+
+    def score(self, query: str, allowed: Optional[Set[str]] = None) -> Dict[str, float]:
+        return self.store.refresh(wait=False).score(query, allowed)
+
+    def search(self, query: str, top_k: int, allowed: Optional[Set[str]] = None) -> List[Tuple[str, float]]:
+        return heapq.nlargest(top_k, self.score(query, allowed).items(), key=lambda item: item[1])
+
+    def materialize(self) -> InvertedIndex:
+        return self.store.materialize_lexical()
+
+class SegmentedVectorIndex:
+    """Vector index interface over a SegmentStore; reads use the latest snapshot"""
+
+    def __init__(self, store: SegmentStore):
+        self.store = store
+
+    def __len__(self) -> int:
+        return len(self.store._vector_segments)
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self.store._vector_segments
+
+    @property
+    def dim(self) -> Optional[int]:
+        for segment in self.store.refresh().segments:
+            if getattr(segment.vectors, 'dim', None):
+                return segment.vectors.dim
+        return None
+
+    def _live(self) -> Tuple[List[str], List[np.ndarray]]:
+        snapshot = self.store.refresh()
+        ids: List[str] = []
+        blocks: List[np.ndarray] = []
+        for segment in snapshot.segments:
+            segment_ids, vectors = snapshot.live_vectors(segment)
+            if segment_ids:
+                ids.extend(segment_ids)
+                blocks.append(np.asarray(vectors, dtype=np.float32))
+        return ids, blocks
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """Live normalized vectors, segment by segment"""
+        _, blocks = self._live()
+        return np.concatenate(blocks) if blocks else np.empty((0, self.dim or 0), dtype=np.float32)
+
+    @property
+    def ids(self) -> np.ndarray:
+        """Item ids aligned with ``vectors``"""
+        ids, _ = self._live()
+        return np.array(ids, dtype=object)
+
+    def add(self, ids: Sequence[str], vectors: Any) -> None:
+        self.store.add_vectors(ids, vectors)
+
+    def remove(self, ids: Sequence[str]) -> int:
+        return self.store.remove_vectors(ids)
+
+    def get(self, item_id: str) -> Optional[np.ndarray]:
+        return self.store.get_vector(item_id)
+
+    def search(self, query: Any, top_k: int, threshold: Optional[float] = None,
+               ids: Optional[Iterable[str]] = None) -> List[Tuple[str, float]]:
+        return self.store.refresh(wait=False).search(query, top_k, threshold, ids)
+
+    def as_dict(self) -> Dict[str, List[float]]:
+        ids, blocks = self._live()
+        vectors = np.concatenate(blocks) if blocks else []
+        return {item_id: vector.tolist() for item_id, vector in zip(ids, vectors)}
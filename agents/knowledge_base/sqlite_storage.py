@@ -0,0 +1,351 @@
+from typing import Dict, Any, Iterable, List, Optional, Set, Tuple
+from contextlib import contextmanager
+from itertools import chain, repeat
+import json
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+import numpy as np
+from .utils import make_chunk_id, split_chunk_id, tokenize
+
+logger = logging.getLogger(__name__)
+
+# Terms are indexed pre-tokenized and space separated, so FTS5 only has to split on spaces
+# and never re-segments CJK bigrams; '_' is a word character for ``tokenize`` too
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS knowledge (
+    knowledge_id TEXT PRIMARY KEY,
+    content TEXT NOT NULL,
+    metadata TEXT NOT NULL,
+    source TEXT,
+    timestamp TEXT,
+    updated_at TEXT,
+    versions TEXT,
+    chunk_spans BLOB NOT NULL,
+    chunk_hashes TEXT NOT NULL,
+    chunk_tokens BLOB
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY,
+    chunk_id TEXT NOT NULL UNIQUE,
+    knowledge_id TEXT NOT NULL,
+    vector BLOB
+);
+CREATE INDEX IF NOT EXISTS chunks_knowledge ON chunks (knowledge_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+    terms, tokenize = "unicode61 remove_diacritics 0 tokenchars '_'"
+);
+CREATE TABLE IF NOT EXISTS backup_dirty (knowledge_id TEXT PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT);
+CREATE TEMP TABLE IF NOT EXISTS allowed_chunks (chunk_id TEXT PRIMARY KEY) WITHOUT ROWID;
+"""
+
+_UPSERT_KNOWLEDGE = (
+    "INSERT OR REPLACE INTO knowledge (knowledge_id, content, metadata, source, timestamp, updated_at, versions, "
+    "chunk_spans, chunk_hashes, chunk_tokens) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+_UPDATE_VECTOR = "UPDATE chunks SET vector = ? WHERE chunk_id = ?"
+
+# Lexical queries; the _ALLOWED variants join the temp table holding a filtered query's chunk ids
+_MATCHES = "FROM chunks_fts JOIN chunks ON chunks.id = chunks_fts.rowid "
+_ALLOWED_JOIN = "JOIN temp.allowed_chunks AS allowed ON allowed.chunk_id = chunks.chunk_id "
+_SCORE = "SELECT chunks.chunk_id, chunks_fts.rank " + _MATCHES + "WHERE chunks_fts MATCH ?"
+_SCORE_ALLOWED = "SELECT chunks.chunk_id, chunks_fts.rank " + _MATCHES + _ALLOWED_JOIN + "WHERE chunks_fts MATCH ?"
+_TOP_CHUNKS = _SCORE + " ORDER BY chunks_fts.rank LIMIT ?"
+_TOP_CHUNKS_ALLOWED = _SCORE_ALLOWED + " ORDER BY chunks_fts.rank LIMIT ?"
+# Best chunk per entry: SQLite takes the bare chunk_id from the row holding the MIN()
+_TOP_KNOWLEDGE = ("SELECT chunks.knowledge_id, chunks.chunk_id, MIN(chunks_fts.rank) " + _MATCHES
+                  + "WHERE chunks_fts MATCH ? GROUP BY chunks.knowledge_id ORDER BY 3 LIMIT ?")
+_TOP_KNOWLEDGE_ALLOWED = ("SELECT chunks.knowledge_id, chunks.chunk_id, MIN(chunks_fts.rank) " + _MATCHES
+                          + _ALLOWED_JOIN + "WHERE chunks_fts MATCH ? GROUP BY chunks.knowledge_id ORDER BY 3 LIMIT ?")
+
+def _match_expression(query: str) -> Optional[str]:
+    """FTS5 query matching any of the query's terms, each quoted as a literal"""
+    terms = dict.fromkeys(tokenize(query))
+    if not terms:
+        return None
+    return ' OR '.join('"' + term.replace('"', '""') + '"' for term in terms)
+
+class SQLiteLexicalIndex:
+    """``InvertedIndex`` interface over the FTS5 table of a SQLiteStorage.
+
+    Scores come from FTS5's built-in ``bm25()`` (k1 = 1.2, b = 0.75), so
+    they differ slightly from the in-memory index. Writes join the storage's
+    open transaction and become durable when the operation is logged.
+    Ranking, ``LIMIT`` and the ``allowed`` restriction of filtered queries
+    all run inside SQLite, so only the returned rows reach Python.
+    """
+
+    def __init__(self, storage: 'SQLiteStorage'):
+        self.storage = storage
+
+    def __len__(self) -> int:
+        with self.storage.lock:
+            return self.storage.connection.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def __contains__(self, chunk_id: str) -> bool:
+        with self.storage.lock:
+            return self.storage.connection.execute(
+                "SELECT 1 FROM chunks WHERE chunk_id = ?", (chunk_id,)).fetchone() is not None
+
+    def add(self, chunk_id: str, text: str, term_counts: Optional[Dict[str, int]] = None) -> Set[str]:
+        if term_counts is None:
+            terms = tokenize(text)
+        else:
+            terms = list(chain.from_iterable(repeat(term, count) for term, count in term_counts.items()))
+        connection = self.storage.connection
+        with self.storage.lock:
+            row = connection.execute("SELECT id FROM chunks WHERE chunk_id = ?", (chunk_id,)).fetchone()
+            if row is None:
+                row_id = connection.execute("INSERT INTO chunks (chunk_id, knowledge_id) VALUES (?, ?)",
+                                            (chunk_id, split_chunk_id(chunk_id)[0])).lastrowid
+            else:
+                row_id = row[0]
+                connection.execute("DELETE FROM chunks_fts WHERE rowid = ?", (row_id,))
+            connection.execute("INSERT INTO chunks_fts (rowid, terms) VALUES (?, ?)", (row_id, ' '.join(terms)))
+        return set(terms)
+
+    def remove(self, chunk_id: str, text: Optional[str] = None) -> Set[str]:
+        connection = self.storage.connection
+        with self.storage.lock:
+            row = connection.execute("SELECT id FROM chunks WHERE chunk_id = ?", (chunk_id,)).fetchone()
+            if row is None:
+                return set()
+            if text is None:
+                indexed = connection.execute("SELECT terms FROM chunks_fts WHERE rowid = ?", (row[0],)).fetchone()
+                text = indexed[0] if indexed else ''
+            connection.execute("DELETE FROM chunks_fts WHERE rowid = ?", (row[0],))
+            connection.execute("DELETE FROM chunks WHERE id = ?", (row[0],))
+        return set(tokenize(text))
+
+    @contextmanager
+    def _query(self, allowed: Optional[Set[str]]):
+        """Hold the storage lock, with ``allowed`` loaded into the allowed_chunks temp table"""
+        connection = self.storage.connection
+        with self.storage.lock:
+            if allowed is None:
+                yield connection
+                return
+            # Filling the temp table opens a transaction when none is; only close one opened here
+            opened = not connection.in_transaction
+            connection.executemany("INSERT OR IGNORE INTO temp.allowed_chunks (chunk_id) VALUES (?)",
+                                   ((chunk_id,) for chunk_id in allowed))
+            try:
+                yield connection
+            finally:
+                connection.execute("DELETE FROM temp.allowed_chunks")
+                if opened:
+                    connection.commit()
+
+    def score(self, query: str, allowed: Optional[Set[str]] = None) -> Dict[str, float]:
+        """FTS5 BM25 score of every chunk matching any query term, higher is better"""
+        expression = _match_expression(query)
+        if expression is None or (allowed is not None and not allowed):
+            return {}
+        with self._query(allowed) as connection:
+            rows = connection.execute(_SCORE if allowed is None else _SCORE_ALLOWED, (expression,)).fetchall()
+        # bm25() ranks are negated so that better matches score higher, as with InvertedIndex
+        return {chunk_id: -score for chunk_id, score in rows}
+
+    def search(self, query: str, top_k: int, allowed: Optional[Set[str]] = None) -> List[Tuple[str, float]]:
+        """Return up to ``top_k`` (chunk_id, BM25 score) pairs, best first"""
+        expression = _match_expression(query)
+        if expression is None or top_k <= 0 or (allowed is not None and not allowed):
+            return []
+        with self._query(allowed) as connection:
+            rows = connection.execute(_TOP_CHUNKS if allowed is None else _TOP_CHUNKS_ALLOWED,
+                                      (expression, top_k)).fetchall()
+        return [(chunk_id, -score) for chunk_id, score in rows]
+
+    def search_knowledge(self, query: str, top_k: int,
+                         allowed: Optional[Set[str]] = None) -> List[Tuple[str, float, str]]:
+        """Up to ``top_k`` (knowledge_id, BM25 score, chunk_id) of the entries with the best chunks, best first"""
+        expression = _match_expression(query)
+        if expression is None or top_k <= 0 or (allowed is not None and not allowed):
+            return []
+        with self._query(allowed) as connection:
+            rows = connection.execute(_TOP_KNOWLEDGE if allowed is None else _TOP_KNOWLEDGE_ALLOWED,
+                                      (expression, top_k)).fetchall()
+        return [(knowledge_id, -score, chunk_id) for knowledge_id, chunk_id, score in rows]
+
+class SQLiteStorage:
+    """Knowledge store in a single SQLite database, lexical search through FTS5.
+
+    Tables::
+
+        knowledge      one row per entry; metadata/versions as JSON, spans and token counts as int arrays
+        chunks         chunk ids of every entry with the normalized float32 embedding as a BLOB
+        chunks_fts     FTS5 index of each chunk's terms, keyed by the chunks rowid
+        backup_dirty   entries changed since the last incremental backup
+        settings       backup chain id
+
+    The database runs in WAL mode, so other processes can read it while
+    this one writes. Every logged operation rewrites its entry's row and
+    vectors and commits; inside ``batch`` commits are grouped every
+    ``checkpoint_interval`` operations. Statements are constant SQL strings,
+    compiled once and reused from sqlite3's statement cache.
+    """
+
+    def __init__(self, path: str, checkpoint_interval: int = 1000):
+        self.path = Path(path)
+        if self.path.suffix == '':
+            # A directory, like the mmap backend's path
+            self.path.mkdir(parents=True, exist_ok=True)
+            self.path = self.path / 'knowledge.db'
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.checkpoint_interval = checkpoint_interval
+        self.generation = 0
+        self.pending_operations = 0
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        self.connection.executescript(_SCHEMA)
+        self._knowledge_base = None
+        self._batch_depth = 0
+
+    def load(self, knowledge_base) -> int:
+        """Load every entry and vector into a knowledge base and route its lexical index to FTS5"""
+        self._knowledge_base = knowledge_base
+        knowledge_base.lexical_index = SQLiteLexicalIndex(self)
+        with self.lock:
+            for row in self.connection.execute("SELECT * FROM knowledge"):
+                knowledge_id, knowledge = self._decode_record(row)
+                knowledge_base.knowledge_store[knowledge_id] = knowledge
+                knowledge_base.metadata_index.add(knowledge_id, knowledge)
+            ids: List[str] = []
+            blobs: List[bytes] = []
+            for chunk_id, blob in self.connection.execute(
+                    "SELECT chunk_id, vector FROM chunks WHERE vector IS NOT NULL ORDER BY id"):
+                ids.append(chunk_id)
+                blobs.append(blob)
+            chain_row = self.connection.execute("SELECT value FROM settings WHERE key = 'backup_chain'").fetchone()
+            knowledge_base._backup_chain = chain_row[0] if chain_row else None
+            knowledge_base._backup_dirty = {row[0] for row in self.connection.execute("SELECT knowledge_id FROM backup_dirty")}
+        if ids:
+            vectors = np.frombuffer(b''.join(blobs), dtype=np.float32).reshape(len(ids), -1)
+            knowledge_base.embeddings.attach(ids, vectors.copy())
+        if knowledge_base.dedup is not None:
+            for knowledge_id in knowledge_base.knowledge_store:
+                knowledge_base.dedup.add(knowledge_id, knowledge_base.dedup.signature(
+                    knowledge_base._chunk_map(knowledge_id).values()))
+        logger.info(f"Loaded {len(knowledge_base.knowledge_store)} knowledge entries from {self.path}")
+        return 0
+
+    @staticmethod
+    def _decode_record(row: Tuple) -> Tuple[str, Dict[str, Any]]:
+        (knowledge_id, content, metadata, source, timestamp, updated_at, versions,
+         chunk_spans, chunk_hashes, chunk_tokens) = row
+        knowledge = {
+            'content': content,
+            'metadata': json.loads(metadata),
+            'source': source,
+            'chunk_spans': np.frombuffer(chunk_spans, dtype=np.int64).reshape(-1, 2).copy(),
+            'chunk_hashes': json.loads(chunk_hashes),
+            'chunk_tokens': np.frombuffer(chunk_tokens, dtype=np.int32).copy() if chunk_tokens is not None else None,
+            'timestamp': timestamp
+        }
+        if updated_at is not None:
+            knowledge['updated_at'] = updated_at
+        if versions is not None:
+            knowledge['versions'] = json.loads(versions)
+        return knowledge_id, knowledge
+
+    @staticmethod
+    def _encode_record(knowledge_id: str, knowledge: Dict[str, Any]) -> Tuple:
+        chunk_tokens = knowledge.get('chunk_tokens')
+        return (
+            knowledge_id,
+            knowledge['content'],
+            json.dumps(knowledge['metadata'], ensure_ascii=False),
+            knowledge['source'],
+            knowledge.get('timestamp'),
+            knowledge.get('updated_at'),
+            json.dumps(knowledge['versions'], ensure_ascii=False) if 'versions' in knowledge else None,
+            np.ascontiguousarray(knowledge['chunk_spans'], dtype=np.int64).tobytes(),
+            json.dumps(list(knowledge['chunk_hashes'])),
+            np.asarray(chunk_tokens, dtype=np.int32).tobytes() if chunk_tokens is not None else None
+        )
+
+    def _write_entries(self, knowledge_ids: Iterable[str]) -> None:
+        """Rewrite the rows and chunk vectors of entries from the in-memory state, deleting absent ones"""
+        knowledge_base = self._knowledge_base
+        records, deleted, vectors = [], [], []
+        for knowledge_id in knowledge_ids:
+            knowledge = knowledge_base.knowledge_store.get(knowledge_id)
+            if knowledge is None:
+                deleted.append((knowledge_id,))
+                continue
+            records.append(self._encode_record(knowledge_id, knowledge))
+            for chunk_hash in set(knowledge['chunk_hashes']):
+                chunk_id = make_chunk_id(knowledge_id, chunk_hash)
+                vector = knowledge_base.embeddings.get(chunk_id)
+                if vector is not None:
+                    vectors.append((np.asarray(vector, dtype=np.float32).tobytes(), chunk_id))
+        connection = self.connection
+        connection.executemany("DELETE FROM knowledge WHERE knowledge_id = ?", deleted)
+        connection.executemany(_UPSERT_KNOWLEDGE, records)
+        connection.executemany(_UPDATE_VECTOR, vectors)
+
+    def append(self, operation: str, knowledge_id: str, data: Optional[Dict[str, Any]] = None) -> None:
+        """Persist the entry an operation touched and commit, unless a batch defers the commit"""
+        with self.lock:
+            if operation == 'backup':
+                self.connection.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('backup_chain', ?)",
+                                        (data['chain_id'],))
+                self.connection.execute("DELETE FROM backup_dirty")
+            else:
+                self._write_entries([knowledge_id])
+                self.connection.execute("INSERT OR IGNORE INTO backup_dirty (knowledge_id) VALUES (?)", (knowledge_id,))
+            self.pending_operations += 1
+            if not self._batch_depth or self.pending_operations >= self.checkpoint_interval:
+                self.connection.commit()
+                self.pending_operations = 0
+
+    @contextmanager
+    def batch(self):
+        """Group the commits of many operations, e.g. a bulk ingest"""
+        with self.lock:
+            self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self.lock:
+                self._batch_depth -= 1
+                if not self._batch_depth:
+                    self.connection.commit()
+                    self.pending_operations = 0
+
+    def should_checkpoint(self) -> bool:
+        # Every operation is already durable in the database
+        return False
+
+    def checkpoint(self, knowledge_base) -> int:
+        """Rewrite every entry from memory, e.g. after a restore, and fold the WAL into the database"""
+        self._knowledge_base = knowledge_base
+        with self.lock:
+            stored = {row[0] for row in self.connection.execute("SELECT knowledge_id FROM knowledge")}
+            self._write_entries(chain(knowledge_base.knowledge_store, stored - set(knowledge_base.knowledge_store)))
+            self.connection.execute("DELETE FROM backup_dirty")
+            self.connection.executemany("INSERT INTO backup_dirty (knowledge_id) VALUES (?)",
+                                        [(knowledge_id,) for knowledge_id in knowledge_base._backup_dirty])
+            if knowledge_base._backup_chain is not None:
+                self.connection.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('backup_chain', ?)",
+                                        (knowledge_base._backup_chain,))
+            else:
+                self.connection.execute("DELETE FROM settings WHERE key = 'backup_chain'")
+            self.connection.commit()
+            self.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self.pending_operations = 0
+            self.generation += 1
+        logger.info(f"Checkpointed knowledge database {self.path}")
+        return self.generation
+
+    def close(self) -> None:
+        with self.lock:
+            if self.connection is not None:
+                self.connection.commit()
+                self.connection.close()
+                self.connection = None
@@ -0,0 +1,93 @@
+from typing import Dict, Any, List, Optional, Tuple
+import importlib.util
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+class TokenCounter:
+    """Base class for local tokenizers used to budget chunks in model tokens.
+
+    ``token_spans`` returns the (start, end) character offsets of each token,
+    which lets the chunker cut text exactly on token boundaries.
+    Implementations must be picklable: chunking runs in worker processes.
+    """
+
+    name = 'base'
+
+    def token_spans(self, text: str) -> List[Tuple[int, int]]:
+        raise NotImplementedError
+
+    def count(self, text: str) -> int:
+        return len(self.token_spans(text))
+
+class RegexTokenCounter(TokenCounter):
+    """Offline approximation of a BPE tokenizer such as cl100k.
+
+    Every CJK character counts as one token, Latin words as one token per
+    four letters, numbers per three digits, and each other non-space
+    character as its own token.
+    """
+
+    name = 'regex'
+    PATTERN = re.compile(
+        r"[A-Za-z]{1,4}|[0-9]{1,3}"
+        r"|[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]"
+        r"|[^\sA-Za-z0-9]"
+    )
+
+    def token_spans(self, text: str) -> List[Tuple[int, int]]:
+        return [match.span() for match in self.PATTERN.finditer(text)]
+
+    def count(self, text: str) -> int:
+        return sum(1 for _ in self.PATTERN.finditer(text))
+
+class TiktokenCounter(TokenCounter):
+    """Exact counts for OpenAI models via the optional ``tiktoken`` package"""
+
+    name = 'tiktoken'
+
+    def __init__(self, encoding_name: str = 'cl100k_base'):
+        self.encoding_name = encoding_name
+        self._encoding = None
+
+    @property
+    def encoding(self):
+        if self._encoding is None:
+            try:
+                import tiktoken
+            except ImportError as e:
+                raise ImportError("The 'tiktoken' tokenizer requires the tiktoken package") from e
+            self._encoding = tiktoken.get_encoding(self.encoding_name)
+        return self._encoding
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Encodings are rebuilt in each worker process rather than pickled
+        return {'encoding_name': self.encoding_name, '_encoding': None}
+
+    def token_spans(self, text: str) -> List[Tuple[int, int]]:
+        tokens = self.encoding.encode(text, disallowed_special=())
+        decoded, offsets = self.encoding.decode_with_offsets(tokens)
+        if decoded != text:
+            # Tokens splitting a multi-byte character; fall back to proportional offsets
+            offsets = [len(text) * i // len(tokens) for i in range(len(tokens))]
+        ends = offsets[1:] + [len(text)]
+        return list(zip(offsets, ends))
+
+    def count(self, text: str) -> int:
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+TOKENIZERS = {
+    'regex': RegexTokenCounter,
+    'tiktoken': TiktokenCounter,
+}
+
+def create_token_counter(spec: Optional[str] = None) -> TokenCounter:
+    """Build a tokenizer from a spec such as 'regex' or 'tiktoken:cl100k_base'"""
+    name, _, argument = (spec or 'regex').partition(':')
+    if name not in TOKENIZERS:
+        raise ValueError(f"Unknown tokenizer: {name}")
+    if name == 'tiktoken' and importlib.util.find_spec('tiktoken') is None:
+        logger.warning("tiktoken is not installed, estimating token counts with the regex tokenizer")
+        return RegexTokenCounter()
+    return TOKENIZERS[name](argument) if argument else TOKENIZERS[name]()
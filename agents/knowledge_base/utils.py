@@ -1,9 +1,19 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+import bisect
+import hashlib
 import logging
+import re
+import threading
+import time
+import unicodedata
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+CJK_CHARACTERS = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+# Runs of CJK ideographs, kana and hangul (group 1), or words of any other script
+TOKEN_PATTERN = re.compile(rf"([{CJK_CHARACTERS}]+)|[^\W{CJK_CHARACTERS}]+")
+
 def validate_knowledge_input(data: Dict[str, Any]) -> bool:
     """Validate knowledge input data format"""
     required_fields = ['content', 'metadata', 'source']
@@ -17,21 +27,123 @@ def validate_knowledge_input(data: Dict[str, Any]) -> bool:
         logger.error(f"Error validating knowledge input: {str(e)}")
         return False
 
+# Places a chunk may end at: right after a blank line, or after sentence punctuation
+BOUNDARY_PATTERNS = {
+    'paragraph': re.compile(r"\n\s*\n"),
+    'sentence': re.compile(r"[.!?;。！？；]+[\"')\]」』”’]*\s*|\n"),
+}
+
+def iter_chunk_spans(text: str, chunk_size: int = 1000, overlap: int = 200,
+                     boundary: Optional[str] = None) -> Iterator[Tuple[int, int]]:
+    """Yield (start, end) offsets of overlapping chunks without copying text.
+
+    With ``boundary`` set to 'sentence' or 'paragraph', a chunk end is pulled
+    back to the last such boundary in the second half of the window.
+    """
+    if overlap >= chunk_size:
+        raise ValueError("Chunk overlap must be smaller than chunk size")
+    length = len(text)
+    if length <= chunk_size:
+        yield 0, length
+        return
+    pattern = BOUNDARY_PATTERNS[boundary] if boundary else None
+
+    start = 0
+    while True:
+        end = min(start + chunk_size, length)
+        if pattern is not None and end < length:
+            last = None
+            for last in pattern.finditer(text, start + chunk_size // 2, end):
+                pass
+            if last is not None:
+                end = last.end()
+        yield start, end
+        if end >= length:
+            return
+        start = max(end - overlap, start + 1)
+
+def iter_token_chunk_spans(text: str, token_spans: List[Tuple[int, int]], max_tokens: int = 512,
+                           overlap_tokens: int = 64, boundary: Optional[str] = None) -> Iterator[Tuple[int, int, int]]:
+    """Yield (start, end, token_count) of overlapping chunks holding at most ``max_tokens`` tokens.
+
+    ``token_spans`` are the character offsets of the text's tokens. Chunks
+    end on a token boundary; with ``boundary`` the end is pulled back to the
+    last sentence/paragraph boundary in the second half of the window.
+    """
+    if overlap_tokens >= max_tokens:
+        raise ValueError("Chunk overlap must be smaller than chunk size")
+    total = len(token_spans)
+    if total <= max_tokens:
+        yield 0, len(text), total
+        return
+    pattern = BOUNDARY_PATTERNS[boundary] if boundary else None
+    ends = [end for _, end in token_spans]
+
+    first, start = 0, 0
+    while True:
+        last_token = min(first + max_tokens, total)
+        if pattern is not None and last_token < total:
+            last = None
+            for last in pattern.finditer(text, token_spans[first + max_tokens // 2][0], ends[last_token - 1]):
+                pass
+            if last is not None:
+                last_token = max(bisect.bisect_right(ends, last.end()), first + 1)
+        end = len(text) if last_token >= total else ends[last_token - 1]
+        yield start, end, last_token - first
+        if last_token >= total:
+            return
+        first = max(last_token - overlap_tokens, first + 1)
+        start = token_spans[first][0]
+
 def process_chunk(text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
     """Process text into overlapping chunks for embedding"""
-    chunks = []
-    if len(text) <= chunk_size:
-        return [text]
-        
-    start = 0
-    while start < len(text):
-        end = start + chunk_size
-        if end > len(text):
-            end = len(text)
-        chunk = text[start:end]
-        chunks.append(chunk)
-        start = end - overlap
-    return chunks
+    return [text[start:end] for start, end in iter_chunk_spans(text, chunk_size, overlap)]
+
+def tokenize(text: str) -> List[str]:
+    """Split text into index terms: lowercase words in any script plus CJK character bigrams"""
+    if not text.isascii():
+        # Composed and decomposed accents ("café") must yield the same term
+        text = unicodedata.normalize('NFC', text)
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        token = match.group()
+        if match.group(1) is None or len(token) == 1:
+            tokens.append(token)
+        else:
+            tokens.extend(token[i:i + 2] for i in range(len(token) - 1))
+    return tokens
+
+_id_lock = threading.Lock()
+_last_id_micros = 0
+
+def generate_knowledge_id() -> str:
+    """Generate a unique, monotonically increasing knowledge id.
+
+    Ids keep the ``k_<unix timestamp>`` shape, but the microsecond value is
+    bumped past the previous id when the clock has not advanced.
+    """
+    global _last_id_micros
+    with _id_lock:
+        micros = max(time.time_ns() // 1000, _last_id_micros + 1)
+        _last_id_micros = micros
+    return f"k_{micros // 1_000_000}.{micros % 1_000_000:06d}"
+
+def normalize_query(query: str) -> str:
+    """Canonical form of a query for cache keys"""
+    return ' '.join(query.lower().split())
+
+def hash_chunk(text: str) -> str:
+    """Content hash identifying a chunk within its document"""
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=8).hexdigest()
+
+def make_chunk_id(knowledge_id: str, chunk_hash: str) -> str:
+    """Build the id under which a chunk is indexed"""
+    return f"{knowledge_id}#{chunk_hash}"
+
+def split_chunk_id(chunk_id: str) -> Tuple[str, str]:
+    """Split a chunk id back into its knowledge id and chunk hash"""
+    knowledge_id, _, chunk_hash = chunk_id.rpartition('#')
+    return knowledge_id, chunk_hash
 
 def calculate_similarity(vec1: List[float], vec2: List[float]) -> float:
     """Calculate cosine similarity between two vectors"""
@@ -0,0 +1,229 @@
+from typing import Dict, Any, Iterable, List, Optional, Sequence, Tuple
+import heapq
+import logging
+import numpy as np
+from .vector_store import EmbeddingStore, normalize_rows
+from .quantization import QuantizedIndex
+
+logger = logging.getLogger(__name__)
+
+class FlatIndex(EmbeddingStore):
+    """Exact index: every query scores the full embedding matrix"""
+
+class IVFIndex:
+    """Inverted-file index with a spherical k-means coarse quantizer.
+
+    Vectors are bucketed by their nearest centroid, each bucket being its own
+    contiguous ``EmbeddingStore``; a query only scores the buckets of its
+    ``nprobe`` closest centroids. Raising ``nprobe`` trades latency for
+    recall (``nprobe == nlist`` is exact). Until enough vectors exist to
+    train the quantizer, everything lives in one exact staging store.
+    """
+
+    def __init__(self, dim: Optional[int] = None, nlist: int = 256, nprobe: int = 8,
+                 train_iterations: int = 10, min_train_size: Optional[int] = None, seed: int = 0):
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_iterations = train_iterations
+        self.min_train_size = min_train_size if min_train_size is not None else nlist * 39
+        self.centroids: Optional[np.ndarray] = None
+        self._staging = EmbeddingStore(dim)
+        self._lists: List[EmbeddingStore] = []
+        self._assignments: Dict[str, int] = {}
+        self._rng = np.random.default_rng(seed)
+
+    def __len__(self) -> int:
+        return len(self._assignments) if self.is_trained else len(self._staging)
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self._assignments if self.is_trained else item_id in self._staging
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """Normalized embedding rows, concatenated bucket by bucket"""
+        if not self.is_trained:
+            return self._staging.vectors
+        return np.concatenate([bucket.vectors for bucket in self._lists if len(bucket)] or [self._staging.vectors])
+
+    @property
+    def ids(self) -> np.ndarray:
+        """Item ids aligned with ``vectors``"""
+        if not self.is_trained:
+            return self._staging.ids
+        return np.concatenate([bucket.ids for bucket in self._lists if len(bucket)] or [self._staging.ids])
+
+    def _nearest_centroids(self, vectors: np.ndarray, batch_size: int = 8192) -> np.ndarray:
+        """Index of the closest centroid for each (normalized) row"""
+        labels = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), batch_size):
+            labels[start:start + batch_size] = np.argmax(vectors[start:start + batch_size] @ self.centroids.T, axis=1)
+        return labels
+
+    def train(self, sample_size: Optional[int] = None) -> None:
+        """Fit the coarse quantizer on the stored vectors and rebuild the buckets"""
+        if len(self) < self.nlist:
+            raise ValueError(f"Need at least {self.nlist} vectors to train, have {len(self)}")
+        ids, vectors = self.ids, self.vectors
+        sample_size = sample_size or self.nlist * 256
+        if len(vectors) > sample_size:
+            sample = vectors[self._rng.choice(len(vectors), sample_size, replace=False)]
+        else:
+            sample = vectors
+        self.centroids = sample[self._rng.choice(len(sample), self.nlist, replace=False)].copy()
+        for _ in range(self.train_iterations):
+            labels = self._nearest_centroids(sample)
+            sums = np.zeros_like(self.centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=self.nlist)
+            empty = np.flatnonzero(counts == 0)
+            if len(empty):
+                sums[empty] = sample[self._rng.choice(len(sample), len(empty), replace=False)]
+            self.centroids = normalize_rows(sums)
+
+        self._lists = [EmbeddingStore(self.dim, initial_capacity=16) for _ in range(self.nlist)]
+        self._assignments = {}
+        self._staging = EmbeddingStore(self.dim)
+        self._assign(list(ids), vectors)
+        logger.info(f"Trained IVF index with {self.nlist} lists on {len(sample)} vectors")
+
+    def _assign(self, ids: Sequence[str], vectors: np.ndarray) -> None:
+        """Place vectors into the bucket of their nearest centroid"""
+        labels = self._nearest_centroids(vectors)
+        for label in np.unique(labels):
+            members = np.flatnonzero(labels == label)
+            bucket_ids = [ids[i] for i in members]
+            self._lists[label].add(bucket_ids, vectors[members])
+            for item_id in bucket_ids:
+                self._assignments[item_id] = int(label)
+
+    def add(self, ids: Sequence[str], vectors: Any) -> None:
+        """Insert or overwrite embeddings for the given ids"""
+        if not self.is_trained:
+            self._staging.add(ids, vectors)
+            self.dim = self._staging.dim
+            if len(self._staging) >= max(self.min_train_size, self.nlist):
+                self.train()
+            return
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1)
+        self.remove([item_id for item_id in ids if item_id in self._assignments])
+        self._assign(list(ids), normalize_rows(vectors))
+
+    def state(self) -> Dict[str, np.ndarray]:
+        """Centroids and bucket sizes, so ``attach`` can restore the buckets of ``vectors`` without training"""
+        if not self.is_trained:
+            return {}
+        return {
+            'centroids': self.centroids.copy(),
+            'bucket_sizes': np.array([len(bucket) for bucket in self._lists], dtype=np.int64)
+        }
+
+    def attach(self, ids: Sequence[str], vectors: np.ndarray, state: Optional[Dict[str, np.ndarray]] = None) -> None:
+        """Load a normalized matrix, splitting it into the buckets of ``state`` or training if it is large enough"""
+        if state and len(state['centroids']) == self.nlist and state['bucket_sizes'].sum() == len(ids):
+            self.dim = vectors.shape[1]
+            self.centroids = np.asarray(state['centroids'], dtype=np.float32)
+            self._lists = []
+            self._assignments = {}
+            offset = 0
+            for label, size in enumerate(state['bucket_sizes'].tolist()):
+                # Each bucket adopts its slice of the (memory-mapped) matrix without copying
+                bucket = EmbeddingStore(self.dim, initial_capacity=16)
+                bucket_ids = ids[offset:offset + size]
+                if size:
+                    bucket.attach(bucket_ids, vectors[offset:offset + size])
+                self._lists.append(bucket)
+                self._assignments.update(dict.fromkeys(bucket_ids, label))
+                offset += size
+            self._staging = EmbeddingStore(self.dim)
+            return
+        self._staging.attach(ids, vectors)
+        self.dim = self._staging.dim
+        if len(self._staging) >= max(self.min_train_size, self.nlist):
+            self.train()
+
+    def remove(self, ids: Sequence[str]) -> int:
+        """Remove embeddings by id, returning how many were present"""
+        if not self.is_trained:
+            return self._staging.remove(ids)
+        removed = 0
+        for item_id in ids:
+            label = self._assignments.pop(item_id, None)
+            if label is not None:
+                removed += self._lists[label].remove([item_id])
+        return removed
+
+    def get(self, item_id: str) -> Optional[np.ndarray]:
+        """Get the normalized embedding stored for an id"""
+        if not self.is_trained:
+            return self._staging.get(item_id)
+        label = self._assignments.get(item_id)
+        return None if label is None else self._lists[label].get(item_id)
+
+    def search(self, query: Any, top_k: int, threshold: Optional[float] = None,
+               ids: Optional[Iterable[str]] = None) -> List[Tuple[str, float]]:
+        """Return up to ``top_k`` (id, cosine similarity) pairs from the probed buckets.
+
+        With ``ids``, those rows are scored exactly in their own buckets instead.
+        """
+        if not self.is_trained:
+            return self._staging.search(query, top_k, threshold, ids)
+        if len(self) == 0 or top_k <= 0:
+            return []
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        if ids is not None:
+            by_bucket: Dict[int, List[str]] = {}
+            for item_id in ids:
+                label = self._assignments.get(item_id)
+                if label is not None:
+                    by_bucket.setdefault(label, []).append(item_id)
+            hits = []
+            for label, bucket_ids in by_bucket.items():
+                hits.extend(self._lists[label].search(query, top_k, threshold, bucket_ids))
+            return heapq.nlargest(top_k, hits, key=lambda hit: hit[1])
+        nprobe = min(self.nprobe, self.nlist)
+        probes = np.argpartition(self.centroids @ query, -nprobe)[-nprobe:]
+        hits = []
+        for label in probes:
+            hits.extend(self._lists[label].search(query, top_k, threshold))
+        return heapq.nlargest(top_k, hits, key=lambda hit: hit[1])
+
+    def as_dict(self) -> Dict[str, List[float]]:
+        """Export embeddings as plain lists keyed by id"""
+        if not self.is_trained:
+            return self._staging.as_dict()
+        exported = {}
+        for bucket in self._lists:
+            exported.update(bucket.as_dict())
+        return exported
+
+INDEX_TYPES = {
+    'flat': FlatIndex,
+    'ivf': IVFIndex,
+    'int8': QuantizedIndex,
+    'pq': QuantizedIndex,
+    # faiss is not a dependency; the former default maps onto the exact index
+    'faiss': FlatIndex,
+}
+
+def create_vector_index(settings: Dict[str, Any]):
+    """Build the vector index selected by ``knowledge_settings['index_type']``"""
+    index_type = settings.get('index_type', 'flat')
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type: {index_type}")
+    if INDEX_TYPES[index_type] is IVFIndex:
+        return IVFIndex(nlist=settings.get('nlist', 256), nprobe=settings.get('nprobe', 8))
+    if INDEX_TYPES[index_type] is QuantizedIndex:
+        options = {'subvectors': settings['pq_subvectors']} if index_type == 'pq' and 'pq_subvectors' in settings else {}
+        return QuantizedIndex(
+            quantizer=index_type,
+            rescore=settings.get('rescore', False),
+            rescore_factor=settings.get('rescore_factor', 4),
+            min_train_size=settings.get('quantizer_train_size', 1024),
+            quantizer_options=options
+        )
+    return INDEX_TYPES[index_type]()
@@ -0,0 +1,168 @@
+from typing import Dict, Any, Iterable, List, Optional, Sequence, Tuple
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize each row of a 2-D float32 array, leaving zero rows untouched"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+class EmbeddingStore:
+    """Contiguous float32 embedding matrix with pre-normalized rows.
+
+    Rows are kept densely packed in insertion order (deletes swap the last
+    row into the hole), so a query is a single matrix-vector product over
+    ``vectors`` followed by an ``argpartition`` for the top-k.
+    """
+
+    def __init__(self, dim: Optional[int] = None, initial_capacity: int = 1024):
+        self.dim = dim
+        self._capacity = initial_capacity
+        self._size = 0
+        self._matrix: Optional[np.ndarray] = None
+        self._ids = np.empty(initial_capacity, dtype=object)
+        self._positions: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self._positions
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """Normalized embedding rows currently in the store"""
+        if self._matrix is None:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        return self._matrix[:self._size]
+
+    @property
+    def ids(self) -> np.ndarray:
+        """Item ids aligned with ``vectors``"""
+        return self._ids[:self._size]
+
+    def _reserve(self, extra: int) -> None:
+        """Grow the backing arrays so that ``extra`` more rows fit"""
+        if self._matrix is None:
+            self._matrix = np.zeros((self._capacity, self.dim), dtype=np.float32)
+        needed = self._size + extra
+        if needed <= self._capacity:
+            return
+        capacity = max(self._capacity, 1)
+        while capacity < needed:
+            capacity *= 2
+        matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        ids = np.empty(capacity, dtype=object)
+        ids[:self._size] = self._ids[:self._size]
+        self._matrix, self._ids, self._capacity = matrix, ids, capacity
+
+    def shrink_to_fit(self) -> None:
+        """Release the capacity reserved for future rows, e.g. once a store stops growing"""
+        if self._matrix is None or self._capacity == self._size or isinstance(self._matrix, np.memmap):
+            return
+        self._matrix = self._matrix[:self._size].copy()
+        self._ids = self._ids[:self._size].copy()
+        self._capacity = self._size
+
+    def add(self, ids: Sequence[str], vectors: Any) -> None:
+        """Insert or overwrite embeddings for the given ids"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors.reshape(1, -1)
+        if len(ids) != vectors.shape[0]:
+            raise ValueError("Number of ids does not match number of vectors")
+        if len(ids) == 0:
+            return
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected embeddings of dimension {self.dim}, got {vectors.shape[1]}")
+
+        vectors = normalize_rows(vectors)
+        self._reserve(len(ids))
+        for item_id, vector in zip(ids, vectors):
+            position = self._positions.get(item_id)
+            if position is None:
+                position = self._size
+                self._positions[item_id] = position
+                self._ids[position] = item_id
+                self._size += 1
+            self._matrix[position] = vector
+
+    def attach(self, ids: Sequence[str], vectors: np.ndarray) -> None:
+        """Adopt an already-normalized matrix (e.g. a memory map) without copying it.
+
+        The matrix is only copied into memory once the store has to grow.
+        """
+        self.dim = vectors.shape[1]
+        self._matrix = vectors
+        self._capacity = self._size = len(ids)
+        self._ids = np.empty(self._capacity, dtype=object)
+        self._ids[:] = list(ids)
+        self._positions = {item_id: i for i, item_id in enumerate(ids)}
+
+    def remove(self, ids: Sequence[str]) -> int:
+        """Remove embeddings by id, returning how many were present"""
+        removed = 0
+        for item_id in ids:
+            position = self._positions.pop(item_id, None)
+            if position is None:
+                continue
+            last = self._size - 1
+            if position != last:
+                moved_id = self._ids[last]
+                self._matrix[position] = self._matrix[last]
+                self._ids[position] = moved_id
+                self._positions[moved_id] = position
+            self._ids[last] = None
+            self._size -= 1
+            removed += 1
+        return removed
+
+    def get(self, item_id: str) -> Optional[np.ndarray]:
+        """Get the normalized embedding stored for an id"""
+        position = self._positions.get(item_id)
+        if position is None:
+            return None
+        return self._matrix[position]
+
+    def search(self, query: Any, top_k: int, threshold: Optional[float] = None,
+               ids: Optional[Iterable[str]] = None) -> List[Tuple[str, float]]:
+        """Return up to ``top_k`` (id, cosine similarity) pairs, best first.
+
+        With ``ids``, only the rows of those ids are scored.
+        """
+        if self._size == 0 or top_k <= 0:
+            return []
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        if query.shape[0] != self.dim:
+            raise ValueError(f"Expected query of dimension {self.dim}, got {query.shape[0]}")
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+
+        if ids is None:
+            rows = None
+            scores = self.vectors @ (query / norm)
+        else:
+            rows = np.fromiter((self._positions[item_id] for item_id in ids if item_id in self._positions),
+                               dtype=np.int64)
+            scores = self._matrix[rows] @ (query / norm)
+        if threshold is not None:
+            candidates = np.flatnonzero(scores >= threshold)
+        else:
+            candidates = np.arange(len(scores))
+        if len(candidates) > top_k:
+            partitioned = np.argpartition(scores[candidates], -top_k)[-top_k:]
+            candidates = candidates[partitioned]
+        order = candidates[np.argsort(scores[candidates])[::-1]]
+        positions = order if rows is None else rows[order]
+        return [(self._ids[position], float(scores[i])) for position, i in zip(positions, order)]
+
+    def as_dict(self) -> Dict[str, List[float]]:
+        """Export embeddings as plain lists keyed by id"""
+        return {item_id: self._matrix[i].tolist() for i, item_id in enumerate(self.ids)}
@@ -1,4 +1,4 @@
-# Tests Module
+"""# Tests Module
 
 This directory contains test cases for all agents:
 - Unit tests
@@ -6,4 +6,5 @@ This directory contains test cases for all agents:
 - Performance tests
 - API tests
 
-Each agent has its own test suite in a dedicated subdirectory.
\ No newline at end of file
+Each agent has its own test suite in a dedicated subdirectory.
+"""
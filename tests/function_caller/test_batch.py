@@ -0,0 +1,105 @@
+import asyncio
+import json
+
+import pytest
+
+from agents.function_caller.config import FunctionCallerConfig
+from agents.function_caller.core import FunctionCaller
+
+def make_caller(**concurrency) -> FunctionCaller:
+    defaults = FunctionCallerConfig()
+    return FunctionCaller(FunctionCallerConfig(
+        retry_attempts=1,
+        concurrency={**defaults.concurrency, **concurrency},
+        error_handling={**defaults.error_handling, 'log_errors': False}
+    ))
+
+class Tracker:
+    """An async function that records how many of its calls overlap"""
+
+    def __init__(self):
+        self.running = 0
+        self.peak = 0
+
+    async def __call__(self, value: int, delay: float = 0.01) -> int:
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            self.running -= 1
+        if value < 0:
+            raise ValueError(f"negative: {value}")
+        return value * 2
+
+def register(caller: FunctionCaller) -> Tracker:
+    tracker = Tracker()
+    # Registered through a coroutine function so it is awaited rather than threaded
+    async def double(value: int, delay: float = 0.01) -> int:
+        return await tracker(value, delay)
+    caller.register_function('double', double, {'value': int})
+    return tracker
+
+@pytest.mark.asyncio
+async def test_results_keep_input_order():
+    caller = make_caller()
+    register(caller)
+    # Later calls finish first
+    calls = [{'name': 'double', 'params': {'value': value, 'delay': 0.05 - value * 0.01}} for value in range(5)]
+    batch = await caller.call_functions_batch(calls)
+
+    assert batch['status'] == 'success' and batch['succeeded'] == 5
+    assert [result['result'] for result in batch['results']] == [0, 2, 4, 6, 8]
+
+@pytest.mark.asyncio
+async def test_one_failure_does_not_affect_the_others():
+    caller = make_caller()
+    register(caller)
+    calls = [
+        {'id': 'call_1', 'function': {'name': 'double', 'arguments': json.dumps({'value': 3})}},
+        {'id': 'call_2', 'function': {'name': 'double', 'arguments': json.dumps({'value': -1})}},
+        {'id': 'call_3', 'function': {'name': 'missing', 'arguments': '{}'}},
+        {'id': 'call_4', 'function': {'name': 'double', 'arguments': '{not json'}},
+        {'id': 'call_5', 'function': {'name': 'double', 'arguments': json.dumps({'value': 'x'})}},
+        {'id': 'call_6', 'function': {'name': 'double', 'arguments': ''}}
+    ]
+    batch = await caller.call_functions_batch(calls)
+
+    assert batch['status'] == 'partial'
+    assert (batch['succeeded'], batch['failed']) == (1, 5)
+    assert [result['id'] for result in batch['results']] == [f'call_{i}' for i in range(1, 7)]
+    assert batch['results'][0] == {'id': 'call_1', 'name': 'double', 'status': 'success', 'result': 6, 'attempts': 1}
+    assert [failure['index'] for failure in batch['failures']] == [1, 2, 3, 4, 5]
+    assert 'negative' in batch['failures'][0]['error']
+    assert batch['results'][2]['name'] == 'missing'
+
+@pytest.mark.asyncio
+async def test_all_failed_and_empty_batches():
+    caller = make_caller()
+    register(caller)
+    batch = await caller.call_functions_batch([{'name': 'double', 'params': {'value': -1}}])
+    assert batch['status'] == 'error' and batch['failed'] == 1
+    assert (await caller.call_functions_batch([]))['status'] == 'success'
+
+@pytest.mark.asyncio
+async def test_batch_and_function_limits_cap_concurrency():
+    caller = make_caller(per_function=3)
+    tracker = register(caller)
+    calls = [{'name': 'double', 'params': {'value': value}} for value in range(12)]
+
+    await caller.call_functions_batch(calls)
+    assert tracker.peak == 3
+    tracker.peak = 0
+    await caller.call_functions_batch(calls, max_concurrency=2)
+    assert tracker.peak == 2
+
+def test_limits_work_across_event_loops():
+    caller = make_caller(max_concurrent_calls=2, per_function=1)
+    tracker = register(caller)
+    calls = [{'name': 'double', 'params': {'value': value}} for value in range(4)]
+
+    # Each asyncio.run has its own loop; the calls queue on the semaphores every time
+    for _ in range(3):
+        batch = asyncio.run(caller.call_functions_batch(calls))
+        assert batch['status'] == 'success', batch['failures']
+        assert tracker.peak == 1
@@ -0,0 +1,159 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from agents.function_caller.config import FunctionCallerConfig
+from agents.function_caller.core import FunctionCaller
+from agents.function_caller.utils import CircuitBreaker, CircuitOpenError, backoff_delay, call_with_retries
+
+def make_caller(**settings) -> FunctionCaller:
+    defaults = FunctionCallerConfig()
+    return FunctionCaller(FunctionCallerConfig(
+        retry_backoff={'base_delay': 0.0, 'max_delay': 0.0, 'jitter': 0.0},
+        error_handling={**defaults.error_handling, 'log_errors': False},
+        **settings
+    ))
+
+async def wait_until(condition, seconds: float = 5.0) -> None:
+    deadline = time.monotonic() + seconds
+    while not condition() and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+    assert condition()
+
+def test_backoff_delay_grows_and_is_capped():
+    assert [backoff_delay(attempt, 0.5, 3.0, jitter=0) for attempt in range(5)] == [0.5, 1.0, 2.0, 3.0, 3.0]
+    assert all(0 <= backoff_delay(3, 0.5, 10.0) <= 4.0 for _ in range(50))
+
+def test_breaker_opens_then_lets_one_trial_through():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow() and not breaker.allow()
+    # A failed trial reopens the circuit at once
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.failures == 0
+
+@pytest.mark.asyncio
+async def test_retries_count_as_one_breaker_outcome():
+    breaker = CircuitBreaker(failure_threshold=2)
+    calls = []
+
+    async def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise ConnectionError('reset')
+        return 'ok'
+
+    assert await call_with_retries(flaky, attempts=3, base_delay=0, breaker=breaker) == ('ok', 3)
+    assert breaker.failures == 0
+
+    calls.clear()
+    with pytest.raises(ConnectionError):
+        await call_with_retries(flaky, attempts=2, base_delay=0, breaker=breaker)
+    assert len(calls) == 2 and breaker.failures == 1
+
+@pytest.mark.asyncio
+async def test_open_circuit_fails_fast():
+    caller = make_caller(circuit_breaker={'enabled': True, 'failure_threshold': 2, 'reset_timeout': 60.0},
+                         retry_attempts=1)
+    calls = []
+
+    async def broken():
+        calls.append(1)
+        raise RuntimeError('boom')
+
+    caller.register_function('broken', broken, {})
+    for _ in range(2):
+        result = await caller.call_function('broken', {})
+        assert result['status'] == 'error' and not result['circuit_open']
+    result = await caller.call_function('broken', {})
+    assert result['circuit_open'] and len(calls) == 2
+    assert caller.get_circuit_state('broken') == CircuitBreaker.OPEN
+
+@pytest.mark.asyncio
+async def test_async_timeouts_are_retried():
+    caller = make_caller(function_timeout=0.05, retry_attempts=3)
+    calls = []
+
+    async def slow_once():
+        calls.append(1)
+        if len(calls) == 1:
+            await asyncio.sleep(1)
+        return 'done'
+
+    caller.register_function('slow_once', slow_once, {})
+    result = await caller.call_function('slow_once', {})
+    assert result == {'status': 'success', 'result': 'done', 'attempts': 2}
+
+@pytest.mark.asyncio
+async def test_sync_timeouts_are_not_retried_and_strays_are_tracked():
+    caller = make_caller(function_timeout=0.05, retry_attempts=3)
+    release = threading.Event()
+    calls = []
+
+    def blocking():
+        calls.append(1)
+        release.wait(5)
+        return 'late'
+
+    caller.register_function('blocking', blocking, {})
+    result = await caller.call_function('blocking', {})
+    assert result['status'] == 'error' and result['error'].startswith('Timed out')
+    # One thread, not one per attempt
+    assert len(calls) == 1
+    assert caller.stray_calls == {'blocking': 1}
+
+    release.set()
+    await wait_until(lambda: not caller.stray_calls)
+    caller.close()
+
+@pytest.mark.asyncio
+async def test_stray_calls_hold_back_new_calls():
+    caller = make_caller(function_timeout=0.05, retry_attempts=1,
+                         concurrency={**FunctionCallerConfig().concurrency, 'function_limits': {'blocking': 2}})
+    release = threading.Event()
+    calls = []
+
+    def blocking(wait: bool):
+        calls.append(1)
+        if wait:
+            release.wait(5)
+        return 'ok'
+
+    caller.register_function('blocking', blocking, {'wait': bool})
+    for _ in range(2):
+        assert (await caller.call_function('blocking', {'wait': True}))['status'] == 'error'
+    # Both slots of the function are taken by threads that are still running
+    result = await caller.call_function('blocking', {'wait': False})
+    assert result['circuit_open'] and len(calls) == 2
+
+    release.set()
+    await wait_until(lambda: not caller.stray_calls)
+    assert await caller.call_function('blocking', {'wait': False}) == {'status': 'success', 'result': 'ok',
+                                                                       'attempts': 1}
+    caller.close()
+
+@pytest.mark.asyncio
+async def test_cancelled_call_releases_the_trial():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    breaker.record_failure()
+    task = asyncio.create_task(call_with_retries(lambda: asyncio.sleep(5), breaker=breaker))
+    await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    # Cancellation is nobody's fault: the trial slot is free again
+    assert breaker.allow()
+    with pytest.raises(CircuitOpenError):
+        await call_with_retries(lambda: asyncio.sleep(0), breaker=breaker)
@@ -0,0 +1,112 @@
+import enum
+
+import pytest
+
+from agents.function_caller.core import FunctionCaller
+from agents.function_caller.utils import sanitize_input, validate_function_input
+from agents.function_caller.validators import ValidationError, compile_schema
+
+class Color(str, enum.Enum):
+    RED = ' red '
+
+NESTED = {
+    'city': ' Shanghai ',
+    'items': [{'sku': ' SKU-1 ', 'quantity': 2, 'price': 1.5, 'tags': ['cold ', None, True]}, ' loose ', 7],
+    'filters': {'region': {'name': ' east ', 'codes': [1, ' 2 ']}, 'color': Color.RED, 'raw': (1, 2), 'obj': object()},
+    'limit': 20
+}
+
+ORDER = {
+    'type': 'object',
+    'properties': {
+        'city': {'type': 'string', 'enum': ['Beijing', 'Shanghai']},
+        'items': {
+            'type': 'array',
+            'minItems': 1,
+            'items': {
+                'type': 'object',
+                'properties': {'sku': {'type': 'string', 'pattern': '^SKU-'}, 'quantity': {'type': 'integer', 'minimum': 1}},
+                'required': ['sku', 'quantity'],
+                'additionalProperties': False
+            }
+        },
+        'limit': {'type': 'integer', 'default': 10},
+        'note': {'type': ['string', 'null']}
+    },
+    'required': ['city', 'items']
+}
+
+def test_type_map_matches_the_generic_path():
+    schema = {'city': str, 'items': list, 'filters': dict, 'limit': int}
+    assert validate_function_input(NESTED, schema)
+    assert compile_schema(schema)(NESTED) == sanitize_input(NESTED)
+    # Fields outside the schema are sanitized the same way
+    extra = {**NESTED, 'extra': {'nested': [' x ']}}
+    assert compile_schema({'city': str})(extra) == sanitize_input(extra)
+
+def test_type_map_rejects_missing_and_mistyped_fields():
+    validate = compile_schema({'city': str, 'limit': (int, float)})
+    assert validate({'city': ' Paris ', 'limit': 2.5}) == {'city': 'Paris', 'limit': 2.5}
+    with pytest.raises(ValidationError, match='city: missing required field'):
+        validate({'limit': 1})
+    with pytest.raises(ValidationError, match='limit: expected'):
+        validate({'city': 'Paris', 'limit': '1'})
+    with pytest.raises(ValidationError):
+        validate(['not', 'an', 'object'])
+
+    unchecked = compile_schema({'city': str}, sanitize=False, type_check=False)
+    assert unchecked({'city': 5, 'x': ' y '}) == {'city': 5, 'x': ' y '}
+
+def test_sanitizing_without_type_checks_accepts_any_value():
+    validate = compile_schema({'a': str, 'n': int, 'tags': list}, type_check=False)
+    assert validate({'a': 5, 'n': ' 7 ', 'tags': {'k': ' v '}}) == {'a': 5, 'n': '7', 'tags': {'k': 'v'}}
+    params = {'a': [' x ', None], 'n': 2.5, 'tags': ' t '}
+    assert validate(params) == sanitize_input(params)
+
+@pytest.mark.parametrize('schema', [
+    {'city': 'str'},
+    {'city': str, 'tags': list[str]},
+    {'city': None},
+    {'parameters': {'type': 'object', 'properties': {'city': 'string'}}},
+    {'type': 'object', 'properties': {'city': {'type': 'text'}}},
+    {'type': 'object', 'properties': {'code': {'type': 'string', 'pattern': '('}}},
+])
+def test_malformed_schemas_fail_at_compile_time(schema):
+    with pytest.raises(ValidationError):
+        compile_schema(schema)
+
+def test_register_function_rejects_malformed_schemas():
+    caller = FunctionCaller()
+    with pytest.raises(ValidationError, match='city'):
+        caller.register_function('lookup', lambda city: city, {'city': 'str'})
+    assert 'lookup' not in caller.get_registered_functions()
+
+def test_json_schema_checks_nested_values():
+    validate = compile_schema({'parameters': ORDER, 'returns': {'type': 'object'}})
+    assert validate({'city': 'Beijing ', 'items': [{'sku': ' SKU-1', 'quantity': 2.0}]}) == \
+        {'city': 'Beijing', 'items': [{'sku': 'SKU-1', 'quantity': 2}], 'limit': 10}
+    assert validate({'city': 'Beijing', 'items': [{'sku': 'SKU-1', 'quantity': 1}], 'note': None})['note'] is None
+
+    failures = {
+        'city: must be one of': {'city': 'Paris', 'items': [{'sku': 'SKU-1', 'quantity': 1}]},
+        r'items: must have at least 1 items': {'city': 'Beijing', 'items': []},
+        r'items\[\]\.quantity: must be >= 1': {'city': 'Beijing', 'items': [{'sku': 'SKU-1', 'quantity': 0}]},
+        r'items\[\]\.quantity: expected integer': {'city': 'Beijing', 'items': [{'sku': 'SKU-1', 'quantity': True}]},
+        r'items\[\]\.sku: must match': {'city': 'Beijing', 'items': [{'sku': 'X-1', 'quantity': 1}]},
+        r'items\[\]\.color: unexpected field': {'city': 'Beijing',
+                                               'items': [{'sku': 'SKU-1', 'quantity': 1, 'color': 'red'}]},
+        'note: expected string/null': {'city': 'Beijing', 'items': [{'sku': 'SKU-1', 'quantity': 1}], 'note': 3},
+    }
+    for message, params in failures.items():
+        with pytest.raises(ValidationError, match=message):
+            validate(params)
+
+@pytest.mark.asyncio
+async def test_call_function_reports_invalid_parameters():
+    caller = FunctionCaller()
+    caller.register_function('order', lambda city, items, limit: len(items), {'parameters': ORDER})
+    with pytest.raises(ValueError, match='Invalid parameters for function order'):
+        await caller.call_function('order', {'city': 'Beijing'})
+    result = await caller.call_function('order', {'city': 'Beijing', 'items': [{'sku': 'SKU-1', 'quantity': 1}]})
+    assert result['status'] == 'success' and result['result'] == 1
+    caller.close()
@@ -0,0 +1,277 @@
+"""Retrieval benchmark for agents/knowledge_base.
+
+Generates a synthetic mixed CJK/English corpus, ingests it through
+``add_knowledge`` (or ``add_knowledge_batch``), runs ``retrieve_knowledge``
+queries and reports ingest throughput, query latency percentiles, peak RSS
+and two quality figures, as JSON:
+
+* ``source_recall_at_k``: share of queries whose source document (each
+  query is a span of one document) is among the results. It is ground
+  truth for every mode, so chunking settings such as ``--chunk-unit
+  tokens`` can be compared against character chunking on the same corpus;
+* ``recall_at_k`` (vector mode only): overlap with an exact brute-force
+  cosine ranking over the stored vectors, i.e. what an approximate index
+  (ivf/int8/pq) loses compared with a flat scan.
+
+Usage::
+
+    python tests/knowledge_base/benchmark.py --chunks 10000 --index-type ivf --output results.json
+    python tests/knowledge_base/benchmark.py --mode lexical --chunk-unit tokens --chunk-tokens 128
+"""
+
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+import argparse
+import asyncio
+import json
+import platform
+import random
+import resource
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from agents.knowledge_base.config import KnowledgeBaseConfig  # noqa: E402
+from agents.knowledge_base.core import KnowledgeBase  # noqa: E402
+from agents.knowledge_base.utils import split_chunk_id  # noqa: E402
+
+# Common CJK ideographs and English-like syllables for the synthetic vocabulary
+CJK_RANGE = (0x4e00, 0x4e00 + 3000)
+SYLLABLES = ['ka', 'lo', 'mi', 'ter', 'on', 'ra', 'sen', 'vi', 'tu', 'pre', 'dis', 'ing', 'al', 'co', 'ne', 'ux']
+
+class CorpusGenerator:
+    """Deterministic synthetic corpus with Zipf-distributed vocabulary.
+
+    Each document holds ``chunks_per_document`` chunks of roughly
+    ``chunk_chars`` characters; ``cjk_ratio`` of the sentences are Chinese.
+    """
+
+    def __init__(self, vocabulary_size: int = 20000, chunk_chars: int = 500, chunks_per_document: int = 4,
+                 cjk_ratio: float = 0.5, seed: int = 0):
+        self.chunk_chars = chunk_chars
+        self.chunks_per_document = chunks_per_document
+        self.cjk_ratio = cjk_ratio
+        self.rng = random.Random(seed)
+        self.english = [''.join(self.rng.choice(SYLLABLES) for _ in range(self.rng.randint(1, 4)))
+                        for _ in range(vocabulary_size)]
+        self.cjk = [''.join(chr(self.rng.randint(*CJK_RANGE)) for _ in range(self.rng.randint(1, 3)))
+                    for _ in range(vocabulary_size)]
+        weights = 1.0 / np.arange(1, vocabulary_size + 1)
+        self.cumulative = np.cumsum(weights / weights.sum()).tolist()
+
+    def _word_index(self) -> int:
+        value = self.rng.random()
+        low, high = 0, len(self.cumulative) - 1
+        while low < high:
+            middle = (low + high) // 2
+            if self.cumulative[middle] < value:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def sentence(self) -> str:
+        length = self.rng.randint(6, 16)
+        if self.rng.random() < self.cjk_ratio:
+            return ''.join(self.cjk[self._word_index()] for _ in range(length)) + '。'
+        return ' '.join(self.english[self._word_index()] for _ in range(length)).capitalize() + '. '
+
+    def document(self, index: int) -> Dict[str, Any]:
+        target = self.chunk_chars * self.chunks_per_document
+        parts: List[str] = []
+        length = 0
+        while length < target:
+            sentence = self.sentence()
+            parts.append(sentence)
+            length += len(sentence)
+        return {
+            'content': ''.join(parts)[:target],
+            'metadata': {'tags': [f'tag{index % 10}'], 'category': f'category{index % 3}'},
+            'source': f'synthetic://{index}'
+        }
+
+    def documents(self, count: int) -> Iterator[Dict[str, Any]]:
+        for index in range(count):
+            yield self.document(index)
+
+    def query(self, document: Dict[str, Any]) -> str:
+        """A query made of a short span of one document's text"""
+        content = document['content']
+        start = self.rng.randrange(max(1, len(content) - 40))
+        return content[start:start + 40]
+
+def percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far"""
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return usage / 1024 / (1024 if sys.platform == 'darwin' else 1)
+
+def exact_vector_ranking(knowledge_base: KnowledgeBase, query: str, top_k: int) -> List[str]:
+    """Brute-force baseline: knowledge ids ranked by their best chunk's exact cosine similarity"""
+    query_vector = np.asarray(knowledge_base.embedder.embed([query])[0], dtype=np.float32)
+    query_vector /= np.linalg.norm(query_vector) or 1.0
+    scores = np.asarray(knowledge_base.embeddings.vectors, dtype=np.float32) @ query_vector
+    best: Dict[str, float] = {}
+    for chunk_id, score in zip(knowledge_base.embeddings.ids, scores.tolist()):
+        knowledge_id, _ = split_chunk_id(chunk_id)
+        if score > best.get(knowledge_id, float('-inf')):
+            best[knowledge_id] = score
+    return [knowledge_id for knowledge_id, _ in sorted(best.items(), key=lambda item: item[1], reverse=True)[:top_k]]
+
+def build_config(args: argparse.Namespace) -> KnowledgeBaseConfig:
+    return KnowledgeBaseConfig(
+        embedding_settings={'provider': 'hashing', 'dimension': args.dimension, 'batch_size': 256, 'cache_path': None},
+        knowledge_settings={
+            'chunk_unit': args.chunk_unit,
+            'chunk_size': args.chunk_chars,
+            'chunk_overlap': 0,
+            'chunk_tokens': args.chunk_tokens,
+            'chunk_overlap_tokens': 0,
+            'chunk_boundary': None,
+            'index_type': args.index_type,
+            'nlist': args.nlist,
+            'nprobe': args.nprobe,
+            'pq_subvectors': args.pq_subvectors,
+            'snapshot_isolation': args.snapshot_isolation,
+        },
+        retrieval_config={
+            'mode': args.mode,
+            'top_k': args.top_k,
+            'similarity_threshold': None,
+            'rerank_results': False,
+            # Every query must hit the index, not the result cache
+            'cache_size': 0,
+        }
+    )
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    chunks_per_document = args.chunks_per_document
+    document_count = max(1, args.chunks // chunks_per_document)
+    generator = CorpusGenerator(args.vocabulary, args.chunk_chars, chunks_per_document, args.cjk_ratio, args.seed)
+    knowledge_base = KnowledgeBase(build_config(args))
+    rss_before = peak_rss_mb()
+
+    # Queries are drawn from a sample of documents kept aside while streaming the corpus
+    query_sources: List[Tuple[int, Dict[str, Any]]] = []
+    sample_every = max(1, document_count // max(1, args.queries))
+
+    def corpus():
+        for index, document in enumerate(generator.documents(document_count)):
+            if index % sample_every == 0 and len(query_sources) < args.queries:
+                query_sources.append((index, document))
+            yield document
+
+    started = time.perf_counter()
+    if args.ingest == 'batch':
+        summary = await knowledge_base.add_knowledge_batch(corpus())
+        failed = summary['failed']
+    else:
+        failed = 0
+        for document in corpus():
+            await knowledge_base.add_knowledge(document)
+    ingest_seconds = time.perf_counter() - started
+    chunk_count = sum(len(knowledge['chunk_hashes']) for knowledge in knowledge_base.knowledge_store.values())
+    rss_after_ingest = peak_rss_mb()
+
+    queries = [(generator.query(document), document['source']) for _, document in query_sources]
+    effective_mode = knowledge_base._retrieval_mode()
+    latencies: List[float] = []
+    source_hits: List[float] = []
+    recalls: List[float] = []
+    for query, source in queries:
+        query_started = time.perf_counter()
+        results = await knowledge_base.retrieve_knowledge(query, args.top_k)
+        latencies.append((time.perf_counter() - query_started) * 1000)
+        found = {result['knowledge_id'] for result in results}
+        source_hits.append(float(any(knowledge_base.knowledge_store[knowledge_id]['source'] == source
+                                     for knowledge_id in found)))
+        # Lexical and hybrid results are already exact over their index, so only vector search has a baseline
+        if effective_mode != 'vector' or args.skip_recall:
+            continue
+        expected = exact_vector_ranking(knowledge_base, query, args.top_k)
+        if expected:
+            recalls.append(len(found & set(expected)) / len(expected))
+
+    return {
+        'benchmark': 'knowledge_base_retrieval',
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+        },
+        'parameters': {key: value for key, value in vars(args).items() if key != 'output'},
+        'corpus': {
+            'documents': len(knowledge_base.knowledge_store),
+            'chunks': chunk_count,
+            'characters': sum(len(knowledge['content']) for knowledge in knowledge_base.knowledge_store.values()),
+        },
+        'ingest': {
+            'mode': args.ingest,
+            'seconds': ingest_seconds,
+            'documents_per_second': document_count / ingest_seconds if ingest_seconds else 0.0,
+            'chunks_per_second': chunk_count / ingest_seconds if ingest_seconds else 0.0,
+            'failed': failed,
+        },
+        'query': {
+            'mode': effective_mode,
+            'count': len(latencies),
+            'top_k': args.top_k,
+            'latency_ms': {
+                'mean': float(np.mean(latencies)) if latencies else 0.0,
+                'p50': percentile(latencies, 50),
+                'p95': percentile(latencies, 95),
+                'p99': percentile(latencies, 99),
+            },
+            'source_recall_at_k': float(np.mean(source_hits)) if source_hits else None,
+            'recall_at_k': float(np.mean(recalls)) if recalls else None,
+        },
+        'memory': {
+            'peak_rss_mb_before_ingest': rss_before,
+            'peak_rss_mb_after_ingest': rss_after_ingest,
+            'peak_rss_mb': peak_rss_mb(),
+        },
+    }
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Benchmark knowledge base ingestion and retrieval')
+    parser.add_argument('--chunks', type=int, default=1000, help='approximate corpus size in chunks (1k to 1M)')
+    parser.add_argument('--chunk-chars', type=int, default=500, help='generated chunk length, and chunk_size')
+    parser.add_argument('--chunk-unit', default='chars', choices=['chars', 'tokens'])
+    parser.add_argument('--chunk-tokens', type=int, default=128, help='chunk_tokens with --chunk-unit tokens')
+    parser.add_argument('--chunks-per-document', type=int, default=4)
+    parser.add_argument('--cjk-ratio', type=float, default=0.5, help='share of Chinese sentences')
+    parser.add_argument('--vocabulary', type=int, default=20000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--mode', default='vector', choices=['auto', 'lexical', 'vector', 'hybrid'])
+    parser.add_argument('--index-type', default='flat', choices=['flat', 'ivf', 'int8', 'pq'])
+    parser.add_argument('--nlist', type=int, default=256)
+    parser.add_argument('--nprobe', type=int, default=8)
+    parser.add_argument('--pq-subvectors', type=int, default=32)
+    parser.add_argument('--dimension', type=int, default=256)
+    parser.add_argument('--ingest', default='single', choices=['single', 'batch'])
+    parser.add_argument('--snapshot-isolation', action='store_true', help='segmented indexes with snapshot reads')
+    parser.add_argument('--skip-recall', action='store_true', help='skip the brute-force vector baseline on huge corpora')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help='JSON file for the results, stdout when omitted')
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    args = parse_args(argv)
+    results = asyncio.run(run(args))
+    report = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(report, encoding='utf-8')
+    print(report)
+    return results
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+import json
+
+import pytest
+
+from agents.knowledge_base.config import KnowledgeBaseConfig
+from agents.knowledge_base.core import KnowledgeBase
+
+def make_knowledge_base(**dedup) -> KnowledgeBase:
+    return KnowledgeBase(KnowledgeBaseConfig(
+        embedding_settings={'provider': 'hashing', 'dimension': 64, 'batch_size': 64, 'cache_path': None},
+        dedup_settings={**KnowledgeBaseConfig().dedup_settings, **dedup}
+    ))
+
+def document(topic: str, **metadata) -> dict:
+    content = ' '.join(f'Note {i} about {topic} covers case {i * 7} of the {topic} handbook.' for i in range(30))
+    return {'content': content, 'metadata': metadata, 'source': topic}
+
+def contents(knowledge_base: KnowledgeBase) -> dict:
+    return {knowledge_id: (knowledge['content'], knowledge['metadata'], knowledge.get('versions'))
+            for knowledge_id, knowledge in knowledge_base.knowledge_store.items()}
+
+def manifest(path) -> dict:
+    return json.loads((path / 'manifest.json').read_text(encoding='utf-8'))
+
+async def build_chain(knowledge_base: KnowledgeBase, path):
+    """A full backup of three entries, then a delta with one add, one update and one delete"""
+    ids = [(await knowledge_base.add_knowledge(document(topic)))['knowledge_id']
+           for topic in ('billing', 'shipping', 'returns')]
+    knowledge_base.backup_knowledge(str(path))
+    first = contents(knowledge_base)
+    await knowledge_base.add_knowledge(document('warranty'))
+    await knowledge_base.update_knowledge(ids[0], document('invoices', team='finance'))
+    knowledge_base.delete_knowledge(ids[2])
+    knowledge_base.backup_knowledge(str(path))
+    return first
+
+@pytest.mark.asyncio
+async def test_delta_backup_holds_only_changed_entries(tmp_path):
+    knowledge_base = make_knowledge_base()
+    await build_chain(knowledge_base, tmp_path)
+
+    backups = manifest(tmp_path)['backups']
+    assert [(b['type'], b['documents'], b['deleted']) for b in backups] == [('full', 3, 0), ('delta', 2, 1)]
+    # Nothing changed since: an empty delta
+    record = knowledge_base.backup_knowledge(str(tmp_path))['backup']
+    assert (record['type'], record['documents'], record['deleted']) == ('delta', 0, 0)
+
+@pytest.mark.asyncio
+async def test_restore_replays_the_chain(tmp_path):
+    source = make_knowledge_base()
+    first = await build_chain(source, tmp_path)
+
+    restored = make_knowledge_base()
+    result = restored.restore_knowledge(str(tmp_path))
+    assert result == {'status': 'success', 'restored': 5, 'deleted': 1, 'documents': 3}
+    assert contents(restored) == contents(source)
+    # Embeddings come from the backup, not the embedder
+    assert restored.embedder.misses == 0
+    hits = await restored.retrieve_knowledge('invoices handbook', top_k=1)
+    assert hits[0]['metadata'] == {'team': 'finance'}
+
+    partial = make_knowledge_base()
+    assert partial.restore_knowledge(str(tmp_path), upto=0)['documents'] == 3
+    assert contents(partial) == first
+
+@pytest.mark.asyncio
+async def test_restore_only_into_an_empty_knowledge_base(tmp_path):
+    source = make_knowledge_base()
+    await build_chain(source, tmp_path)
+    with pytest.raises(ValueError):
+        source.restore_knowledge(str(tmp_path))
+
+@pytest.mark.asyncio
+async def test_restored_chain_can_be_extended(tmp_path):
+    source = make_knowledge_base()
+    await build_chain(source, tmp_path)
+    chain_id = manifest(tmp_path)['chain_id']
+
+    restored = make_knowledge_base()
+    restored.restore_knowledge(str(tmp_path))
+    await restored.add_knowledge(document('loyalty'))
+    record = restored.backup_knowledge(str(tmp_path))['backup']
+    assert (record['type'], record['sequence'], record['documents']) == ('delta', 2, 1)
+    assert manifest(tmp_path)['chain_id'] == chain_id
+
+    # A point-in-time restore diverges from the chain, so its next backup starts a new one
+    rewound = make_knowledge_base()
+    rewound.restore_knowledge(str(tmp_path), upto=0)
+    assert rewound.backup_knowledge(str(tmp_path))['backup']['type'] == 'full'
+    assert manifest(tmp_path)['chain_id'] != chain_id
+    assert (tmp_path / f'manifest-{chain_id}.json').exists()
+
+@pytest.mark.asyncio
+async def test_restore_counts_versions_in_content_bytes(tmp_path):
+    source = make_knowledge_base(enabled=True, policy='version')
+    knowledge_id = (await source.add_knowledge(document('billing')))['knowledge_id']
+    revised = document('billing')
+    revised['content'] = revised['content'].replace('Note 3 about', 'Note 3 now about')
+    assert (await source.add_knowledge(revised))['dedup_action'] == 'versioned'
+    assert len(source.get_knowledge(knowledge_id)['versions']) == 1
+    source.backup_knowledge(str(tmp_path))
+
+    restored = make_knowledge_base(enabled=True, policy='version')
+    restored.restore_knowledge(str(tmp_path))
+    expected = sum(restored._record_bytes(knowledge) for knowledge in restored.knowledge_store.values())
+    assert restored.memory_usage()['content'] == expected == source.memory_usage()['content']
+
+    restored.delete_knowledge(knowledge_id)
+    assert restored.memory_usage()['content'] == 0
+
+def test_command_line_uses_the_saved_config(tmp_path, capsys):
+    import asyncio
+    from agents.knowledge_base.backup import main
+
+    defaults = KnowledgeBaseConfig()
+    config = KnowledgeBaseConfig(
+        embedding_settings={'provider': 'hashing', 'dimension': 48, 'batch_size': 64, 'cache_path': None},
+        knowledge_settings={**defaults.knowledge_settings, 'chunk_size': 600, 'chunk_overlap': 50},
+        dedup_settings={**defaults.dedup_settings, 'enabled': True, 'policy': 'version'},
+        storage_settings={**defaults.storage_settings, 'backend': 'mmap', 'path': str(tmp_path / 'store')}
+    )
+    source = KnowledgeBase(config)
+    knowledge_id = asyncio.run(source.add_knowledge(document('billing')))['knowledge_id']
+    revised = document('billing')
+    revised['content'] = revised['content'].replace('Note 3 about', 'Note 3 now about')
+    asyncio.run(source.add_knowledge(revised))
+    expected = contents(source)
+    hashes = source.get_knowledge(knowledge_id)['chunk_hashes']
+    source.close()
+
+    main(['backup', str(tmp_path / 'store'), str(tmp_path / 'backups')])
+    main(['restore', str(tmp_path / 'backups'), str(tmp_path / 'restored')])
+    assert json.loads(capsys.readouterr().out.splitlines()[-1])['documents'] == 1
+
+    saved = KnowledgeBaseConfig.model_validate_json((tmp_path / 'restored' / 'config.json').read_text())
+    assert saved.knowledge_settings['chunk_size'] == 600 and saved.embedding_settings['dimension'] == 48
+    restored = KnowledgeBase(saved)
+    assert contents(restored) == expected
+    # Same chunking, and the restored versions were indexed with the record
+    assert restored.get_knowledge(knowledge_id)['chunk_hashes'] == hashes
+    assert restored.memory_usage()['content'] == restored._count_content_bytes()
+    assert restored.embeddings.dim == 48
+    restored.close()
+
+    with pytest.raises(SystemExit):
+        main(['restore', str(tmp_path / 'missing'), str(tmp_path / 'other')])
@@ -0,0 +1,51 @@
+import pytest
+
+from agents.knowledge_base.utils import BOUNDARY_PATTERNS, iter_chunk_spans, process_chunk
+
+TEXT = '\n\n'.join(
+    ' '.join(f'Sentence {i} of paragraph {p} describes step {i * p} of the setup.' for i in range(5))
+    for p in range(6)
+) + ' 第一步安装软件。第二步配置参数！第三步重启服务？' * 4
+
+@pytest.mark.parametrize('chunk_size, overlap, boundary', [
+    (100, 0, None), (100, 20, None), (57, 56, None), (200, 50, 'sentence'), (300, 40, 'paragraph'), (40, 10, 'sentence'),
+])
+def test_spans_cover_the_text(chunk_size, overlap, boundary):
+    spans = list(iter_chunk_spans(TEXT, chunk_size, overlap, boundary))
+    assert spans[0][0] == 0 and spans[-1][1] == len(TEXT)
+    for (start, end), (next_start, _) in zip(spans, spans[1:]):
+        # No gaps, overlap never more than asked, and every chunk moves forward
+        assert start < next_start <= end
+        assert next_start == max(end - overlap, start + 1)
+    for start, end in spans:
+        assert 0 < end - start <= chunk_size
+    assert process_chunk(TEXT, chunk_size, overlap) == \
+        [TEXT[start:end] for start, end in iter_chunk_spans(TEXT, chunk_size, overlap)]
+
+@pytest.mark.parametrize('boundary', ['sentence', 'paragraph'])
+def test_chunk_ends_snap_to_boundaries(boundary):
+    chunk_size = 250
+    spans = list(iter_chunk_spans(TEXT, chunk_size, 30, boundary))
+    pattern = BOUNDARY_PATTERNS[boundary]
+    for start, end in spans[:-1]:
+        boundaries = [match.end() for match in pattern.finditer(TEXT, start + chunk_size // 2, start + chunk_size)]
+        if boundaries:
+            # The last boundary in the second half of the window
+            assert end == boundaries[-1]
+        else:
+            assert end == start + chunk_size
+
+def test_cjk_sentences_end_on_their_punctuation():
+    text = '第一步安装软件。第二步配置参数！第三步重启服务？' * 10
+    for start, end in list(iter_chunk_spans(text, 30, 5, 'sentence'))[:-1]:
+        assert text[end - 1] in '。！？'
+
+def test_hard_cut_without_a_boundary_in_the_second_half():
+    text = 'a' * 250
+    assert list(iter_chunk_spans(text, 100, 10, 'sentence')) == [(0, 100), (90, 190), (180, 250)]
+
+def test_short_and_empty_texts_and_invalid_overlap():
+    assert list(iter_chunk_spans('', 100, 10)) == [(0, 0)]
+    assert list(iter_chunk_spans('short', 100, 10, 'sentence')) == [(0, 5)]
+    with pytest.raises(ValueError):
+        list(iter_chunk_spans(TEXT, 100, 100))
@@ -0,0 +1,72 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from agents.knowledge_base.config import KnowledgeBaseConfig
+from agents.knowledge_base.core import KnowledgeBase
+from agents.knowledge_base.embeddings import CachedEmbedder, HashingEmbedder
+
+def make_knowledge_base(snapshot_isolation: bool) -> KnowledgeBase:
+    defaults = KnowledgeBaseConfig()
+    return KnowledgeBase(KnowledgeBaseConfig(
+        embedding_settings={'provider': 'hashing', 'dimension': 64, 'batch_size': 8, 'cache_path': None},
+        knowledge_settings={**defaults.knowledge_settings, 'chunk_size': 60, 'chunk_overlap': 10,
+                            'snapshot_isolation': snapshot_isolation},
+        retrieval_config={**defaults.retrieval_config, 'mode': 'hybrid', 'cache_size': 0},
+        ingest_settings={**defaults.ingest_settings, 'use_processes': False, 'batch_size': 8}
+    ))
+
+def document(index: int) -> dict:
+    return {'content': f'Entry {index} covers topic{index % 7} and shared words about storage engines. ' * 3,
+            'metadata': {'category': f'c{index % 3}'}, 'source': f's{index}'}
+
+def test_cached_embedder_is_thread_safe():
+    embedder = CachedEmbedder(HashingEmbedder(32), batch_size=4)
+    texts = [f'text {index % 50}' for index in range(400)]
+
+    def work(offset):
+        return embedder.embed(texts[offset:offset + 40])
+
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(work, range(0, 400, 40)))
+    assert all(result.shape == (40, 32) for result in results)
+    assert embedder.hits + embedder.misses == 400
+    assert np.array_equal(embedder.embed(['text 3'])[0], HashingEmbedder(32).embed(['text 3'])[0])
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('snapshot_isolation', [False, True])
+async def test_hybrid_readers_with_concurrent_writers(snapshot_isolation):
+    knowledge_base = make_knowledge_base(snapshot_isolation)
+    ids = [(await knowledge_base.add_knowledge(document(index)))['knowledge_id'] for index in range(20)]
+    stop = asyncio.Event()
+
+    async def reader(worker: int):
+        searches = 0
+        while not stop.is_set():
+            response = await knowledge_base.hybrid_search(f'topic{worker % 7} storage', 5,
+                                                          filters={'category': f'c{worker % 3}'})
+            for result in response['results']:
+                assert result['content']
+            searches += 1
+            await asyncio.sleep(0)
+        return searches
+
+    async def writer():
+        for index in range(20, 80):
+            ids.append((await knowledge_base.add_knowledge(document(index)))['knowledge_id'])
+            knowledge_base.delete_knowledge(ids.pop(0))
+            await asyncio.sleep(0)
+        # Batch ingestion embeds in an executor thread while the readers embed their queries
+        await knowledge_base.add_knowledge_batch(document(index) for index in range(80, 120))
+
+    readers = [asyncio.ensure_future(reader(worker)) for worker in range(8)]
+    try:
+        await writer()
+    finally:
+        stop.set()
+    searches = await asyncio.gather(*readers)
+    knowledge_base.close()
+    assert all(count > 0 for count in searches)
+    assert len(knowledge_base.knowledge_store) == 60
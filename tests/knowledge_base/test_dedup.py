@@ -0,0 +1,102 @@
+import pytest
+
+from agents.knowledge_base.config import KnowledgeBaseConfig
+from agents.knowledge_base.core import KnowledgeBase
+from agents.knowledge_base.dedup import DuplicateDetector, create_duplicate_detector, merge_metadata
+
+ARTICLE = ' '.join(f'Sentence {i} explains how warehouse {i % 7} ships parcels on route {i % 5}.' for i in range(40))
+# One sentence reworded: well above the default 0.85 shingle similarity
+REVISED = ARTICLE.replace('Sentence 12 explains how', 'Sentence 12 now describes how')
+UNRELATED = ' '.join(f'Recipe step {i} adds {i} grams of flour to bowl {i % 3}.' for i in range(40))
+
+def make_knowledge_base(policy: str = 'skip') -> KnowledgeBase:
+    return KnowledgeBase(KnowledgeBaseConfig(
+        embedding_settings={'provider': 'hashing', 'dimension': 64, 'batch_size': 64, 'cache_path': None},
+        dedup_settings={**KnowledgeBaseConfig().dedup_settings, 'enabled': True, 'policy': policy}
+    ))
+
+def document(content: str, **metadata) -> dict:
+    return {'content': content, 'metadata': metadata, 'source': 'test'}
+
+@pytest.mark.asyncio
+async def test_skip_policy_drops_near_duplicates():
+    knowledge_base = make_knowledge_base('skip')
+    original = await knowledge_base.add_knowledge(document(ARTICLE))
+    duplicate = await knowledge_base.add_knowledge(document(REVISED))
+
+    assert duplicate['dedup_action'] == 'skipped'
+    assert duplicate['duplicate_of'] == original['knowledge_id'] == duplicate['knowledge_id']
+    assert duplicate['similarity'] >= 0.85
+    assert len(knowledge_base.knowledge_store) == 1
+    assert knowledge_base.get_knowledge(original['knowledge_id'])['content'] == ARTICLE
+
+@pytest.mark.asyncio
+async def test_unrelated_documents_are_kept():
+    knowledge_base = make_knowledge_base('skip')
+    await knowledge_base.add_knowledge(document(ARTICLE))
+    result = await knowledge_base.add_knowledge(document(UNRELATED))
+
+    assert 'dedup_action' not in result
+    assert len(knowledge_base.knowledge_store) == 2
+
+@pytest.mark.asyncio
+async def test_merge_policy_folds_metadata():
+    knowledge_base = make_knowledge_base('merge')
+    knowledge_id = (await knowledge_base.add_knowledge(document(ARTICLE, tags=['shipping'], team='ops')))['knowledge_id']
+    result = await knowledge_base.add_knowledge(document(REVISED, tags=['shipping', 'routes'], team='sales', lang='en'))
+
+    assert result['dedup_action'] == 'merged'
+    knowledge = knowledge_base.get_knowledge(knowledge_id)
+    assert knowledge['metadata'] == {'tags': ['shipping', 'routes'], 'team': 'ops', 'lang': 'en'}
+    assert knowledge['content'] == ARTICLE
+    assert len(knowledge_base.knowledge_store) == 1
+
+@pytest.mark.asyncio
+async def test_version_policy_replaces_content_and_keeps_history():
+    knowledge_base = make_knowledge_base('version')
+    knowledge_id = (await knowledge_base.add_knowledge(document(ARTICLE)))['knowledge_id']
+    result = await knowledge_base.add_knowledge(document(REVISED))
+
+    assert result['dedup_action'] == 'versioned'
+    assert result['version'] == 2
+    knowledge = knowledge_base.get_knowledge(knowledge_id)
+    assert knowledge['content'] == REVISED
+    assert [version['content'] for version in knowledge['versions']] == [ARTICLE]
+    hits = await knowledge_base.retrieve_knowledge('Sentence 12 now describes', top_k=1)
+    assert hits[0]['knowledge_id'] == knowledge_id
+
+@pytest.mark.asyncio
+async def test_delete_and_update_keep_detector_in_sync():
+    knowledge_base = make_knowledge_base('skip')
+    knowledge_id = (await knowledge_base.add_knowledge(document(ARTICLE)))['knowledge_id']
+    await knowledge_base.update_knowledge(knowledge_id, document(UNRELATED))
+    # The entry no longer looks like the article, so the article is new again
+    readded = await knowledge_base.add_knowledge(document(ARTICLE))
+    assert 'dedup_action' not in readded
+
+    knowledge_base.delete_knowledge(readded['knowledge_id'])
+    assert readded['knowledge_id'] not in knowledge_base.dedup
+    assert 'dedup_action' not in await knowledge_base.add_knowledge(document(REVISED))
+
+def test_signature_similarity_estimates_jaccard():
+    detector = DuplicateDetector(num_perm=256, bands=32)
+    first = detector.signature([ARTICLE])
+    assert detector.similarity(first, detector.signature([ARTICLE[:len(ARTICLE) // 2], ARTICLE[len(ARTICLE) // 2:]])) > 0.9
+    assert detector.similarity(first, detector.signature([UNRELATED])) < 0.1
+
+    detector.add('a', first)
+    assert detector.find(detector.signature([REVISED]))[0] == 'a'
+    assert detector.find(detector.signature([REVISED]), exclude='a') is None
+    detector.remove('a')
+    assert len(detector) == 0 and all(not bucket for bucket in detector._buckets)
+
+def test_settings_validation():
+    assert create_duplicate_detector({'enabled': False}) is None
+    with pytest.raises(ValueError):
+        create_duplicate_detector({'enabled': True, 'policy': 'overwrite'})
+    with pytest.raises(ValueError):
+        DuplicateDetector(num_perm=100, bands=16)
+
+def test_merge_metadata_unions_lists_and_keeps_scalars():
+    merged = merge_metadata({'tags': ['a'], 'owner': 'x'}, {'tags': ['a', 'b'], 'owner': 'y', 'new': 1})
+    assert merged == {'tags': ['a', 'b'], 'owner': 'x', 'new': 1}
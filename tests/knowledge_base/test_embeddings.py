@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from agents.knowledge_base.config import KnowledgeBaseConfig
+from agents.knowledge_base.core import KnowledgeBase
+from agents.knowledge_base.embeddings import CachedEmbedder, HashingEmbedder, create_embedder
+
+def test_hashing_embedder_is_deterministic():
+    embedder = HashingEmbedder(64)
+    first, second = embedder.embed(['memory safety', 'memory safety'])
+    assert first.shape == (64,)
+    assert np.array_equal(first, second)
+    assert np.any(first)
+
+def test_cached_embedder_only_embeds_misses():
+    embedder = CachedEmbedder(HashingEmbedder(32), batch_size=2)
+    vectors = embedder.embed(['a b', 'c d', 'a b'])
+    assert (embedder.hits, embedder.misses) == (0, 3)
+    assert np.array_equal(embedder.embed(['c d'])[0], vectors[1])
+    assert embedder.hits == 1
+    assert embedder.embed([]).shape == (0, 32)
+
+def test_hashing_provider_has_no_default_threshold():
+    embedder = create_embedder({'provider': 'hashing', 'dimension': 32})
+    assert embedder.similarity_threshold is None
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('query', ['What is Rust?', 'Rust is a systems programming language'])
+async def test_default_threshold_keeps_relevant_hashing_hits(query):
+    config = KnowledgeBaseConfig(
+        embedding_settings={'provider': 'hashing', 'dimension': 512, 'batch_size': 64, 'cache_path': None},
+        retrieval_config={**KnowledgeBaseConfig().retrieval_config, 'mode': 'vector'}
+    )
+    knowledge_base = KnowledgeBase(config)
+    rust = await knowledge_base.add_knowledge({
+        'content': 'Rust is a systems programming language focused on memory safety.',
+        'metadata': {}, 'source': 'test'})
+    await knowledge_base.add_knowledge({'content': 'Tea is brewed from leaves.', 'metadata': {}, 'source': 'test'})
+    results = await knowledge_base.retrieve_knowledge(query)
+    assert results[0]['knowledge_id'] == rust['knowledge_id']
+
+def test_explicit_threshold_overrides_provider_default():
+    config = KnowledgeBaseConfig(
+        embedding_settings={'provider': 'hashing', 'dimension': 32, 'batch_size': 64, 'cache_path': None},
+        retrieval_config={**KnowledgeBaseConfig().retrieval_config, 'similarity_threshold': 0.5}
+    )
+    assert KnowledgeBase(config)._similarity_threshold() == 0.5
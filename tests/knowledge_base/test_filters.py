@@ -0,0 +1,88 @@
+import pytest
+
+from agents.knowledge_base.config import KnowledgeBaseConfig
+from agents.knowledge_base.core import KnowledgeBase
+from agents.knowledge_base.filters import MetadataIndex, freeze_filters
+
+RECORDS = {
+    'k1': {'source': 'wiki', 'metadata': {'category': 'billing', 'tags': ['refund', 'card']},
+           'timestamp': '2024-01-01T00:00:00'},
+    'k2': {'source': 'faq', 'metadata': {'category': 'billing', 'tags': ['invoice']},
+           'timestamp': '2024-02-01T00:00:00'},
+    'k3': {'source': 'wiki', 'metadata': {'category': 'shipping', 'tags': ['refund']},
+           'timestamp': '2024-03-01T00:00:00'},
+    'k4': {'source': 'faq', 'metadata': {'category': 'shipping'}, 'timestamp': '2024-03-01T00:00:00'},
+}
+
+def make_index() -> MetadataIndex:
+    index = MetadataIndex()
+    for knowledge_id, record in RECORDS.items():
+        index.add(knowledge_id, record)
+    return index
+
+def test_any_of_within_a_field_and_all_of_across_fields():
+    index = make_index()
+    assert index.resolve(None) is None and index.resolve({}) is None
+    assert index.resolve({'category': 'billing'}) == {'k1', 'k2'}
+    assert index.resolve({'tags': ['invoice', 'card']}) == {'k1', 'k2'}
+    assert index.resolve({'category': 'billing', 'tags': 'refund'}) == {'k1'}
+    assert index.resolve({'source': 'faq', 'category': ['billing', 'shipping'], 'tags': 'refund'}) == set()
+    assert index.resolve({'tags': 'unknown'}) == set()
+    with pytest.raises(ValueError, match='author'):
+        index.resolve({'author': 'me'})
+
+def test_timestamp_ranges_are_inclusive():
+    index = make_index()
+    assert index.resolve({'timestamp_from': '2024-02-01T00:00:00'}) == {'k2', 'k3', 'k4'}
+    assert index.resolve({'timestamp_to': '2024-02-01T00:00:00'}) == {'k1', 'k2'}
+    assert index.resolve({'timestamp_from': '2024-03-01T00:00:00', 'timestamp_to': '2024-03-01T00:00:00'}) == \
+        {'k3', 'k4'}
+    assert index.resolve({'timestamp_from': '2024-01-15', 'timestamp_to': '2024-02-15'}) == {'k2'}
+    assert index.resolve({'timestamp_from': '2025-01-01'}) == set()
+    assert index.resolve({'category': 'shipping', 'timestamp_to': '2024-02-15'}) == set()
+    assert index.resolve({'tags': 'refund', 'timestamp_from': '2024-02-01'}) == {'k3'}
+
+def test_removal_and_replacement_leave_no_stale_entries():
+    index = make_index()
+    index.remove('k1')
+    index.remove('missing')
+    assert 'card' not in index.values['tags'] and index.values['tags']['refund'] == {'k3'}
+    assert [knowledge_id for _, knowledge_id in index.timestamps] == ['k2', 'k3', 'k4']
+    assert index.resolve({'timestamp_to': '2024-01-31'}) == set()
+
+    # Re-adding an id replaces its previous values and timestamp
+    index.add('k3', {'source': 'faq', 'metadata': {'category': 'billing'}, 'timestamp': '2024-04-01T00:00:00'})
+    assert index.resolve({'category': 'shipping'}) == {'k4'}
+    assert index.resolve({'source': 'wiki'}) == set() and 'wiki' not in index.values['source']
+    assert index.resolve({'timestamp_from': '2024-03-15'}) == {'k3'}
+    assert len(index.timestamps) == 3
+
+    for knowledge_id in ('k2', 'k3', 'k4'):
+        index.remove(knowledge_id)
+    assert index.timestamps == [] and all(not values for values in index.values.values())
+
+def test_round_trip_through_to_dict():
+    index = make_index()
+    restored = MetadataIndex.from_dict(index.to_dict())
+    assert restored.values == index.values and restored.timestamps == index.timestamps
+    for spec in ({'tags': ['refund', 'invoice']}, {'source': 'faq', 'timestamp_from': '2024-02-15'}):
+        assert restored.resolve(spec) == index.resolve(spec)
+
+def test_frozen_filters_ignore_order():
+    assert freeze_filters({'tags': ['b', 'a'], 'category': 'x'}) == freeze_filters({'category': 'x', 'tags': ('a', 'b')})
+    assert freeze_filters({}) is None
+
+@pytest.mark.asyncio
+async def test_deleted_entries_are_filtered_out_of_retrieval():
+    knowledge_base = KnowledgeBase(KnowledgeBaseConfig(
+        embedding_settings={'provider': 'hashing', 'dimension': 64, 'batch_size': 64, 'cache_path': None}
+    ))
+    ids = []
+    for category in ('billing', 'billing', 'shipping'):
+        result = await knowledge_base.add_knowledge({'content': f'Refund rules for {category} questions.',
+                                                     'metadata': {'category': category}, 'source': 'faq'})
+        ids.append(result['knowledge_id'])
+    knowledge_base.delete_knowledge(ids[0])
+    hits = await knowledge_base.retrieve_knowledge('refund rules', filters={'category': 'billing'})
+    assert [hit['knowledge_id'] for hit in hits] == [ids[1]]
+    assert knowledge_base.metadata_index.resolve({'category': 'billing'}) == {ids[1]}
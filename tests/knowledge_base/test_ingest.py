@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from agents.knowledge_base.config import KnowledgeBaseConfig
+from agents.knowledge_base.core import KnowledgeBase
+
+def make_knowledge_base(**embedding) -> KnowledgeBase:
+    return KnowledgeBase(KnowledgeBaseConfig(
+        embedding_settings={'provider': 'hashing', 'dimension': 32, 'batch_size': 64, 'cache_path': None, **embedding},
+        ingest_settings={**KnowledgeBaseConfig().ingest_settings, 'use_processes': False, 'group_size': 2,
+                         'batch_size': 4, 'queue_size': 4}
+    ))
+
+def documents(count: int):
+    for index in range(count):
+        yield {'content': f'Document number {index} about topic {index}.', 'metadata': {}, 'source': f's{index}'}
+
+def stray_tasks():
+    return [task for task in asyncio.all_tasks() if task is not asyncio.current_task() and not task.done()]
+
+@pytest.mark.asyncio
+async def test_batch_results_in_input_order_with_invalid_documents():
+    knowledge_base = make_knowledge_base()
+    source = list(documents(5))
+    source.insert(2, {'content': 'no metadata'})
+    summary = await knowledge_base.add_knowledge_batch(source)
+    assert summary['status'] == 'partial'
+    assert (summary['added'], summary['failed']) == (5, 1)
+    assert [result.get('index') for result in summary['results']][2] == 2
+    ids = [result['knowledge_id'] for result in summary['results'] if 'knowledge_id' in result]
+    assert ids == sorted(ids)
+    assert [knowledge_base.knowledge_store[knowledge_id]['source'] for knowledge_id in ids] == \
+        [f's{index}' for index in range(5)]
+
+@pytest.mark.asyncio
+async def test_failing_source_cancels_sibling_stages():
+    knowledge_base = make_knowledge_base()
+
+    def broken():
+        yield from documents(3)
+        raise RuntimeError('source failed')
+
+    with pytest.raises(RuntimeError, match='source failed'):
+        await knowledge_base.add_knowledge_batch(broken())
+    assert stray_tasks() == []
+
+@pytest.mark.asyncio
+async def test_failing_embedder_fails_only_its_batch():
+    knowledge_base = make_knowledge_base()
+    embed = knowledge_base.embedder.embed
+
+    def fail_on_topic_3(texts):
+        if any('topic 3.' in text for text in texts):
+            raise RuntimeError('embedding service down')
+        return embed(texts)
+
+    knowledge_base.embedder.embed = fail_on_topic_3
+    source = list(documents(8))
+    # Caller-supplied embeddings in the failing batch are still indexed
+    source[2]['embeddings'] = [[1.0] + [0.0] * 31]
+    summary = await asyncio.wait_for(knowledge_base.add_knowledge_batch(source), 10)
+    failed = [result['index'] for result in summary['results'] if 'error' in result]
+    assert 3 in failed and 2 not in failed and len(failed) < 8
+    assert all(result['error'] == 'embedding service down' for result in summary['results'] if 'error' in result)
+    assert (summary['status'], summary['added']) == ('partial', 8 - len(failed))
+    assert len(knowledge_base.knowledge_store) == 8 - len(failed)
+    assert stray_tasks() == []
+
+@pytest.mark.asyncio
+async def test_chunking_pool_is_reused_until_close():
+    defaults = KnowledgeBaseConfig()
+    knowledge_base = KnowledgeBase(KnowledgeBaseConfig(
+        embedding_settings={'provider': 'hashing', 'dimension': 32, 'batch_size': 64, 'cache_path': None},
+        ingest_settings={**defaults.ingest_settings, 'workers': 1, 'group_size': 2}
+    ))
+    assert (await knowledge_base.add_knowledge_batch(documents(4)))['added'] == 4
+    executor = knowledge_base._pipeline._executor
+    assert executor is not None
+    assert (await knowledge_base.add_knowledge_batch(documents(3)))['added'] == 3
+    assert knowledge_base._pipeline._executor is executor
+
+    # One-off options run on a pool of their own that is gone after the call
+    assert (await knowledge_base.add_knowledge_batch(documents(2), group_size=1))['added'] == 2
+    assert knowledge_base._pipeline._executor is executor
+
+    knowledge_base.close()
+    assert knowledge_base._pipeline is None
+    with pytest.raises(RuntimeError):
+        executor.submit(len, [])
@@ -0,0 +1,66 @@
+import math
+import unicodedata
+
+from agents.knowledge_base.lexical_index import InvertedIndex
+from agents.knowledge_base.utils import tokenize
+
+def test_tokenize_latin_words_and_cjk_bigrams():
+    assert tokenize('Hello_World 42') == ['hello_world', '42']
+    assert tokenize('东京天气') == ['东京', '京天', '天气']
+    assert tokenize('天') == ['天']
+    assert tokenize('Rust编程') == ['rust', '编程']
+
+def test_tokenize_keeps_non_ascii_scripts():
+    assert tokenize('Café in Москва') == ['café', 'in', 'москва']
+    assert tokenize('Ελληνικά naïve') == ['ελληνικά', 'naïve']
+
+def test_tokenize_normalizes_decomposed_accents():
+    decomposed = unicodedata.normalize('NFD', 'café')
+    assert decomposed != 'café'
+    assert tokenize(decomposed) == tokenize('café')
+
+def test_bm25_ranks_by_term_frequency_and_rarity():
+    index = InvertedIndex()
+    index.add('a', 'rust rust ownership')
+    index.add('b', 'rust python')
+    index.add('c', 'python scripting language')
+    scores = index.score('rust ownership')
+    assert set(scores) == {'a', 'b'}
+    assert scores['a'] > scores['b']
+    assert index.search('python', 1)[0][0] in {'b', 'c'}
+
+def test_bm25_matches_reference_formula():
+    index = InvertedIndex(k1=1.5, b=0.75)
+    index.add('a', 'alpha beta')
+    index.add('b', 'beta gamma delta')
+    idf = math.log(1 + (2 - 1 + 0.5) / (1 + 0.5))
+    norm = 1.5 * (1 - 0.75 + 0.75 * 2 / 2.5)
+    assert math.isclose(index.score('alpha')['a'], idf * 1 * 2.5 / (1 + norm))
+
+def test_cjk_and_cyrillic_queries_match():
+    index = InvertedIndex()
+    index.add('tokyo', '东京的天气很好')
+    index.add('moscow', 'Погода в Москве')
+    index.add('paris', 'Le café de Paris')
+    assert list(index.score('东京天气')) == ['tokyo']
+    assert list(index.score('москве')) == ['moscow']
+    assert list(index.score('CAFÉ')) == ['paris']
+
+def test_remove_and_replace_update_postings():
+    index = InvertedIndex()
+    index.add('a', 'alpha beta')
+    index.add('b', 'beta')
+    assert index.remove('a', 'alpha beta') == {'alpha', 'beta'}
+    assert 'alpha' not in index.postings
+    assert index.score('beta').keys() == {'b'}
+    assert index.total_length == 1
+    index.add('b', 'gamma')
+    assert index.score('beta') == {}
+    assert index.remove('missing') == set()
+
+def test_allowed_restricts_scoring():
+    index = InvertedIndex()
+    for chunk_id in 'abc':
+        index.add(chunk_id, 'shared term')
+    assert index.score('shared', allowed={'b'}).keys() == {'b'}
+    assert index.score('shared', allowed=set()) == {}
@@ -0,0 +1,148 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from agents.knowledge_base import KnowledgeBaseAgent
+from agents.knowledge_base.config import KnowledgeBaseConfig
+from agents.knowledge_base.core import KnowledgeBase
+from agents.knowledge_base.loaders import DirectoryLoader, parse_json, parse_markdown, parse_text
+
+DATA = Path(__file__).resolve().parents[2] / 'data' / 'knowledge_base.json'
+
+MARKDOWN = '''Intro before any heading.
+
+# Setup
+Install the tool.
+
+## Linux
+Use the package manager.
+
+```bash
+# not a heading
+apt install tool
+```
+
+# Usage
+Run it.
+'''
+
+def make_config() -> KnowledgeBaseConfig:
+    defaults = KnowledgeBaseConfig()
+    return KnowledgeBaseConfig(
+        embedding_settings={'provider': 'hashing', 'dimension': 64, 'batch_size': 64, 'cache_path': None},
+        ingest_settings={**defaults.ingest_settings, 'workers': 1, 'group_size': 2}
+    )
+
+def write_folder(path: Path) -> None:
+    (path / 'guides').mkdir()
+    (path / 'guides' / 'setup.md').write_text(MARKDOWN, encoding='utf-8')
+    (path / 'faq.json').write_text(json.dumps([{'title': 'Refunds', 'content': 'Refunds take five days.'},
+                                               {'title': 'Empty'}]), encoding='utf-8')
+    (path / 'notes.txt').write_text('First paragraph.\n\nSecond paragraph.', encoding='utf-8')
+    (path / 'knowledge_base.json').write_bytes(DATA.read_bytes())
+    (path / 'broken.json').write_text('{"categories": [', encoding='utf-8')
+    (path / 'table.csv').write_text('a,b\n1,2\n', encoding='utf-8')
+
+def test_parse_json_reads_the_gbk_categories_layout():
+    documents = list(parse_json(str(DATA)))
+    assert len(documents) == 3
+    first = documents[0]
+    assert first['content'] == '产品A使用指南\n1. 安装步骤\n2. 基本功能\n3. 常见问题'
+    assert first['metadata']['category'] == '产品知识' and first['metadata']['tags'] == ['使用指南', '教程']
+    assert 'content' not in first['metadata'] and first['source'] == str(DATA)
+    assert documents[2]['metadata']['category'] == '故障排除'
+
+def test_parse_json_lists_and_single_entries(tmp_path):
+    listed = tmp_path / 'list.json'
+    listed.write_text(json.dumps([{'content': 'a', 'tags': ['x']}, {'title': 'no content'}, 'stray']))
+    assert [(document['content'], document['metadata']) for document in parse_json(str(listed))] == \
+        [('a', {'tags': ['x']})]
+
+    single = tmp_path / 'single.json'
+    single.write_text(json.dumps({'title': 'T', 'content': 'body'}))
+    assert [document['content'] for document in parse_json(str(single))] == ['T\nbody']
+
+    other = tmp_path / 'other.json'
+    other.write_text(json.dumps({'rows': []}))
+    assert list(parse_json(str(other))) == []
+
+def test_parse_markdown_splits_at_headings_outside_code(tmp_path):
+    path = tmp_path / 'setup.md'
+    path.write_text(MARKDOWN, encoding='utf-8')
+    documents = list(parse_markdown(str(path)))
+    assert [document['metadata'] for document in documents] == [
+        {'title': 'setup', 'headings': []},
+        {'title': 'Setup', 'headings': ['Setup']},
+        {'title': 'Linux', 'headings': ['Setup', 'Linux']},
+        {'title': 'Usage', 'headings': ['Usage']},
+    ]
+    assert documents[2]['content'].startswith('## Linux') and '# not a heading' in documents[2]['content']
+    assert documents[3]['content'] == '# Usage\nRun it.'
+
+def test_parse_text_sections(tmp_path):
+    path = tmp_path / 'notes.txt'
+    path.write_text('\n\n'.join(f'Paragraph {i}.' for i in range(6)), encoding='utf-8')
+    sections = list(parse_text(str(path), section_size=30))
+    assert [section['metadata']['section'] for section in sections] == list(range(len(sections)))
+    assert len(sections) > 1
+    assert '\n\n'.join(section['content'] for section in sections) == path.read_text()
+
+@pytest.mark.asyncio
+async def test_one_bad_file_does_not_stop_the_others(tmp_path):
+    write_folder(tmp_path)
+    loader = DirectoryLoader(tmp_path, workers=2, use_processes=False)
+    documents = [document async for document in loader.load()]
+
+    assert loader.files_failed == [str(tmp_path / 'broken.json')]
+    assert loader.files_loaded == 4
+    by_source = {}
+    for document in documents:
+        by_source.setdefault(Path(document['source']).name, []).append(document)
+    assert sorted(by_source) == ['faq.json', 'knowledge_base.json', 'notes.txt', 'setup.md']
+    assert len(by_source['knowledge_base.json']) == 3 and len(by_source['setup.md']) == 4
+
+@pytest.mark.asyncio
+async def test_files_stream_into_the_batch_with_bounded_parsing(tmp_path):
+    for index in range(12):
+        (tmp_path / f'{index:02}.txt').write_text(f'Note {index} about topic {index}.', encoding='utf-8')
+    parsed = []
+
+    def recording_parser(path):
+        parsed.append(path)
+        return parse_text(path)
+
+    loader = DirectoryLoader(tmp_path, parsers={'.txt': recording_parser}, workers=2, max_pending=2,
+                             use_processes=False)
+    yielded = []
+
+    async def source():
+        async for document in loader.load():
+            # Never more than max_pending files parsed ahead of the consumer
+            assert len(parsed) <= len(yielded) + 2
+            yielded.append(document['source'])
+            yield document
+
+    knowledge_base = KnowledgeBase(make_config())
+    summary = await knowledge_base.add_knowledge_batch(source(), use_processes=False)
+    assert (summary['added'], summary['failed']) == (12, 0)
+    assert sorted(yielded) == sorted(parsed) == [str(tmp_path / f'{index:02}.txt') for index in range(12)]
+    assert {knowledge['source'] for knowledge in knowledge_base.knowledge_store.values()} == set(parsed)
+
+@pytest.mark.asyncio
+async def test_build_index_loads_every_format(tmp_path):
+    write_folder(tmp_path)
+
+    async def answer(query: str, context: str) -> str:
+        return context
+
+    agent = KnowledgeBaseAgent('', make_config(), answer_generator=answer)
+    result = await agent.build_index(tmp_path, workers=2)
+    assert (result['files_loaded'], result['files_failed']) == (4, [str(tmp_path / 'broken.json')])
+    assert (result['status'], result['added'], result['failed']) == ('success', 9, 0)
+
+    hits = await agent.index.retrieve_knowledge('Refunds take five days', top_k=1)
+    assert hits[0]['metadata']['title'] == 'Refunds'
+    categories = {knowledge['metadata'].get('category') for knowledge in agent.index.knowledge_store.values()}
+    assert {'产品知识', '故障排除'} <= categories
+    agent.index.close()
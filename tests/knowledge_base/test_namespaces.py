@@ -0,0 +1,97 @@
+import pytest
+
+from agents.knowledge_base.config import KnowledgeBaseConfig
+from agents.knowledge_base.namespaces import NamespacedKnowledgeBase
+
+def make_namespaces(path, backend: str = 'mmap', namespace_settings: dict = None,
+                    **knowledge_settings) -> NamespacedKnowledgeBase:
+    defaults = KnowledgeBaseConfig()
+    return NamespacedKnowledgeBase(KnowledgeBaseConfig(
+        embedding_settings={'provider': 'hashing', 'dimension': 64, 'batch_size': 64, 'cache_path': None},
+        knowledge_settings={**defaults.knowledge_settings, **knowledge_settings},
+        storage_settings={**defaults.storage_settings, 'backend': backend, 'path': str(path)},
+        namespace_settings={**defaults.namespace_settings, **(namespace_settings or {})}
+    ))
+
+def document(index: int) -> dict:
+    content = ' '.join(f'Ticket {index} step {i} resets router {i % 4} in region {index % 3}.' for i in range(12))
+    return {'content': content, 'metadata': {}, 'source': 'support'}
+
+async def populate(namespaces: NamespacedKnowledgeBase, name: str, count: int) -> list:
+    return [(await namespaces.add_knowledge(name, document(index)))['knowledge_id'] for index in range(count)]
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('backend,settings', [
+    ('mmap', {}),
+    ('mmap', {'index_type': 'int8', 'quantizer_train_size': 16, 'rescore': True}),
+    ('sqlite', {'index_type': 'int8', 'quantizer_train_size': 16}),
+    ('mmap', {'snapshot_isolation': True})
+])
+async def test_quota_usage_survives_unload_and_reload(tmp_path, backend, settings):
+    namespaces = make_namespaces(tmp_path, backend, **settings)
+    ids = await populate(namespaces, 'acme', 30)
+    for knowledge_id in ids[:8]:
+        namespaces.delete_knowledge('acme', knowledge_id)
+    await namespaces.update_knowledge('acme', ids[8], document(99))
+    before = namespaces.quota_usage('acme')
+
+    assert namespaces.unload('acme')
+    assert namespaces.memory_usage('acme') == {'total': 0}
+    # Reloading measures the store afresh and lands on the same figure
+    assert namespaces.quota_usage('acme') == before
+    assert 'acme' in namespaces.loaded()
+    namespaces.close()
+
+@pytest.mark.asyncio
+async def test_quota_holds_after_reload(tmp_path):
+    namespaces = make_namespaces(tmp_path, index_type='int8', quantizer_train_size=16, rescore=True)
+    ids = await populate(namespaces, 'acme', 20)
+    namespaces.set_quota('acme', namespaces.quota_usage('acme'))
+    with pytest.raises(ValueError):
+        await namespaces.add_knowledge('acme', document(50))
+
+    # Memory-mapping the vectors on reload must not free up quota
+    namespaces.unload('acme')
+    with pytest.raises(ValueError):
+        await namespaces.add_knowledge('acme', document(50))
+
+    namespaces.delete_knowledge('acme', ids[0])
+    await namespaces.add_knowledge('acme', document(50))
+    namespaces.close()
+
+@pytest.mark.asyncio
+async def test_quota_override_and_default(tmp_path):
+    namespaces = make_namespaces(tmp_path, namespace_settings={'quota_bytes': 1})
+    await namespaces.add_knowledge('acme', document(0))
+    with pytest.raises(ValueError):
+        await namespaces.add_knowledge('acme', document(1))
+    namespaces.set_quota('acme', None)
+    await namespaces.add_knowledge('acme', document(1))
+    assert namespaces.quota('acme') is None and namespaces.quota('globex') == 1
+    namespaces.close()
+
+@pytest.mark.asyncio
+async def test_batch_stops_taking_documents_at_the_quota(tmp_path):
+    namespaces = make_namespaces(tmp_path)
+    await populate(namespaces, 'acme', 2)
+    namespaces.set_quota('acme', namespaces.quota_usage('acme') * 3)
+
+    result = await namespaces.add_knowledge_batch('acme', (document(index) for index in range(2, 200)),
+                                                  batch_size=1, queue_size=1)
+    assert result['quota_exceeded']
+    assert len(namespaces.namespace('acme').knowledge_store) < 198
+    namespaces.close()
+
+@pytest.mark.asyncio
+async def test_least_recently_used_namespaces_are_unloaded(tmp_path):
+    namespaces = make_namespaces(tmp_path, namespace_settings={'max_loaded': 2})
+    for name in ('a', 'b', 'c'):
+        await namespaces.add_knowledge(name, document(0))
+    assert namespaces.loaded() == ['b', 'c']
+    assert namespaces.namespaces() == ['a', 'b', 'c']
+
+    hits = await namespaces.retrieve_knowledge('a', 'router region', top_k=1)
+    assert len(hits) == 1
+    assert namespaces.loaded() == ['c', 'a']
+    assert namespaces.stats()['unloads'] == 2
+    namespaces.close()
@@ -0,0 +1,159 @@
+import threading
+
+import numpy as np
+import pytest
+
+from agents.knowledge_base.config import KnowledgeBaseConfig
+from agents.knowledge_base.core import KnowledgeBase
+from agents.knowledge_base.persistence import MmapStorage
+
+TOPICS = ['invoices', 'shipping', 'returns', 'warranty', 'loyalty', 'payments']
+
+def make_knowledge_base(path, checkpoint_interval: int = 1000, **knowledge_settings) -> KnowledgeBase:
+    defaults = KnowledgeBaseConfig()
+    return KnowledgeBase(KnowledgeBaseConfig(
+        embedding_settings={'provider': 'hashing', 'dimension': 64, 'batch_size': 64, 'cache_path': None},
+        knowledge_settings={**defaults.knowledge_settings, 'chunk_size': 120, 'chunk_overlap': 0,
+                            **knowledge_settings},
+        retrieval_config={**defaults.retrieval_config, 'cache_size': 0},
+        dedup_settings={**defaults.dedup_settings, 'enabled': True},
+        storage_settings={**defaults.storage_settings, 'backend': 'mmap', 'path': str(path),
+                          'checkpoint_interval': checkpoint_interval}
+    ))
+
+def document(index: int) -> dict:
+    topic = TOPICS[index % len(TOPICS)]
+    content = ' '.join(f'Section {i} of the {topic} policy, revision {index}, covers {topic} case {i}.'
+                       for i in range(6))
+    return {'content': content, 'metadata': {'category': f'c{index % 2}', 'tags': [topic]}, 'source': topic}
+
+async def populate(knowledge_base: KnowledgeBase, indexes) -> list:
+    return [(await knowledge_base.add_knowledge(document(index)))['knowledge_id'] for index in indexes]
+
+def contents(knowledge_base: KnowledgeBase) -> dict:
+    return {knowledge_id: knowledge['content'] for knowledge_id, knowledge in knowledge_base.knowledge_store.items()}
+
+@pytest.mark.asyncio
+async def test_round_trip_without_pickle(tmp_path):
+    knowledge_base = make_knowledge_base(tmp_path, index_type='int8', quantizer_train_size=16)
+    ids = await populate(knowledge_base, range(12))
+    knowledge_base.checkpoint()
+    # Writes after the checkpoint are only in the log
+    await knowledge_base.update_knowledge(ids[0], document(100))
+    knowledge_base.delete_knowledge(ids[1])
+    expected = contents(knowledge_base)
+    record = knowledge_base.get_knowledge(ids[2])
+    hits = await knowledge_base.retrieve_knowledge('shipping policy case 3', top_k=3, filters={'category': 'c1'})
+    usage = knowledge_base.memory_usage()
+    knowledge_base.close()
+
+    assert not list(tmp_path.rglob('*.pkl'))
+    reopened = make_knowledge_base(tmp_path, index_type='int8', quantizer_train_size=16)
+    # Records are decoded on access, not at open; replaying the update read only the one it touched
+    assert set(reopened.knowledge_store._cache) == {ids[0]}
+    assert contents(reopened) == expected
+    restored = reopened.get_knowledge(ids[2])
+    assert np.array_equal(restored['chunk_spans'], record['chunk_spans'])
+    assert np.array_equal(restored['chunk_tokens'], record['chunk_tokens'])
+    assert restored['metadata'] == record['metadata'] and restored['timestamp'] == record['timestamp']
+
+    # Only the update replayed from the log is embedded again
+    assert reopened.embedder.misses == len(reopened.get_knowledge(ids[0])['chunk_hashes'])
+    assert reopened.memory_usage()['content'] == usage['content']
+    assert [hit['knowledge_id'] for hit in await reopened.retrieve_knowledge(
+        'shipping policy case 3', top_k=3, filters={'category': 'c1'})] == [hit['knowledge_id'] for hit in hits]
+    assert reopened.dedup.find(reopened.dedup.signature(reopened.get_chunks(ids[3])))[0] == ids[3]
+    reopened.close()
+
+@pytest.mark.asyncio
+async def test_log_is_replayed_after_a_crash_between_checkpoints(tmp_path):
+    knowledge_base = make_knowledge_base(tmp_path, checkpoint_interval=5)
+    ids = await populate(knowledge_base, range(12))
+    knowledge_base.storage.wait()
+    knowledge_base.delete_knowledge(ids[4])
+    await knowledge_base.update_knowledge(ids[5], document(50))
+    expected = contents(knowledge_base)
+    generation = knowledge_base.storage.generation
+    # No close: the process dies with a torn write at the end of the log
+    with open(tmp_path / f'oplog-{knowledge_base.storage.log_generation}.jsonl', 'a') as f:
+        f.write('{"op": "add", "knowl')
+
+    reopened = make_knowledge_base(tmp_path, checkpoint_interval=5)
+    assert reopened.storage.generation == generation
+    assert reopened.storage.pending_operations > 0
+    assert contents(reopened) == expected
+    # The torn tail is cut off, so later writes land on a clean line
+    [added] = await populate(reopened, [60])
+    reopened.close()
+
+    again = make_knowledge_base(tmp_path)
+    assert contents(again) == {**expected, added: document(60)['content']}
+    again.close()
+
+@pytest.mark.asyncio
+async def test_failed_snapshot_leaves_current_on_the_previous_one(tmp_path, monkeypatch):
+    knowledge_base = make_knowledge_base(tmp_path)
+    ids = await populate(knowledge_base, range(6))
+    generation = knowledge_base.checkpoint()['generation']
+    await populate(knowledge_base, range(6, 9))
+
+    write_json = MmapStorage._write_json
+
+    def crash_on_manifest(path, value):
+        if path.name == 'manifest.json':
+            raise OSError('disk full')
+        write_json(path, value)
+
+    monkeypatch.setattr(MmapStorage, '_write_json', staticmethod(crash_on_manifest))
+    with pytest.raises(OSError):
+        knowledge_base.checkpoint()
+    # The half-written snapshot is there, but CURRENT never moved to it
+    assert (tmp_path / f'snapshot-{generation + 1}' / 'records.jsonl').exists()
+    assert (tmp_path / 'CURRENT').read_text() == str(generation)
+    knowledge_base.delete_knowledge(ids[0])
+    expected = contents(knowledge_base)
+    knowledge_base.close()
+    monkeypatch.undo()
+
+    reopened = make_knowledge_base(tmp_path)
+    assert contents(reopened) == expected
+    assert not (tmp_path / f'snapshot-{generation + 1}').exists()
+    # The next checkpoint folds every log since the live snapshot in
+    generation = reopened.checkpoint()['generation']
+    assert sorted(path.name for path in tmp_path.iterdir()) == \
+           ['CURRENT', 'config.json', f'oplog-{generation}.jsonl', f'snapshot-{generation}']
+    reopened.close()
+    assert contents(make_knowledge_base(tmp_path)) == expected
+
+@pytest.mark.asyncio
+async def test_checkpoints_are_written_in_the_background(tmp_path, monkeypatch):
+    release = threading.Event()
+    write_snapshot = MmapStorage._write_snapshot
+
+    def slow_write(self, generation, state):
+        release.wait(5)
+        write_snapshot(self, generation, state)
+
+    monkeypatch.setattr(MmapStorage, '_write_snapshot', slow_write)
+    knowledge_base = make_knowledge_base(tmp_path, checkpoint_interval=5)
+    ids = await populate(knowledge_base, range(5))
+    storage = knowledge_base.storage
+    assert storage._writing is not None and storage.generation == 0
+
+    # Writes and reads go on while the snapshot is being written
+    ids += await populate(knowledge_base, range(5, 8))
+    knowledge_base.delete_knowledge(ids[0])
+    assert not storage.should_checkpoint()
+    [hit] = await knowledge_base.retrieve_knowledge('returns policy', top_k=1)
+    assert knowledge_base.get_knowledge(hit['knowledge_id'])['source'] == 'returns'
+
+    release.set()
+    storage.wait()
+    assert storage.generation == 1
+    # Records in the snapshot are read back from it rather than held in memory
+    assert set(knowledge_base.knowledge_store._changed) == set(ids[5:])
+    expected = contents(knowledge_base)
+    assert ids[0] not in expected and len(expected) == 7
+    knowledge_base.close()
+
+    assert contents(make_knowledge_base(tmp_path)) == expected
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from agents.knowledge_base.quantization import QuantizedIndex
+from agents.knowledge_base.vector_index import create_vector_index
+
+def clustered(count: int, dim: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(16, dim))
+    vectors = centers[rng.integers(0, 16, count)] + 0.3 * rng.normal(size=(count, dim))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+def ids(count: int) -> list:
+    return [f'chunk-{i}' for i in range(count)]
+
+def test_int8_does_not_keep_originals_by_default():
+    vectors = clustered(600, 64)
+    index = QuantizedIndex(quantizer='int8', min_train_size=500)
+    index.add(ids(600), vectors)
+
+    assert index.is_trained
+    assert index.memory_usage() == {'codes': 600 * 64, 'originals': 0}
+    hits = index.search(vectors[7], 5)
+    assert hits[0][0] == 'chunk-7'
+    assert hits[0][1] == pytest.approx(1.0, abs=0.02)
+
+def test_rescoring_is_opt_in_and_exact():
+    vectors = clustered(600, 64)
+    index = QuantizedIndex(quantizer='int8', rescore=True, min_train_size=500)
+    index.add(ids(600), vectors)
+
+    assert index.memory_usage()['originals'] == 600 * 64 * 4
+    hits = index.search(vectors[3], 5)
+    assert hits[0] == ('chunk-3', pytest.approx(1.0, abs=1e-5))
+    assert index.estimate_recall(vectors[:20], top_k=5) >= 0.9
+
+def test_create_vector_index_defaults_to_no_rescoring():
+    index = create_vector_index({'index_type': 'int8', 'quantizer_train_size': 8})
+    index.add(ids(10), clustered(10, 32))
+    assert index.is_trained
+    assert index.memory_usage()['originals'] == 0
+
+@pytest.mark.parametrize('dim,expected', [(100, 50), (97, 1), (384, 96)])
+def test_pq_subvectors_fall_back_to_a_divisor(dim, expected):
+    index = QuantizedIndex(quantizer='pq', quantizer_options={'subvectors': 96}, min_train_size=256)
+    vectors = clustered(300, dim)
+    index.add(ids(300), vectors)
+
+    assert index.quantizer_options['subvectors'] == expected
+    assert index.is_trained and len(index) == 300
+    assert 'chunk-11' in {item_id for item_id, _ in index.search(vectors[11], 10)}
+
+def test_pq_dimension_is_checked_when_given_upfront():
+    index = QuantizedIndex(dim=100, quantizer='pq', quantizer_options={'subvectors': 96})
+    assert index.quantizer_options['subvectors'] == 50
+
+def test_pq_waits_for_enough_vectors_to_train():
+    index = QuantizedIndex(quantizer='pq', quantizer_options={'subvectors': 8}, min_train_size=16)
+    index.add(ids(100), clustered(100, 32))
+    # Too few vectors for 256 centroids per sub-space: stay exact instead of failing mid-add
+    assert not index.is_trained
+    assert len(index) == 100
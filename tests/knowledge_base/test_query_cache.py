@@ -0,0 +1,195 @@
+import threading
+
+import numpy as np
+import pytest
+
+from agents.knowledge_base import KnowledgeBaseAgent
+from agents.knowledge_base.cache import QueryCache, SemanticCache
+from agents.knowledge_base.config import KnowledgeBaseConfig
+from agents.knowledge_base.core import KnowledgeBase
+
+def add(knowledge_base: KnowledgeBase, content: str, metadata=None):
+    return knowledge_base.add_knowledge({'content': content, 'metadata': metadata or {}, 'source': 'test'})
+
+def test_query_cache_lru_ttl_and_validity(monkeypatch):
+    cache = QueryCache(max_size=2, ttl=10)
+    cache.put('a', 1, generation=0)
+    cache.put('b', 2, generation=0)
+    assert cache.get('a') == 1
+    cache.put('c', 3, generation=0)
+    assert cache.get('b') is None and cache.evictions == 1
+    assert cache.get('a', lambda entry: False) is None and cache.invalidations == 1
+
+    now = [1000.0]
+    monkeypatch.setattr('agents.knowledge_base.cache.time.monotonic', lambda: now[0])
+    cache.put('d', 4, generation=0)
+    now[0] += 11
+    assert cache.get('d') is None and cache.expirations == 1
+
+def test_zero_size_cache_stores_nothing():
+    cache = QueryCache(max_size=0)
+    cache.put('a', 1, generation=0)
+    assert cache.get('a') is None
+
+@pytest.mark.asyncio
+async def test_repeated_and_normalized_queries_hit():
+    knowledge_base = KnowledgeBase()
+    await add(knowledge_base, 'Python is a programming language')
+    await knowledge_base.retrieve_knowledge('Python')
+    await knowledge_base.retrieve_knowledge('  python ')
+    assert knowledge_base.cache_stats()['hits'] == 1
+
+@pytest.mark.asyncio
+async def test_unrelated_write_keeps_entry():
+    knowledge_base = KnowledgeBase()
+    await add(knowledge_base, 'Python is a programming language')
+    await knowledge_base.retrieve_knowledge('python')
+    await add(knowledge_base, 'Rust is fast')
+    await knowledge_base.retrieve_knowledge('python')
+    assert knowledge_base.cache_stats()['hits'] == 1
+
+@pytest.mark.asyncio
+async def test_write_to_query_term_invalidates():
+    knowledge_base = KnowledgeBase()
+    await add(knowledge_base, 'Java is another language')
+    assert len(await knowledge_base.retrieve_knowledge('java')) == 1
+    await add(knowledge_base, 'java beans')
+    assert len(await knowledge_base.retrieve_knowledge('java')) == 2
+    assert knowledge_base.cache_stats()['invalidations'] == 1
+
+@pytest.mark.asyncio
+async def test_update_of_returned_entry_invalidates():
+    knowledge_base = KnowledgeBase()
+    knowledge_id = (await add(knowledge_base, 'Python is a programming language'))['knowledge_id']
+    await knowledge_base.retrieve_knowledge('python')
+    await knowledge_base.update_knowledge(knowledge_id, {'content': 'Python is a programming language',
+                                                         'metadata': {'version': 2}, 'source': 'test'})
+    results = await knowledge_base.retrieve_knowledge('python')
+    assert results[0]['metadata'] == {'version': 2}
+
+@pytest.mark.asyncio
+async def test_delete_invalidates():
+    knowledge_base = KnowledgeBase()
+    knowledge_id = (await add(knowledge_base, 'Python is a programming language'))['knowledge_id']
+    assert await knowledge_base.retrieve_knowledge('python')
+    knowledge_base.delete_knowledge(knowledge_id)
+    assert await knowledge_base.retrieve_knowledge('python') == []
+
+@pytest.mark.asyncio
+async def test_metadata_change_invalidates_filtered_queries():
+    knowledge_base = KnowledgeBase()
+    await add(knowledge_base, 'Python is a programming language', {'category': 'code'})
+    other = (await add(knowledge_base, 'Tea is a drink', {'category': 'food'}))['knowledge_id']
+    assert len(await knowledge_base.retrieve_knowledge('python', filters={'category': 'code'})) == 1
+    await knowledge_base.update_knowledge(other, {'content': 'Tea is a drink, python is a snake',
+                                                  'metadata': {'category': 'code'}, 'source': 'test'})
+    assert len(await knowledge_base.retrieve_knowledge('python', filters={'category': 'code'})) == 2
+
+def test_semantic_cache_matches_by_similarity_within_a_partition():
+    cache = SemanticCache(max_size=4, threshold=0.9)
+    cache.put([1.0, 0.0, 0.0], 'east', generation=0, partition='a')
+    value, similarity = cache.get([0.95, 0.2, 0.0], 'a')
+    assert value == 'east' and 0.9 < similarity < 1.0
+    # Below the threshold, in another partition or with no entries at all: a miss
+    assert cache.get([0.7, 0.7, 0.0], 'a') is None
+    assert cache.get([1.0, 0.0, 0.0], 'b') is None
+    assert cache.get([1.0, 0.0, 0.0]) is None
+    assert (cache.hits, cache.misses) == (1, 3)
+
+    cache.put([0.0, 1.0, 0.0], 'north', generation=0, partition='a')
+    cache.put([0.9, 0.1, 0.0], 'east-ish', generation=1, partition='a')
+    assert cache.get([0.9, 0.1, 0.0], 'a')[0] == 'east-ish'
+    # An invalid candidate is dropped and the next best one is used
+    assert cache.get([0.9, 0.1, 0.0], 'a', lambda entry: entry.generation == 0)[0] == 'east'
+    assert cache.invalidations == 1 and len(cache) == 2
+
+def make_agent(**knowledge_settings) -> KnowledgeBaseAgent:
+    defaults = KnowledgeBaseConfig()
+    answers = []
+
+    async def answer(query: str, context: str) -> str:
+        answers.append(context)
+        return f'answer {len(answers)}'
+
+    agent = KnowledgeBaseAgent('', KnowledgeBaseConfig(
+        embedding_settings={'provider': 'hashing', 'dimension': 256, 'batch_size': 64, 'cache_path': None},
+        knowledge_settings={**defaults.knowledge_settings, **knowledge_settings},
+        retrieval_config={**defaults.retrieval_config, 'mode': 'vector', 'similarity_threshold': None}
+    ), answer_generator=answer)
+    agent.index = KnowledgeBase(agent.config)
+    agent.answers = answers
+    return agent
+
+@pytest.mark.asyncio
+async def test_answer_cache_hits_paraphrases_and_partitions_by_filter():
+    agent = make_agent()
+    await add(agent.index, 'Refunds are issued within 14 days of a return', {'category': 'billing'})
+    await add(agent.index, 'Parcels ship from the Berlin warehouse', {'category': 'shipping'})
+
+    first = await agent.query_knowledge('How long do refunds take?')
+    assert not first['cached']
+    again = await agent.query_knowledge('how long do refunds take')
+    assert again['cached'] and again['answer'] == first['answer'] and again['similarity'] >= 0.92
+    assert not (await agent.query_knowledge('Where do parcels ship from?'))['cached']
+
+    # Each filter spec has its own cache partition
+    filtered = await agent.query_knowledge('How long do refunds take?', filters={'category': 'billing'})
+    assert not filtered['cached']
+    assert (await agent.query_knowledge('How long do refunds take?', filters={'category': 'billing'}))['cached']
+    assert len(agent.answers) == 3
+
+@pytest.mark.asyncio
+async def test_write_to_a_source_invalidates_the_answer():
+    agent = make_agent()
+    knowledge_id = (await add(agent.index, 'Refunds are issued within 14 days of a return'))['knowledge_id']
+    first = await agent.query_knowledge('How long do refunds take?')
+    assert first['sources'][0]['knowledge_id'] == knowledge_id
+
+    await agent.index.update_knowledge(knowledge_id, {'content': 'Refunds are issued within 30 days of a return',
+                                                      'metadata': {}, 'source': 'test'})
+    second = await agent.query_knowledge('How long do refunds take?')
+    assert not second['cached'] and '30 days' in agent.answers[-1]
+    assert agent.answer_cache.invalidations == 1
+
+@pytest.mark.asyncio
+async def test_answer_is_tagged_with_the_snapshot_it_read():
+    agent = make_agent(snapshot_isolation=True, refresh_interval=60.0)
+    await add(agent.index, 'Refunds are issued within 14 days of a return')
+    await agent.query_knowledge('refund days')
+    await add(agent.index, 'Refund requests need the order number')
+
+    # Another thread is mid-write, so the query reads the last published snapshot without the new entry
+    segments = agent.index.segments
+    locked, release = threading.Event(), threading.Event()
+
+    def writer():
+        with segments.lock:
+            locked.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    locked.wait(5)
+    stale = await agent.query_knowledge('refund days and order number')
+    release.set()
+    thread.join()
+    assert not stale['cached'] and 'order number' not in agent.answers[-1]
+
+    # Once the write is published the stale answer must not be served
+    fresh = await agent.query_knowledge('refund days and order number')
+    assert not fresh['cached'] and 'order number' in agent.answers[-1]
+    agent.index.close()
+
+@pytest.mark.asyncio
+async def test_dependencies_record_the_lexical_fallback():
+    knowledge_base = KnowledgeBase(KnowledgeBaseConfig(
+        embedding_settings={'provider': 'hashing', 'dimension': 64, 'batch_size': 64, 'cache_path': None},
+        retrieval_config={**KnowledgeBaseConfig().retrieval_config, 'similarity_threshold': 0.999}
+    ))
+    await add(knowledge_base, 'Python is a programming language')
+    retrieval = await knowledge_base.retrieve_with_dependencies('python language')
+    assert retrieval.value and retrieval.dependencies['mode'] == 'hybrid'
+    assert retrieval.generation == knowledge_base.generation
+    # A query cache hit reports the same dependencies
+    cached = await knowledge_base.retrieve_with_dependencies('python language')
+    assert cached.dependencies == retrieval.dependencies and cached.value == retrieval.value
@@ -0,0 +1,107 @@
+import pytest
+
+from agents.knowledge_base.config import KnowledgeBaseConfig
+from agents.knowledge_base.core import KnowledgeBase
+
+DOCUMENTS = [
+    'Rust is a systems programming language focused on memory safety and ownership.',
+    'Python is a dynamically typed language popular for data science and scripting.',
+    'PostgreSQL is a relational database with strong transactional guarantees.',
+]
+
+def make_knowledge_base(**retrieval) -> KnowledgeBase:
+    return KnowledgeBase(KnowledgeBaseConfig(
+        embedding_settings={'provider': 'hashing', 'dimension': 256, 'batch_size': 64, 'cache_path': None},
+        retrieval_config={**KnowledgeBaseConfig().retrieval_config, **retrieval}
+    ))
+
+async def add_documents(knowledge_base: KnowledgeBase) -> list:
+    ids = []
+    for content in DOCUMENTS:
+        result = await knowledge_base.add_knowledge({'content': content, 'metadata': {}, 'source': 'test'})
+        ids.append(result['knowledge_id'])
+    return ids
+
+@pytest.mark.asyncio
+async def test_auto_mode_falls_back_to_lexical_below_threshold():
+    knowledge_base = make_knowledge_base(mode='auto', similarity_threshold=0.99)
+    ids = await add_documents(knowledge_base)
+    results = await knowledge_base.retrieve_knowledge('What is Rust?')
+    assert results and results[0]['knowledge_id'] == ids[0]
+
+@pytest.mark.asyncio
+async def test_explicit_vector_mode_keeps_threshold():
+    knowledge_base = make_knowledge_base(mode='vector', similarity_threshold=0.99)
+    await add_documents(knowledge_base)
+    assert await knowledge_base.retrieve_knowledge('What is Rust?') == []
+
+@pytest.mark.asyncio
+async def test_fallback_results_are_invalidated_by_lexical_writes():
+    knowledge_base = make_knowledge_base(mode='auto', similarity_threshold=0.99)
+    await add_documents(knowledge_base)
+    before = await knowledge_base.retrieve_knowledge('borrow checker')
+    added = await knowledge_base.add_knowledge({'content': 'The Rust borrow checker enforces ownership rules.',
+                                                'metadata': {}, 'source': 'test'})
+    after = await knowledge_base.retrieve_knowledge('borrow checker')
+    assert before == []
+    assert [result['knowledge_id'] for result in after] == [added['knowledge_id']]
+
+WORDS = ['walrus', 'juniper', 'quartz', 'lantern', 'meadow', 'falcon', 'harbor', 'cobalt']
+
+async def add_sections(knowledge_base: KnowledgeBase) -> tuple:
+    content = ' '.join(f'Section {i} of the field guide is all about the {word}.' for i, word in enumerate(WORDS))
+    result = await knowledge_base.add_knowledge({'content': content, 'metadata': {}, 'source': 'guide'})
+    return result['knowledge_id'], content
+
+def make_chunked_knowledge_base(mode: str) -> KnowledgeBase:
+    defaults = KnowledgeBaseConfig()
+    return KnowledgeBase(KnowledgeBaseConfig(
+        embedding_settings={'provider': 'hashing', 'dimension': 256, 'batch_size': 64, 'cache_path': None},
+        knowledge_settings={**defaults.knowledge_settings, 'chunk_size': 70, 'chunk_overlap': 0,
+                            'chunk_boundary': 'sentence'},
+        retrieval_config={**defaults.retrieval_config, 'mode': mode, 'similarity_threshold': None, 'cache_size': 0}
+    ))
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('mode', ['lexical', 'hybrid'])
+async def test_chunk_results_carry_their_offsets(mode):
+    knowledge_base = make_chunked_knowledge_base(mode)
+    knowledge_id, content = await add_sections(knowledge_base)
+    spans = knowledge_base.get_knowledge(knowledge_id)['chunk_spans'].tolist()
+    assert len(spans) == len(WORDS)
+
+    for index, word in enumerate(WORDS):
+        [result] = await knowledge_base.retrieve_knowledge(word, top_k=1)
+        assert result['chunk_index'] == index and result['window'] == [index, index]
+        assert [result['start'], result['end']] == spans[index]
+        assert result['content'] == content[result['start']:result['end']] and word in result['content']
+
+@pytest.mark.asyncio
+async def test_neighbor_window_is_clamped_at_document_boundaries():
+    knowledge_base = make_chunked_knowledge_base('lexical')
+    knowledge_id, content = await add_sections(knowledge_base)
+    spans = knowledge_base.get_knowledge(knowledge_id)['chunk_spans'].tolist()
+    last = len(spans) - 1
+
+    async def window(word: str, size: int) -> dict:
+        [result] = await knowledge_base.retrieve_knowledge(word, top_k=1, neighbor_window=size)
+        assert result['content'] == content[result['start']:result['end']]
+        return result
+
+    first = await window(WORDS[0], 2)
+    assert first['chunk_index'] == 0 and first['window'] == [0, 2]
+    assert (first['start'], first['end']) == (0, spans[2][1])
+
+    final = await window(WORDS[-1], 2)
+    assert final['chunk_index'] == last and final['window'] == [last - 2, last]
+    assert (final['start'], final['end']) == (spans[last - 2][0], len(content))
+
+    middle = await window(WORDS[3], 1)
+    assert middle['window'] == [2, 4] and (middle['start'], middle['end']) == (spans[2][0], spans[4][1])
+
+    whole = await window(WORDS[3], 100)
+    assert whole['window'] == [0, last] and whole['content'] == content
+    # The configured default applies when no window is passed
+    knowledge_base.config.retrieval_config['neighbor_window'] = 1
+    [default] = await knowledge_base.retrieve_knowledge(WORDS[0], top_k=1)
+    assert default['window'] == [0, 1]
@@ -0,0 +1,156 @@
+import time
+
+import numpy as np
+import pytest
+
+from agents.knowledge_base.config import KnowledgeBaseConfig
+from agents.knowledge_base.core import KnowledgeBase
+from agents.knowledge_base.lexical_index import InvertedIndex
+from agents.knowledge_base.segments import SegmentStore
+from agents.knowledge_base.vector_store import EmbeddingStore
+
+TEXTS = [f'chunk {i} mentions alpha{i % 3} and beta{i % 5} with gamma' for i in range(40)]
+
+def make_store(**options) -> SegmentStore:
+    options = {'background_merge': False, 'memtable_size': 1, 'refresh_interval': 60.0, **options}
+    return SegmentStore({}, EmbeddingStore, **options)
+
+def vectors(count: int, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).normal(size=(count, 8)).astype(np.float32)
+
+def make_knowledge_base(**settings) -> KnowledgeBase:
+    defaults = KnowledgeBaseConfig()
+    return KnowledgeBase(KnowledgeBaseConfig(
+        embedding_settings={'provider': 'hashing', 'dimension': 64, 'batch_size': 64, 'cache_path': None},
+        knowledge_settings={**defaults.knowledge_settings, 'snapshot_isolation': True, **settings},
+        retrieval_config={**defaults.retrieval_config, 'mode': 'lexical', 'cache_size': 0}
+    ))
+
+def document(topic: str, category: str) -> dict:
+    return {'content': f'Guide to {topic}: how {topic} works and when to use {topic}.',
+            'metadata': {'category': category}, 'source': topic}
+
+def test_writes_are_buffered_until_the_memtable_fills():
+    store = make_store(memtable_size=4)
+    for i in range(3):
+        store.lexical.add(f'c{i}', TEXTS[i])
+    assert store.snapshot.score('gamma') == {}
+
+    store.lexical.add('c3', TEXTS[3])
+    assert set(store.snapshot.score('gamma')) == {'c0', 'c1', 'c2', 'c3'}
+    assert len(store.snapshot.segments) == 1
+
+def test_refresh_publishes_buffered_writes():
+    store = make_store(memtable_size=100)
+    store.lexical.add('c0', TEXTS[0])
+    store.vectors.add(['c0'], vectors(1))
+    snapshot = store.snapshot
+    assert store.refresh() is not snapshot
+    assert set(store.snapshot.score('gamma')) == {'c0'}
+    assert store.snapshot.search(vectors(1)[0], 1)[0][0] == 'c0'
+    # Nothing new: the same snapshot comes back
+    assert store.refresh() is store.snapshot
+
+def test_refresh_does_not_wait_for_or_split_a_write():
+    store = make_store(memtable_size=100)
+    with store.writing():
+        store.lexical.add('c0', TEXTS[0])
+        assert store.refresh() is store.snapshot
+        assert store.snapshot.score('gamma') == {}
+        store.lexical.add('c1', TEXTS[1])
+    assert set(store.refresh().score('gamma')) == {'c0', 'c1'}
+
+def test_background_thread_publishes_after_the_refresh_interval():
+    store = make_store(memtable_size=100, refresh_interval=0.05, background_merge=True)
+    try:
+        store.lexical.add('c0', TEXTS[0])
+        deadline = time.monotonic() + 5
+        while not store.snapshot.score('gamma') and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert set(store.snapshot.score('gamma')) == {'c0'}
+    finally:
+        store.close()
+
+def test_merges_keep_segment_count_bounded_and_scores_exact():
+    store = make_store(max_segments=3, merge_factor=2)
+    plain = InvertedIndex()
+    for i, text in enumerate(TEXTS):
+        store.lexical.add(f'c{i}', text)
+        plain.add(f'c{i}', text)
+    for i in range(0, 40, 4):
+        store.lexical.remove(f'c{i}', TEXTS[i])
+        plain.remove(f'c{i}', TEXTS[i])
+
+    stats = store.stats()
+    assert stats['segments'] <= 3 and stats['merges'] > 0
+    assert set(store.lexical.score('alpha1 beta2')) == set(plain.score('alpha1 beta2'))
+
+    stats = store.compact()
+    assert (stats['segments'], stats['deleted_chunks']) == (1, 0)
+    # With tombstones gone the collection statistics match a plain index exactly
+    assert store.lexical.score('alpha1 beta2') == pytest.approx(plain.score('alpha1 beta2'))
+
+def test_merge_does_not_disturb_older_snapshots():
+    store = make_store(max_segments=100)
+    for i, text in enumerate(TEXTS[:10]):
+        store.lexical.add(f'c{i}', text)
+    store.lexical.remove('c3', TEXTS[3])
+    before = store.refresh()
+    scores = before.score('alpha0 gamma')
+
+    store.compact()
+    store.lexical.add('c10', TEXTS[10])
+    store.refresh()
+    assert before.score('alpha0 gamma') == scores
+    assert 'c3' not in scores and 'c10' in store.snapshot.score('alpha0 gamma')
+
+def test_merged_vectors_drop_tombstones():
+    store = make_store(max_segments=100)
+    data = vectors(20)
+    for i in range(20):
+        store.vectors.add([f'v{i}'], data[i:i + 1])
+    store.vectors.remove(['v5', 'v6'])
+    store.compact()
+    assert len(store.vectors) == 18
+    assert store.stats()['deleted_vectors'] == 0
+    assert {item_id for item_id, _ in store.vectors.search(data[5], 20)} == {f'v{i}' for i in range(20)} - {'v5', 'v6'}
+    assert np.allclose(store.vectors.get('v7'), data[7] / np.linalg.norm(data[7]))
+
+@pytest.mark.asyncio
+async def test_filtered_queries_resolve_against_the_snapshot():
+    knowledge_base = make_knowledge_base()
+    first = (await knowledge_base.add_knowledge(document('indexing', 'databases')))['knowledge_id']
+    second = (await knowledge_base.add_knowledge(document('caching', 'databases')))['knowledge_id']
+    snapshot = knowledge_base._snapshot()
+
+    await knowledge_base.update_knowledge(first, document('indexing', 'search'))
+    knowledge_base.delete_knowledge(second)
+    await knowledge_base.add_knowledge(document('sharding', 'databases'))
+
+    # A query holding the old snapshot sees the old filter matches, not the live ones
+    assert snapshot.resolve({'category': 'databases'}) == {first, second}
+    assert snapshot.resolve({'category': 'search'}) == set()
+    current = knowledge_base._snapshot()
+    assert current.resolve({'category': 'search'}) == {first}
+    assert len(current.resolve({'category': 'databases'})) == 1
+    assert current.generation == knowledge_base.generation
+
+    results = await knowledge_base.retrieve_knowledge('indexing', filters={'category': 'databases'})
+    assert results == []
+    results = await knowledge_base.retrieve_knowledge('indexing', filters={'category': 'search'})
+    assert [result['knowledge_id'] for result in results] == [first]
+
+@pytest.mark.asyncio
+async def test_filters_survive_merges():
+    knowledge_base = make_knowledge_base(memtable_size=1, max_segments=2, merge_factor=2)
+    ids = {}
+    for index in range(8):
+        ids[index] = (await knowledge_base.add_knowledge(document(f'topic{index}', f'c{index % 2}')))['knowledge_id']
+    knowledge_base.delete_knowledge(ids[0])
+    knowledge_base.segments.compact()
+
+    snapshot = knowledge_base._snapshot()
+    assert len(snapshot.segments) == 1
+    assert snapshot.resolve({'category': 'c0'}) == {ids[index] for index in (2, 4, 6)}
+    assert snapshot.resolve({'category': 'c1'}) == {ids[index] for index in (1, 3, 5, 7)}
+    knowledge_base.close()
@@ -0,0 +1,121 @@
+import heapq
+
+import pytest
+
+from agents.knowledge_base.config import KnowledgeBaseConfig
+from agents.knowledge_base.core import KnowledgeBase
+from agents.knowledge_base.utils import split_chunk_id
+
+TOPICS = ['invoices', 'shipping', 'returns', 'warranty', 'loyalty', 'payments']
+
+def make_knowledge_base(path, **knowledge_settings) -> KnowledgeBase:
+    defaults = KnowledgeBaseConfig()
+    return KnowledgeBase(KnowledgeBaseConfig(
+        embedding_settings={'provider': 'hashing', 'dimension': 64, 'batch_size': 64, 'cache_path': None},
+        knowledge_settings={**defaults.knowledge_settings, 'chunk_size': 120, 'chunk_overlap': 0,
+                            **knowledge_settings},
+        retrieval_config={**defaults.retrieval_config, 'mode': 'lexical', 'cache_size': 0},
+        storage_settings={**defaults.storage_settings, 'backend': 'sqlite', 'path': str(path)}
+    ))
+
+def document(index: int) -> dict:
+    topic = TOPICS[index % len(TOPICS)]
+    content = ' '.join(f'Section {i} of the {topic} policy, revision {index}, covers {topic} case {i}.'
+                       for i in range(6))
+    return {'content': content, 'metadata': {'category': f'c{index % 2}'}, 'source': topic}
+
+async def populate(knowledge_base: KnowledgeBase, count: int = 12) -> list:
+    return [(await knowledge_base.add_knowledge(document(index)))['knowledge_id'] for index in range(count)]
+
+def best_per_entry(scores: dict, top_k: int) -> list:
+    best = {}
+    for chunk_id, score in scores.items():
+        knowledge_id, _ = split_chunk_id(chunk_id)
+        if knowledge_id not in best or score > best[knowledge_id][1]:
+            best[knowledge_id] = (knowledge_id, score, chunk_id)
+    return heapq.nlargest(top_k, best.values(), key=lambda item: item[1])
+
+@pytest.mark.asyncio
+async def test_entries_survive_a_reopen(tmp_path):
+    knowledge_base = make_knowledge_base(tmp_path)
+    ids = await populate(knowledge_base)
+    await knowledge_base.update_knowledge(ids[0], document(100))
+    knowledge_base.delete_knowledge(ids[1])
+    expected = {knowledge_id: knowledge_base.get_knowledge(knowledge_id)['content'] for knowledge_id in ids[2:]}
+    expected[ids[0]] = document(100)['content']
+    knowledge_base.close()
+
+    reopened = make_knowledge_base(tmp_path)
+    assert {knowledge_id: knowledge['content'] for knowledge_id, knowledge in reopened.knowledge_store.items()} == expected
+    # Vectors come back from the database rather than being re-embedded
+    assert len(reopened.embeddings) == sum(len(knowledge['chunk_hashes'])
+                                           for knowledge in reopened.knowledge_store.values())
+    assert reopened.embedder.misses == 0
+    hits = await reopened.retrieve_knowledge('revision 100', top_k=1)
+    assert hits[0]['knowledge_id'] == ids[0]
+    reopened.close()
+
+@pytest.mark.asyncio
+async def test_limited_search_matches_full_scoring(tmp_path):
+    knowledge_base = make_knowledge_base(tmp_path)
+    await populate(knowledge_base)
+    index = knowledge_base.lexical_index
+    scores = index.score('shipping policy case')
+
+    top = index.search('shipping policy case', 5)
+    assert len(top) == 5
+    assert [score for _, score in top] == sorted((score for _, score in top), reverse=True)
+    assert [score for _, score in top] == pytest.approx(heapq.nlargest(5, scores.values()))
+
+    ranked = index.search_knowledge('shipping policy case', 3)
+    assert [(knowledge_id, pytest.approx(score)) for knowledge_id, score, _ in ranked] == \
+           [(knowledge_id, score) for knowledge_id, score, _ in best_per_entry(scores, 3)]
+    assert index.search('', 5) == [] and index.search_knowledge('shipping', 0) == []
+    knowledge_base.close()
+
+@pytest.mark.asyncio
+async def test_allowed_chunks_are_applied_in_sql(tmp_path):
+    knowledge_base = make_knowledge_base(tmp_path)
+    ids = await populate(knowledge_base)
+    index = knowledge_base.lexical_index
+    allowed = {chunk_id for chunk_id in index.score('policy') if split_chunk_id(chunk_id)[0] in ids[:4]}
+
+    scores = index.score('policy', allowed)
+    assert set(scores) == allowed
+    assert {split_chunk_id(chunk_id)[0] for chunk_id, _ in index.search('policy', 100, allowed)} <= set(ids[:4])
+    assert {knowledge_id for knowledge_id, _, _ in index.search_knowledge('policy', 10, allowed)} == set(ids[:4])
+    assert index.score('policy', set()) == {}
+    # The temp table is emptied and no transaction is left open
+    connection = knowledge_base.storage.connection
+    assert connection.execute('SELECT COUNT(*) FROM temp.allowed_chunks').fetchone()[0] == 0
+    assert not connection.in_transaction
+    knowledge_base.close()
+
+@pytest.mark.asyncio
+async def test_filtered_query_leaves_a_batch_transaction_open(tmp_path):
+    knowledge_base = make_knowledge_base(tmp_path)
+    await populate(knowledge_base, 4)
+    storage = knowledge_base.storage
+    with storage.batch():
+        knowledge_id = (await knowledge_base.add_knowledge(document(50)))['knowledge_id']
+        assert storage.connection.in_transaction
+        hits = await knowledge_base.retrieve_knowledge('revision 50', top_k=1, filters={'category': 'c0'})
+        assert hits[0]['knowledge_id'] == knowledge_id
+        # Still uncommitted: the query must not have committed the batch
+        assert storage.connection.in_transaction
+    assert not storage.connection.in_transaction
+    knowledge_base.close()
+
+@pytest.mark.asyncio
+async def test_retrieval_ranks_entries_in_the_database(tmp_path):
+    knowledge_base = make_knowledge_base(tmp_path)
+    ids = await populate(knowledge_base)
+    results = await knowledge_base.retrieve_knowledge('warranty policy', top_k=2, filters={'category': 'c1'})
+    assert len(results) == 2
+    assert {result['knowledge_id'] for result in results} == {ids[3], ids[9]}
+    assert all('warranty' in result['content'] for result in results)
+    knowledge_base.close()
+
+def test_snapshot_isolation_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        make_knowledge_base(tmp_path, snapshot_isolation=True)
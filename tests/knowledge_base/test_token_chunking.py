@@ -0,0 +1,107 @@
+import importlib.util
+import logging
+
+import pytest
+
+from agents.knowledge_base.config import KnowledgeBaseConfig
+from agents.knowledge_base.core import KnowledgeBase
+from agents.knowledge_base.tokenizers import RegexTokenCounter, TiktokenCounter, create_token_counter
+from agents.knowledge_base.utils import iter_token_chunk_spans
+
+TEXT = ' '.join(f'Sentence {i} explains configuration item {i * 37} in detail. 产品说明第{i}条。'
+                for i in range(40))
+
+def chunk(text: str, max_tokens: int, overlap_tokens: int, boundary=None) -> list:
+    counter = RegexTokenCounter()
+    return list(iter_token_chunk_spans(text, counter.token_spans(text), max_tokens, overlap_tokens, boundary))
+
+def make_knowledge_base(**knowledge_settings) -> KnowledgeBase:
+    defaults = KnowledgeBaseConfig()
+    return KnowledgeBase(KnowledgeBaseConfig(
+        embedding_settings={'provider': 'hashing', 'dimension': 64, 'batch_size': 64, 'cache_path': None},
+        knowledge_settings={**defaults.knowledge_settings, 'chunk_unit': 'tokens', 'chunk_tokens': 40,
+                            'chunk_overlap_tokens': 8, **knowledge_settings}
+    ))
+
+@pytest.mark.parametrize('boundary', [None, 'sentence'])
+def test_no_chunk_exceeds_the_token_budget(boundary):
+    counter = RegexTokenCounter()
+    chunks = chunk(TEXT, 50, 10, boundary)
+    assert len(chunks) > 5
+    assert chunks[0][0] == 0 and chunks[-1][1] == len(TEXT)
+    for start, end, tokens in chunks:
+        assert 0 < tokens <= 50
+        # Cuts fall on token boundaries, so the slice re-tokenizes to the same count
+        assert counter.count(TEXT[start:end]) == tokens
+    assert [start for start, _, _ in chunks] == sorted({start for start, _, _ in chunks})
+
+def test_consecutive_chunks_share_the_overlap():
+    spans = RegexTokenCounter().token_spans(TEXT)
+    chunks = chunk(TEXT, 50, 10)
+    for (_, previous_end, _), (start, _, _) in zip(chunks, chunks[1:]):
+        shared = [span for span in spans if span[0] >= start and span[1] <= previous_end]
+        assert len(shared) == 10
+
+def test_short_texts_and_invalid_overlap():
+    assert chunk('Just a few words.', 50, 10) == [(0, 17, 6)]
+    with pytest.raises(ValueError):
+        chunk(TEXT, 10, 10)
+
+def test_regex_counter_counts_cjk_per_character():
+    counter = RegexTokenCounter()
+    assert counter.count('产品说明') == 4
+    assert counter.count('configuration 42!') == 6
+
+def test_tiktoken_falls_back_to_regex_when_missing(monkeypatch, caplog):
+    find_spec = importlib.util.find_spec
+    monkeypatch.setattr(importlib.util, 'find_spec',
+                        lambda name, *args: None if name == 'tiktoken' else find_spec(name, *args))
+    with caplog.at_level(logging.WARNING):
+        counter = create_token_counter('tiktoken:cl100k_base')
+    assert isinstance(counter, RegexTokenCounter) and 'tiktoken is not installed' in caplog.text
+
+    knowledge_base = make_knowledge_base(tokenizer='tiktoken')
+    assert isinstance(knowledge_base.token_counter, RegexTokenCounter)
+    with pytest.raises(ValueError):
+        create_token_counter('sentencepiece')
+
+def test_tiktoken_is_used_when_installed():
+    if importlib.util.find_spec('tiktoken') is None:
+        pytest.skip('tiktoken is not installed')
+    counter = create_token_counter('tiktoken:cl100k_base')
+    assert isinstance(counter, TiktokenCounter) and counter.count('hello world') == 2
+
+@pytest.mark.asyncio
+async def test_store_caches_token_counts_within_budget():
+    knowledge_base = make_knowledge_base()
+    knowledge_id = (await knowledge_base.add_knowledge({'content': TEXT, 'metadata': {}, 'source': 'manual'}))[
+        'knowledge_id']
+    counts = knowledge_base.chunk_token_counts(knowledge_id)
+    chunks = knowledge_base.get_chunks(knowledge_id)
+    assert len(chunks) > 5 and max(counts) <= 40
+    assert list(counts) == [knowledge_base.token_counter.count(text) for text in chunks]
+
+@pytest.mark.asyncio
+async def test_pack_context_stops_at_the_limit(monkeypatch):
+    knowledge_base = make_knowledge_base()
+    first = (await knowledge_base.add_knowledge({'content': TEXT, 'metadata': {}, 'source': 'manual'}))['knowledge_id']
+    second = (await knowledge_base.add_knowledge({'content': 'Short note.', 'metadata': {}, 'source': 'memo'}))[
+        'knowledge_id']
+    counts = knowledge_base.chunk_token_counts(first)
+    note_tokens = int(knowledge_base.chunk_token_counts(second)[0])
+    separator_tokens = knowledge_base.token_counter.count('\n\n')
+    # Packing reads the cached counts and never tokenizes a chunk again
+    count = knowledge_base.token_counter.count
+    monkeypatch.setattr(knowledge_base.token_counter, 'count',
+                        lambda text: count(text) if text == '\n\n' else pytest.fail('re-tokenized a chunk'))
+    budget = int(counts[0] + counts[1]) + note_tokens + 2 * separator_tokens
+    assert int(counts[2]) > note_tokens
+    packed = knowledge_base.pack_context([{'knowledge_id': first}, {'knowledge_id': second}], budget)
+
+    assert packed['tokens'] == sum(item['tokens'] for item in packed['chunks']) + 2 * separator_tokens <= budget
+    # The first two chunks use the budget up, later ones of the entry do not fit, but the short note does
+    assert [(item['knowledge_id'], item['chunk_index']) for item in packed['chunks']] == \
+        [(first, 0), (first, 1), (second, 0)]
+    assert packed['context'] == '\n\n'.join(knowledge_base.get_chunks(first)[:2] + ['Short note.'])
+
+    assert knowledge_base.pack_context([{'knowledge_id': first, 'chunk_index': 2}], int(counts[2]) - 1)['chunks'] == []
@@ -0,0 +1,70 @@
+import pytest
+
+from agents.knowledge_base.config import KnowledgeBaseConfig
+from agents.knowledge_base.core import KnowledgeBase
+
+PARAGRAPHS = [f'Paragraph {i} talks about subject {i} in detail.' for i in range(20)]
+
+def make_knowledge_base() -> KnowledgeBase:
+    return KnowledgeBase(KnowledgeBaseConfig(
+        embedding_settings={'provider': 'hashing', 'dimension': 64, 'batch_size': 64, 'cache_path': None},
+        knowledge_settings={**KnowledgeBaseConfig().knowledge_settings,
+                            'chunk_size': 100, 'chunk_overlap': 20, 'chunk_boundary': 'paragraph'}
+    ))
+
+def document(paragraphs) -> dict:
+    return {'content': '\n\n'.join(paragraphs), 'metadata': {}, 'source': 'test'}
+
+@pytest.mark.asyncio
+async def test_update_reindexes_only_changed_chunks():
+    knowledge_base = make_knowledge_base()
+    added = await knowledge_base.add_knowledge(document(PARAGRAPHS))
+    knowledge_id = added['knowledge_id']
+    misses = knowledge_base.embedder.misses
+
+    edited = list(PARAGRAPHS)
+    edited[10] = 'Paragraph ten was edited.'
+    changes = await knowledge_base.update_knowledge(knowledge_id, document(edited))
+
+    assert changes['chunks_added'] >= 1
+    assert changes['chunks_removed'] >= 1
+    assert changes['chunks_reused'] == changes['chunks_count'] - changes['chunks_added']
+    assert changes['chunks_reused'] > changes['chunks_added']
+    # Only the new chunks reached the embedder
+    assert knowledge_base.embedder.misses - misses == changes['chunks_added']
+
+@pytest.mark.asyncio
+async def test_update_keeps_indexes_consistent():
+    knowledge_base = make_knowledge_base()
+    knowledge_id = (await knowledge_base.add_knowledge(document(PARAGRAPHS)))['knowledge_id']
+    edited = PARAGRAPHS[:5] + ['A brand new closing paragraph.']
+    await knowledge_base.update_knowledge(knowledge_id, document(edited))
+
+    distinct = len(set(knowledge_base.knowledge_store[knowledge_id]['chunk_hashes']))
+    assert len(knowledge_base.embeddings) == distinct
+    assert len(knowledge_base.lexical_index) == distinct
+    assert knowledge_base.get_chunks(knowledge_id)[-1].endswith('A brand new closing paragraph.')
+    assert 'subject 15' not in knowledge_base.knowledge_store[knowledge_id]['content']
+    assert knowledge_base.lexical_index.score('15') == {}
+
+@pytest.mark.asyncio
+async def test_unchanged_update_reuses_every_chunk():
+    knowledge_base = make_knowledge_base()
+    knowledge_id = (await knowledge_base.add_knowledge(document(PARAGRAPHS)))['knowledge_id']
+    changes = await knowledge_base.update_knowledge(knowledge_id, document(PARAGRAPHS))
+    assert changes['chunks_added'] == changes['chunks_removed'] == 0
+
+@pytest.mark.asyncio
+async def test_delete_clears_indexes():
+    knowledge_base = make_knowledge_base()
+    knowledge_id = (await knowledge_base.add_knowledge(document(PARAGRAPHS)))['knowledge_id']
+    assert knowledge_base.delete_knowledge(knowledge_id)
+    assert len(knowledge_base.embeddings) == 0
+    assert len(knowledge_base.lexical_index) == 0
+    assert knowledge_base.lexical_index.postings == {}
+    assert not knowledge_base.delete_knowledge(knowledge_id)
+
+@pytest.mark.asyncio
+async def test_update_of_unknown_id_raises():
+    with pytest.raises(ValueError):
+        await make_knowledge_base().update_knowledge('missing', document(PARAGRAPHS))
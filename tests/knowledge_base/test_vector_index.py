@@ -0,0 +1,118 @@
+import numpy as np
+import pytest
+
+from agents.knowledge_base.config import KnowledgeBaseConfig
+from agents.knowledge_base.core import KnowledgeBase
+from agents.knowledge_base.vector_index import FlatIndex, IVFIndex
+
+def clustered(count: int, dim: int = 32, clusters: int = 24, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    return (centers[rng.integers(clusters, size=count)] + 0.3 * rng.normal(size=(count, dim))).astype(np.float32)
+
+def build(vectors: np.ndarray, **options) -> IVFIndex:
+    index = IVFIndex(**{'nlist': 16, 'nprobe': 4, 'min_train_size': 400, **options})
+    index.add([f'v{i}' for i in range(len(vectors))], vectors)
+    return index
+
+def recall(index, exact, queries: np.ndarray, top_k: int = 10) -> float:
+    found = 0
+    for query in queries:
+        expected = {item_id for item_id, _ in exact.search(query, top_k)}
+        found += len(expected & {item_id for item_id, _ in index.search(query, top_k)})
+    return found / (len(queries) * top_k)
+
+def test_recall_against_flat_grows_with_nprobe():
+    vectors = clustered(2000)
+    queries = clustered(50, seed=1)
+    flat = FlatIndex()
+    flat.add([f'v{i}' for i in range(len(vectors))], vectors)
+    index = build(vectors)
+
+    assert recall(index, flat, queries) >= 0.9
+    index.nprobe = 1
+    narrow = recall(index, flat, queries)
+    # Probing every list is an exact search
+    index.nprobe = index.nlist
+    assert narrow <= recall(index, flat, queries) == 1.0
+    for query in queries[:5]:
+        hits, expected = index.search(query, 5), flat.search(query, 5)
+        assert [item_id for item_id, _ in hits] == [item_id for item_id, _ in expected]
+        assert [score for _, score in hits] == pytest.approx([score for _, score in expected])
+
+def test_trains_only_once_min_train_size_is_reached():
+    vectors = clustered(500)
+    index = IVFIndex(nlist=16, min_train_size=400)
+    index.add([f'v{i}' for i in range(399)], vectors[:399])
+    assert not index.is_trained and len(index) == 399
+    # Untrained, queries scan the staging store exactly
+    assert index.search(vectors[10], 1)[0][0] == 'v10'
+
+    index.add(['v399'], vectors[399:400])
+    assert index.is_trained and len(index) == 400
+    assert sum(len(bucket) for bucket in index._lists) == 400
+    assert index.search(vectors[10], 1)[0][0] == 'v10'
+
+def test_add_and_remove_after_training():
+    vectors = clustered(600)
+    index = build(vectors[:500])
+    index.add([f'v{i}' for i in range(500, 600)], vectors[500:])
+    assert len(index) == 600 and index.search(vectors[550], 1)[0][0] == 'v550'
+
+    # Overwriting an id moves it to the bucket of its new vector
+    index.add(['v0'], vectors[550:551])
+    assert len(index) == 600
+    assert index._assignments['v0'] == index._assignments['v550']
+    np.testing.assert_allclose(index.get('v0'), index.get('v550'))
+
+    assert index.remove(['v550', 'v1', 'missing']) == 2
+    assert len(index) == 598 and 'v550' not in index and index.get('v1') is None
+    assert 'v550' not in {item_id for item_id, _ in index.search(vectors[550], 10)}
+    assert len(index.vectors) == len(index.ids) == 598
+
+def test_attach_restores_buckets_without_training(monkeypatch):
+    vectors = clustered(600)
+    index = build(vectors)
+    index.remove(['v3'])
+    state = index.state()
+    ids, matrix = list(index.ids), index.vectors
+
+    def no_training(*args, **kwargs):
+        raise AssertionError('retrained on attach')
+
+    monkeypatch.setattr(IVFIndex, 'train', no_training)
+    restored = IVFIndex(nlist=16, nprobe=4, min_train_size=400)
+    restored.attach(ids, matrix, state=state)
+    assert restored.is_trained and len(restored) == 599
+    np.testing.assert_array_equal(restored.centroids, index.centroids)
+    assert restored._assignments == index._assignments
+    for query in clustered(10, seed=2):
+        assert restored.search(query, 5) == index.search(query, 5)
+    restored.add(['new'], vectors[:1])
+    assert restored.search(vectors[0], 2)[0][1] == pytest.approx(1.0)
+
+@pytest.mark.asyncio
+async def test_reopened_store_keeps_the_trained_lists(tmp_path, monkeypatch):
+    defaults = KnowledgeBaseConfig()
+    config = KnowledgeBaseConfig(
+        embedding_settings={'provider': 'hashing', 'dimension': 64, 'batch_size': 64, 'cache_path': None},
+        knowledge_settings={**defaults.knowledge_settings, 'chunk_size': 80, 'chunk_overlap': 0,
+                            'index_type': 'ivf', 'nlist': 4, 'nprobe': 2},
+        retrieval_config={**defaults.retrieval_config, 'mode': 'vector', 'cache_size': 0},
+        storage_settings={**defaults.storage_settings, 'backend': 'mmap', 'path': str(tmp_path)}
+    )
+    knowledge_base = KnowledgeBase(config)
+    for index in range(60):
+        content = ' '.join(f'Part {i} of note {index} about topic {index % 7} and item {i * index}.' for i in range(4))
+        await knowledge_base.add_knowledge({'content': content, 'metadata': {}, 'source': 'notes'})
+    assert knowledge_base.embeddings.is_trained
+    knowledge_base.checkpoint()
+    centroids = knowledge_base.embeddings.centroids
+    hits = await knowledge_base.retrieve_knowledge('note 12 about topic 5', top_k=5)
+    knowledge_base.close()
+
+    monkeypatch.setattr(IVFIndex, 'train', lambda *args, **kwargs: pytest.fail('retrained on open'))
+    reopened = KnowledgeBase(config)
+    np.testing.assert_array_equal(reopened.embeddings.centroids, centroids)
+    assert await reopened.retrieve_knowledge('note 12 about topic 5', top_k=5) == hits
+    reopened.close()